@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,8 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "myshop.instrumentation.RequestStatsMiddleware",  # First, so it times everything below
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "myshop.drafts.BookingDraftMiddleware",  # request.draft: the booking funnel's state
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     # "django.contrib.auth.middleware.AuthenticationMiddleware", # Removed
@@ -54,14 +57,27 @@ ROOT_URLCONF = "myfirstweb.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates plus render timing for RequestStatsMiddleware
+        "BACKEND": "myshop.template_backend.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "myshop/template"],
-        "APP_DIRS": True,
+        "APP_DIRS": False,  # The loaders are listed below
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.request",
                 # "django.contrib.auth.context_processors.auth", # Removed
                 "django.contrib.messages.context_processors.messages",
+                "myshop.context_processors.catalog",  # catalog_version for {% cache %} fragments
+            ],
+            # Parse each template once per process, in every environment
+            # (the dev server's autoreloader still clears it on edits)
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
             ],
         },
     },
@@ -75,7 +91,8 @@ WSGI_APPLICATION = "myfirstweb.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        # django.db.backends.mysql plus a process-wide connection pool
+        "ENGINE": "myshop.db_backends.mysql_pool",
         "NAME": "madbike_db",
         "USER": "root",
         "PASSWORD": "12345678",
@@ -84,10 +101,38 @@ DATABASES = {
         "OPTIONS": {
             "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
             "charset": "utf8mb4",
+            # Size max_size to the DB-using threads per process; pool metrics
+            # are served by shop-admin/stats/ under "db_pools"
+            "pool": {"max_size": 10, "timeout": 5, "max_lifetime": 1800, "check_after": 10},
         },
     }
 }
 
+# MYSHOP_DATABASE=sqlite runs the whole app on a local SQLite file (no MySQL
+# server needed, e.g. for fast tests); the stored procedures are then replaced
+# by the ORM procedure backend below.
+USE_SQLITE = os.environ.get("MYSHOP_DATABASE") == "sqlite"
+if USE_SQLITE:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock at BEGIN and wait for it, instead of failing
+            # with "database is locked" when concurrent bookings commit
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+        }
+    }
+
+# Procedure backend for writes (myshop.procedures): "mysql" calls the stored
+# procedures, "orm" runs the same operations and trigger rules through the ORM.
+# Override with MYSHOP_PROCEDURE_BACKEND to benchmark one against the other.
+PROCEDURE_BACKEND = os.environ.get("MYSHOP_PROCEDURE_BACKEND", "orm" if USE_SQLITE else "mysql")
+
+# Price rentals as the cheapest mix of monthly/weekly/daily blocks (myshop.pricing).
+# Off while the CreateRental triggers charge daily rate x days + deposit: the
+# quote shown at checkout must be what the database charges.
+PRICE_BLOCKS = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,12 +162,91 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The catalog cache (categories and bike lists) lives here. LocMemCache is per
+# process, so with several workers point this at a shared backend (e.g.
+# Memcached/Redis) to make admin edits visible to every worker at once.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "myshop",
+    }
+}
+
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 3600  # seconds; entries are also dropped on every catalog version bump
+# Rendered catalog fragments (category grid, bike cards) of the public pages;
+# keyed on the catalog version like the entries above. 0 turns them off.
+CATALOG_FRAGMENT_TIMEOUT = 3600
+
+# Admin dashboard: read the tiles from the incrementally maintained
+# dashboard_counters table (O(1)) instead of the aggregate query. Re-seed it
+# with `python manage.py rebuild_dashboard_counters` after bulk data changes.
+DASHBOARD_COUNTERS = False
+
+# Request instrumentation (myshop.instrumentation.RequestStatsMiddleware)
+REQUEST_STATS_SLOW_MS = 500  # Log requests slower than this to "myshop.slow_requests"
+REQUEST_STATS_TOP_QUERIES = 5  # Slowest statements kept per request
+REQUEST_STATS_WINDOW = 500  # Recent requests kept per view for shop-admin/stats/
+
 # Session configuration
-SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies" # Use signed cookies to avoid django_session table
+# Signed-cookie sessions (no django_session table) with a compact payload;
+# the cookie is only re-signed when the data changes or it is older than
+# SESSION_COOKIE_REFRESH seconds (see myshop.session_backend).
+SESSION_ENGINE = "myshop.session_backend"
+SESSION_SERIALIZER = "myshop.session_backend.CompactSerializer"
 SESSION_COOKIE_AGE = 600  # 10 minutes in seconds
-SESSION_SAVE_EVERY_REQUEST = True  # Reset timeout on each request
+SESSION_COOKIE_REFRESH = 60  # Re-sign an unchanged session after this many seconds (sliding expiry)
+SESSION_SAVE_EVERY_REQUEST = False  # The engine decides when the cookie needs re-sending
 SESSION_EXPIRE_AT_BROWSER_CLOSE = (
     False  # Keep session after browser close (until timeout)
 )
 
+# Booking drafts (myshop.drafts): keep the funnel's state on the server and
+# only a constant-size token in the BOOKING_DRAFT_COOKIE_NAME cookie.
+# None keeps it in the session cookie; otherwise "locmem" (one process),
+# "file" (one host) or "cache" (any cache alias, e.g. Memcached/Redis).
+# MYSHOP_BOOKING_DRAFTS=<backend> turns it on. Drafts expire
+# SESSION_COOKIE_AGE seconds after their last use.
+BOOKING_DRAFT_STORE = os.environ.get("MYSHOP_BOOKING_DRAFTS") or None
+BOOKING_DRAFT_OPTIONS = {}  # e.g. {"max_bytes": ...} / {"path": ...} / {"alias": "drafts"}
+BOOKING_DRAFT_COOKIE_NAME = "booking_draft"
+
 # MIGRATION_MODULES = {'myshop': None} # Optional: Disable migrations if you want to be extreme
+
+# Async views (myshop.async_views) for the booking funnel and admin lists when
+# served through ASGI (myfirstweb.asgi); MYSHOP_ASYNC_VIEWS=1 turns them on.
+# Booking commits run on a pool of at most ASYNC_BOOKING_WORKERS threads.
+ASYNC_VIEWS = os.environ.get("MYSHOP_ASYNC_VIEWS") == "1"
+ASYNC_BOOKING_WORKERS = 8
+
+# Booking availability index: seconds before the in-process rental interval
+# index is fully rebuilt (picks up bookings made by other worker processes)
+AVAILABILITY_INDEX_TTL = 60
+
+# Idempotent checkout (myshop.idempotency): the outcome of a checkout POST is
+# kept this many seconds, and a repeat of the submission gets it back without
+# touching the database. Use a shared cache alias with several workers.
+IDEMPOTENCY_CACHE_ALIAS = "default"
+IDEMPOTENCY_TTL = 600
+IDEMPOTENCY_WAIT = 5  # Seconds a repeat waits for a submission still in flight
+
+# Admission control (myshop.admission) for the write paths: per process, at
+# most "limit" requests of a gate run at once and "queue" more wait up to
+# "timeout" seconds; the rest get a 503 with Retry-After. Keep the booking
+# limit at or below the DB connection pool size.
+ADMISSION_GATES = {
+    "booking": {"limit": 8, "queue": 32, "timeout": 3},  # Checkout commits
+    "admin_writes": {"limit": 4, "queue": 16, "timeout": 5},  # Admin POSTs
+}
+ADMISSION_RETRY_AFTER = 2  # seconds
+
+# Periodic jobs run by `python manage.py run_scheduler` (myshop.scheduler):
+# name -> (callable taking `now`, interval in seconds). Run it from cron with
+# no arguments, or keep one running with --loop.
+SCHEDULED_JOBS = {
+    "overdue_sweep": ("myshop.overdue.sweep", 300),
+    "daily_rollups": ("myshop.rollups.refresh", 600),
+}
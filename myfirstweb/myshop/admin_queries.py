@@ -0,0 +1,96 @@
+"""
+Server-side filters shared by the admin list pages (and anything else that
+needs "the same rows the admin list would show").
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Customer, Rental
+
+
+def parse_date(value):
+    """A YYYY-MM-DD query parameter as a date, or None if missing or malformed."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def day_start(day):
+    """Midnight at the start of `day` in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def filter_bookings(params):
+    """Rentals matching the booking list filters, with customer and bike joined in.
+
+    Supported params: status, overdue (only rentals in the overdue queue),
+    date_from / date_to (pickup date, inclusive), plate (license plate prefix)
+    and customer (first and/or last name prefix).
+    """
+    rentals = Rental.objects.select_related("customer", "bike")
+
+    status = params.get("status")
+    if status in dict(Rental.PAYMENT_STATUS_CHOICES):
+        rentals = rentals.filter(payment_status=status)
+    if params.get("overdue"):
+        rentals = rentals.filter(overdue__isnull=False)
+
+    date_from = parse_date(params.get("date_from"))
+    if date_from:
+        rentals = rentals.filter(start_date__gte=day_start(date_from))
+    date_to = parse_date(params.get("date_to"))
+    if date_to:
+        rentals = rentals.filter(start_date__lt=day_start(date_to + timedelta(days=1)))
+
+    plate = (params.get("plate") or "").strip()
+    if plate:
+        rentals = rentals.filter(bike__license_plate__istartswith=plate)
+
+    name = (params.get("customer") or "").split()
+    if len(name) == 1:
+        rentals = rentals.filter(
+            Q(customer__first_name__istartswith=name[0])
+            | Q(customer__last_name__istartswith=name[0])
+        )
+    elif len(name) > 1:
+        rentals = rentals.filter(
+            customer__first_name__istartswith=name[0],
+            customer__last_name__istartswith=" ".join(name[1:]),
+        )
+
+    return rentals
+
+
+def search_customers(params):
+    """Customers matching the directory search box (param `q`).
+
+    Every branch is a prefix match so it can be answered from the customer
+    indexes: digits search citizen_id and phone, a single word searches first
+    name, last name and LINE ID, and "first last" searches both name columns.
+    """
+    customers = Customer.objects.all()
+    query = (params.get("q") or "").strip()
+    if not query:
+        return customers
+
+    if query.isdigit():
+        return customers.filter(
+            Q(citizen_id__startswith=query) | Q(phone__startswith=query)
+        )
+
+    words = query.split()
+    if len(words) == 1:
+        word = words[0]
+        return customers.filter(
+            Q(first_name__istartswith=word)
+            | Q(last_name__istartswith=word)
+            | Q(line_id__istartswith=word.lstrip("@"))
+        )
+    return customers.filter(
+        first_name__istartswith=words[0],
+        last_name__istartswith=" ".join(words[1:]),
+    )
@@ -1,17 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from . import admin_views
 
+# ASYNC_VIEWS also switches the admin list pages to their async versions
+if getattr(settings, 'ASYNC_VIEWS', False):
+    from . import async_views as list_views
+else:
+    list_views = admin_views
+
 urlpatterns = [
     path('login/', admin_views.AdminLogin, name='admin_login'),
     path('logout/', admin_views.AdminLogout, name='admin_logout'),
     path('dashboard/', admin_views.AdminDashboard, name='admin_dashboard'),
-    path('customers/', admin_views.CustomerList, name='admin_customers'),
-    path('bookings/', admin_views.BookingList, name='admin_bookings'),
+    path('stats/', admin_views.RequestStats, name='admin_request_stats'),
+    path('reports/', admin_views.Reports, name='admin_reports'),
+    path('customers/', list_views.CustomerList, name='admin_customers'),
+    path('bookings/', list_views.BookingList, name='admin_bookings'),
+    path('bookings/batch-return/', admin_views.BatchReturn, name='admin_batch_return'),
     path('bookings/<int:rental_id>/complete/', admin_views.CompleteBooking, name='admin_complete_booking'),
-    path('vehicles/', admin_views.VehicleList, name='admin_vehicles'),
+    path('export/<str:dataset>/', admin_views.ExportData, name='admin_export'),
+    path('vehicles/', list_views.VehicleList, name='admin_vehicles'),
     path('vehicles/create/', admin_views.CreateModel, name='admin_create_model'),
     path('vehicles/add-inventory/', admin_views.AddInventory, name='admin_add_inventory'),
+    path('vehicles/bulk-import/', admin_views.BulkImport, name='admin_vehicle_bulk_import'),
+    path('vehicles/bulk-import/errors/<str:token>/', admin_views.BulkImportErrors, name='admin_vehicle_import_errors'),
     path('vehicles/<int:bike_id>/edit/', admin_views.EditVehicle, name='admin_edit_vehicle'),
     path('vehicles/<int:bike_id>/delete/', admin_views.DeleteVehicle, name='admin_delete_vehicle'),
+    path('vehicles/batch-status/', admin_views.BatchStatus, name='admin_batch_status'),
     path('vehicle/<int:bike_id>/status/', admin_views.UpdateStatus, name='admin_update_status'),
 ]
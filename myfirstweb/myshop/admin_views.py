@@ -1,13 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
 from .models import Admin, Customer, Rental, Bike, BikeCategory, PriceLog
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
+import logging
+import secrets
 from django.utils import timezone
-from django.db import connection
+from datetime import timedelta
+from .availability import availability_index
+from .catalog import bump_catalog_version
+from .procedures import get_procedures
+from . import dashboard, overdue, rollups
+from .admin_queries import filter_bookings, parse_date, search_customers
+from .fleet_import import error_file, import_bikes, read_csv
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, stream_export
+from .admission import admission_controlled, admission_metrics
+from .db_pool import pool_metrics
+from .instrumentation import registry as request_stats
+from .pagination import first_page_query, keyset_page, next_page_query, page_size_from
+
+logger = logging.getLogger(__name__)
 
 # --- Authentication ---
 
 def admin_required(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async_view(request, *args, **kwargs):
+            if not await request.session.ahas_key('admin_id'):
+                return redirect('admin_login')
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_async_view
+
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
         if 'admin_id' not in request.session:
@@ -44,81 +69,254 @@ def AdminLogout(request):
 
 @admin_required
 def AdminDashboard(request):
-    # Basic stats
-    total_bikes = Bike.objects.count()
-    available_bikes = Bike.objects.filter(status='Available').count()
-    active_rentals = Rental.objects.filter(payment_status='Active').count()
-    
-    context = {
-        'total_bikes': total_bikes,
-        'available_bikes': available_bikes,
-        'active_rentals': active_rentals
-    }
+    # All tiles from one aggregate query (or the counter table, if enabled)
+    context = dashboard.dashboard_stats()
     return render(request, 'myshop_template/admin/dashboard.html', context)
 
 @admin_required
 def CustomerList(request):
-    customers = Customer.objects.all().order_by('-created_at')
-    return render(request, 'myshop_template/admin/customer_list.html', {'customers': customers})
+    customers, next_cursor = keyset_page(
+        search_customers(request.GET),
+        'created_at',
+        cursor=request.GET.get('cursor'),
+        page_size=page_size_from(request.GET),
+    )
+    return render(request, 'myshop_template/admin/customer_list.html', {
+        'customers': customers,
+        'query': request.GET.get('q', ''),
+        'next_query': next_page_query(request.GET, next_cursor),
+        'first_query': first_page_query(request.GET),
+    })
 
 @admin_required
 def BookingList(request):
-    rentals = Rental.objects.all().order_by('-created_at')
-    return render(request, 'myshop_template/admin/booking_list.html', {'rentals': rentals})
+    # Keyset pagination on (created_at, rental_id) with customer/bike joined in
+    rentals, next_cursor = keyset_page(
+        filter_bookings(request.GET),
+        'created_at',
+        cursor=request.GET.get('cursor'),
+        page_size=page_size_from(request.GET),
+    )
+    return render(request, 'myshop_template/admin/booking_list.html', {
+        'rentals': rentals,
+        'filters': request.GET,
+        'status_choices': Rental.PAYMENT_STATUS_CHOICES,
+        'next_query': next_page_query(request.GET, next_cursor),
+        'first_query': first_page_query(request.GET),
+    })
 
 @admin_required
+@admission_controlled('admin_writes')
 def CompleteBooking(request, rental_id):
     if request.method == 'POST':
         try:
-            # Use Stored Procedure: AdminReturnBike
-            # AdminReturnBike(p_rental_id)
+            # AdminReturnBike(p_rental_id) (via the procedure backend)
             # This sets actual_return_date to NOW() and payment_status to 'Done'
             # Trigger trg_bike_returned will set bike status to 'Available'
             
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminReturnBike(%s)", [rental_id])
+            before = Rental.objects.filter(pk=rental_id).values_list(
+                'bike_id', 'bike__status', 'payment_status'
+            ).first()
+            
+            get_procedures().return_bike(rental_id)
+            bump_catalog_version()
+            if before:
+                bike_id, bike_status, payment_status = before
+                availability_index.refresh_bike(bike_id)
+                dashboard.rental_returned(payment_status == 'Active', bike_status)
+                overdue.clear([rental_id])
+                rollups.rentals_returned([rental_id])
                 
             # Return success (if called via AJAX) or redirect
             # Assuming this is called via form submission or AJAX
             # Let's support redirection for now as it's simpler
             return redirect('admin_bookings')
-        except Exception as e:
-            # Ideally show error message
-            print(f"Error completing booking: {e}")
+        except Exception:
+            logger.exception("Error completing booking %s", rental_id)
             return redirect('admin_bookings')
     
     return redirect('admin_bookings')
 
+# --- Batch actions (multi-select in the booking / vehicle lists) ---
+
+MAX_BATCH_SIZE = 500
+
+def _batch_ids(request, field):
+    """Distinct integer IDs posted as `field` (repeated), in posted order."""
+    ids, seen = [], set()
+    for value in request.POST.getlist(field):
+        try:
+            item_id = int(value)
+        except (TypeError, ValueError):
+            continue
+        if item_id not in seen:
+            seen.add(item_id)
+            ids.append(item_id)
+    return ids
+
+def _batch_response(results, extra=None):
+    done = sum(1 for _, error in results if error is None)
+    return JsonResponse({
+        'success': done == len(results),
+        'done': done,
+        'failed': len(results) - done,
+        'results': [
+            dict({'id': item_id, 'ok': error is None}, **({'error': error} if error else (extra or {})))
+            for item_id, error in results
+        ],
+    })
+
+@admin_required
+@admission_controlled('admin_writes')
+def BatchReturn(request):
+    """Return many rentals in one transaction; one JSON result per rental."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=405)
+    rental_ids = _batch_ids(request, 'rental_ids')
+    if not rental_ids or len(rental_ids) > MAX_BATCH_SIZE:
+        return JsonResponse({'success': False, 'error': f'Select 1-{MAX_BATCH_SIZE} bookings.'}, status=400)
+
+    before = {
+        rental_id: (bike_id, bike_status, payment_status)
+        for rental_id, bike_id, bike_status, payment_status in Rental.objects.filter(
+            pk__in=rental_ids
+        ).values_list('rental_id', 'bike_id', 'bike__status', 'payment_status')
+    }
+    results = get_procedures().return_bikes(rental_ids)
+    returned = [before[rental_id] for rental_id, error in results if error is None and rental_id in before]
+    if returned:
+        bump_catalog_version()
+        availability_index.refresh_bikes(bike_id for bike_id, _, _ in returned)
+        dashboard.rentals_returned(
+            (payment_status == 'Active', bike_status) for _, bike_status, payment_status in returned
+        )
+        done_ids = [rental_id for rental_id, error in results if error is None]
+        overdue.clear(done_ids)
+        rollups.rentals_returned(done_ids)
+    return _batch_response(results, {'status': 'Done', 'returned_at': timezone.localtime().strftime('%Y-%m-%d %H:%M')})
+
+@admin_required
+@admission_controlled('admin_writes')
+def BatchStatus(request):
+    """Set the status of many bikes in one transaction; one JSON result per bike."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=405)
+    bike_ids = _batch_ids(request, 'bike_ids')
+    new_status = request.POST.get('status')
+    if not bike_ids or len(bike_ids) > MAX_BATCH_SIZE:
+        return JsonResponse({'success': False, 'error': f'Select 1-{MAX_BATCH_SIZE} vehicles.'}, status=400)
+    if new_status not in dict(Bike.STATUS_CHOICES):
+        return JsonResponse({'success': False, 'error': 'Invalid status.'}, status=400)
+
+    old_statuses = dict(Bike.objects.filter(pk__in=bike_ids).values_list('bike_id', 'status'))
+    results = get_procedures().update_bike_statuses(bike_ids, new_status)
+    changed = [bike_id for bike_id, error in results if error is None and bike_id in old_statuses]
+    if changed:
+        bump_catalog_version()
+        availability_index.refresh_bikes(changed)
+        dashboard.bikes_status_changed((old_statuses[bike_id], new_status) for bike_id in changed)
+    return _batch_response(results, {'status': new_status})
+
 @admin_required
 def VehicleList(request):
-    bikes = Bike.objects.all().order_by('category', 'model_name')
+    # The list shows each bike's category: join it in instead of one query per row
+    bikes = Bike.objects.select_related('category').order_by('category', 'model_name')
     return render(request, 'myshop_template/admin/vehicle_list.html', {'bikes': bikes})
 
+# --- Monitoring ---
+
+@admin_required
+def RequestStats(request):
+    """Rolling per-view latency / query stats from RequestStatsMiddleware (POST resets),
+    plus the DB pool and admission-control counters."""
+    if request.method == 'POST':
+        request_stats.reset()
+    stats = request_stats.snapshot()
+    stats['db_pools'] = pool_metrics()
+    stats['admission'] = admission_metrics()
+    return JsonResponse(stats)
+
+# --- Reports ---
+
+@admin_required
+def Reports(request):
+    """Revenue and utilization per category or bike, from the daily/monthly rollups."""
+    today = timezone.localdate()
+    date_to = parse_date(request.GET.get('date_to')) or today
+    date_from = parse_date(request.GET.get('date_from')) or date_to - timedelta(days=89)
+    group = request.GET.get('group')
+    if group not in rollups.REPORT_GROUPS:
+        group = 'category'
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+
+    rows = rollups.report(date_from, date_to, group)
+    totals = {
+        'bookings': sum(row['bookings'] for row in rows),
+        'revenue': sum((row['revenue'] for row in rows), 0),
+        'rented_hours': sum((row['rented_hours'] for row in rows), 0),
+    }
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'group': group,
+            'rows': [
+                dict(row, revenue=str(row['revenue']), rented_hours=float(row['rented_hours']))
+                for row in rows
+            ],
+        })
+    return render(request, 'myshop_template/admin/reports.html', {
+        'rows': rows,
+        'totals': totals,
+        'group': group,
+        'date_from': date_from,
+        'date_to': date_to,
+    })
+
+# --- Exports ---
+
+@admin_required
+def ExportData(request, dataset):
+    """Stream rentals / customers / bikes as CSV or JSON Lines, using the list filters."""
+    fmt = request.GET.get('format', 'csv')
+    if dataset not in EXPORT_COLUMNS or fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+
+    response = StreamingHttpResponse(
+        stream_export(dataset, fmt, request.GET),
+        content_type=EXPORT_FORMATS[fmt],
+    )
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 # --- Vehicle Management (CRUD) ---
 
 @admin_required
+@admission_controlled('admin_writes')
 def CreateModel(request):
-    """Form to add a new car/bike model using Stored Procedure."""
+    """Form to add a new car/bike model (AdminAddBike procedure)."""
     categories = BikeCategory.objects.all()
     
     if request.method == 'POST':
         try:
-            # Use Stored Procedure: AdminAddBike
             # AdminAddBike(p_model_name, p_license_plate, p_category_name, p_description, p_engine_size, p_image_url)
             
             # Need category NAME, not ID for the procedure as currently written in SQL dump
             category_id = request.POST.get('category_id')
             category = BikeCategory.objects.get(pk=category_id)
             
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminAddBike(%s, %s, %s, %s, %s, %s)", [
-                    request.POST.get('model_name'),
-                    request.POST.get('license_plate'),
-                    category.name,
-                    request.POST.get('description'),
-                    request.POST.get('engine_size'),
-                    request.POST.get('image_url')
-                ])
+            get_procedures().add_bike(
+                request.POST.get('model_name'),
+                request.POST.get('license_plate'),
+                category.name,
+                request.POST.get('description'),
+                request.POST.get('engine_size'),
+                request.POST.get('image_url')
+            )
+            bump_catalog_version()
+            dashboard.bike_added()
             
             return redirect('admin_vehicles')
         except Exception as e:
@@ -134,8 +332,9 @@ def CreateModel(request):
     })
 
 @admin_required
+@admission_controlled('admin_writes')
 def AddInventory(request):
-    """Form to add a vehicle to an existing model using Stored Procedure."""
+    """Form to add a vehicle to an existing model (AdminAddBikeFromExisting procedure)."""
     if request.method == 'POST':
         source_bike_id = request.POST.get('source_bike_id')
         new_license_plate = request.POST.get('license_plate')
@@ -144,14 +343,10 @@ def AddInventory(request):
             # Get the model name from the source bike
             source_bike = Bike.objects.get(pk=source_bike_id)
             
-            # Use Stored Procedure: AdminAddBikeFromExisting
             # AdminAddBikeFromExisting(p_model_name, p_new_license_plate)
-            
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminAddBikeFromExisting(%s, %s)", [
-                    source_bike.model_name,
-                    new_license_plate
-                ])
+            get_procedures().add_bike_from_existing(source_bike.model_name, new_license_plate)
+            bump_catalog_version()
+            dashboard.bike_added()
                 
             return redirect('admin_vehicles')
         except Exception as e:
@@ -167,36 +362,74 @@ def AddInventory(request):
     return render(request, 'myshop_template/admin/add_inventory.html', {'bikes': bikes})
 
 @admin_required
+@admission_controlled('admin_writes')
+def BulkImport(request):
+    """Upload a CSV of bikes and insert them in batches."""
+    context = {}
+    if request.method == 'POST':
+        upload = request.FILES.get('csv_file')
+        if not upload:
+            context['error'] = 'Please choose a CSV file.'
+        else:
+            try:
+                result = import_bikes(read_csv(upload), dry_run=bool(request.POST.get('dry_run')))
+            except (ValueError, UnicodeDecodeError) as e:
+                context['error'] = str(e)
+            else:
+                if result.created:
+                    bump_catalog_version()
+                    dashboard.bike_added(count=result.created)
+                context['result'] = result
+                context['dry_run'] = bool(request.POST.get('dry_run'))
+                if result.errors:
+                    # Keep the error file around briefly so it can be downloaded
+                    token = secrets.token_urlsafe(16)
+                    cache.set(f'myshop:import-errors:{token}', error_file(result.errors), 3600)
+                    context['errors_token'] = token
+    return render(request, 'myshop_template/admin/bulk_import.html', context)
+
+@admin_required
+def BulkImportErrors(request, token):
+    content = cache.get(f'myshop:import-errors:{token}')
+    if content is None:
+        raise Http404("Error report expired")
+    response = HttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="import-errors.csv"'
+    return response
+
+@admin_required
+@admission_controlled('admin_writes')
 def EditVehicle(request, bike_id):
     bike = get_object_or_404(Bike, pk=bike_id)
     categories = BikeCategory.objects.all()
     
     if request.method == 'POST':
         try:
-            # Use Stored Procedure: AdminUpdateBikeInfo
             # AdminUpdateBikeInfo(p_bike_id, p_new_model, p_new_plate, p_new_category_name, p_new_description, p_new_engine_size, p_new_image_url)
             
             category_id = request.POST.get('category_id')
             category = BikeCategory.objects.get(pk=category_id)
             
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminUpdateBikeInfo(%s, %s, %s, %s, %s, %s, %s)", [
-                    bike_id,
-                    request.POST.get('model_name'),
-                    request.POST.get('license_plate'),
-                    category.name,
-                    request.POST.get('description'),
-                    request.POST.get('engine_size'),
-                    request.POST.get('image_url')
-                ])
+            get_procedures().update_bike_info(
+                bike_id,
+                request.POST.get('model_name'),
+                request.POST.get('license_plate'),
+                category.name,
+                request.POST.get('description'),
+                request.POST.get('engine_size'),
+                request.POST.get('image_url')
+            )
+            bump_catalog_version()
                 
             # Handle status change separately
             new_status = request.POST.get('status')
             # Only update status if it's provided and different
             # Note: If status is 'Rented', the form might not send it (disabled select), so we skip
             if new_status and new_status != bike.status:
-                 with connection.cursor() as cursor:
-                    cursor.execute("CALL AdminUpdateBikeStatus(%s, %s)", [bike_id, new_status])
+                 get_procedures().update_bike_status(bike_id, new_status)
+                 availability_index.refresh_bike(bike_id)
+                 bump_catalog_version()
+                 dashboard.bike_status_changed(bike.status, new_status)
 
             return redirect('admin_vehicles')
         except Exception as e:
@@ -214,6 +447,7 @@ def EditVehicle(request, bike_id):
     })
 
 @admin_required
+@admission_controlled('admin_writes')
 def DeleteVehicle(request, bike_id):
     bike = get_object_or_404(Bike, pk=bike_id)
     
@@ -235,10 +469,10 @@ def DeleteVehicle(request, bike_id):
             })
         
         try:
-            # Use Stored Procedure: AdminDeleteBike
             # AdminDeleteBike(p_bike_id)
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminDeleteBike(%s)", [bike_id])
+            get_procedures().delete_bike(bike_id)
+            bump_catalog_version()
+            dashboard.bike_removed(bike.status)
             return redirect('admin_vehicles')
         except Exception as e:
              # If delete fails (e.g. trigger prevents deleting rented bike), show error
@@ -259,16 +493,19 @@ def DeleteVehicle(request, bike_id):
 # --- Status Logic ---
 
 @admin_required
+@admission_controlled('admin_writes')
 def UpdateStatus(request, bike_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         
         try:
             # Just a normal status update (e.g. Available -> Fix)
-            # Use Stored Procedure: AdminUpdateBikeStatus
             # AdminUpdateBikeStatus(p_bike_id, p_new_status)
-            with connection.cursor() as cursor:
-                cursor.execute("CALL AdminUpdateBikeStatus(%s, %s)", [bike_id, new_status])
+            old_status = Bike.objects.filter(pk=bike_id).values_list('status', flat=True).first()
+            get_procedures().update_bike_status(bike_id, new_status)
+            availability_index.refresh_bike(bike_id)
+            bump_catalog_version()
+            dashboard.bike_status_changed(old_status, new_status)
             
             return JsonResponse({'success': True})
         except Exception as e:
@@ -0,0 +1,203 @@
+"""
+Admission control for the write paths (checkout commits, admin writes).
+
+Each gate admits at most `limit` requests at once in this process. Up to
+`queue` more wait their turn, first come first served, for at most `timeout`
+seconds; beyond that a request is shed at once with a 503 and a Retry-After
+header, instead of piling up on MySQL's row locks and slowing every other
+page down. Gates are configured in ADMISSION_GATES:
+{name: {"limit": n, "queue": n, "timeout": seconds}}.
+
+Sync views wait on a threading.Event, async views on a future of their
+event loop, so one gate serves both. A released slot is handed straight to
+the oldest waiter, which is then already counted as admitted.
+
+The checkout views take the "booking" gate around the commit only (repeated
+submissions and known conflicts are answered before it); the admin write
+views are wrapped whole with `@admission_controlled("admin_writes")`. The
+counters of every gate are in the admin stats endpoint.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+DEFAULT_GATE = {"limit": 8, "queue": 32, "timeout": 3}
+
+_ADMITTED, _QUEUED, _SHED = "admitted", "queued", "shed"
+
+
+class _Waiter:
+    __slots__ = ("notify", "granted")
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.granted = False
+
+
+class Gate:
+    def __init__(self, name, limit, queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.in_flight = 0
+        # Counters since start
+        self.admitted = 0  # Let through, at once or after waiting
+        self.queued = 0  # Had to wait
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    def config(self):
+        return {"limit": self.limit, "queue": self.queue, "timeout": self.timeout}
+
+    def _enter(self, waiter):
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return _ADMITTED
+            if len(self._waiters) >= self.queue:
+                self.shed_queue_full += 1
+                return _SHED
+            self._waiters.append(waiter)
+            self.queued += 1
+            return _QUEUED
+
+    def _give_up(self, waiter):
+        """A waiter stops waiting; returns True if it was granted the slot meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.shed_timeout += 1
+            return False
+
+    def acquire(self):
+        """Wait for a slot; returns False if the request is to be shed."""
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        state = self._enter(waiter)
+        if state != _QUEUED:
+            return state == _ADMITTED
+        return event.wait(self.timeout) or self._give_up(waiter)
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+        state = self._enter(waiter)
+        if state != _QUEUED:
+            return state == _ADMITTED
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._give_up(waiter)
+        except asyncio.CancelledError:
+            # The client went away: do not keep a slot nobody will release
+            if self._give_up(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot over: in_flight stays the same
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.admitted += 1
+            else:
+                self.in_flight -= 1
+                return
+        waiter.notify()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                **self.config(),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed_queue_full": self.shed_queue_full,
+                "shed_timeout": self.shed_timeout,
+                "shed": self.shed_queue_full + self.shed_timeout,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def gate(name):
+    """The process-wide gate `name`, configured from ADMISSION_GATES."""
+    config = dict(DEFAULT_GATE, **getattr(settings, "ADMISSION_GATES", {}).get(name, {}))
+    current = _gates.get(name)
+    if current is None or current.config() != config:
+        with _gates_lock:
+            current = _gates.get(name)
+            if current is None or current.config() != config:
+                current = _gates[name] = Gate(name, **config)
+    return current
+
+
+def admission_metrics():
+    return {name: current.metrics() for name, current in sorted(_gates.items())}
+
+
+def shed_response(request):
+    """503 telling the client to come back in ADMISSION_RETRY_AFTER seconds."""
+    message = "We are handling a lot of requests right now. Please try again in a few seconds."
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest" or "json" in request.headers.get("Accept", ""):
+        response = JsonResponse({"success": False, "busy": True, "message": message}, status=503)
+    else:
+        response = HttpResponse(message, status=503, content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(getattr(settings, "ADMISSION_RETRY_AFTER", 2))
+    return response
+
+
+def admission_controlled(name):
+    """Put a view's POSTs behind gate `name`; other methods go straight through."""
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                if request.method != "POST":
+                    return await view_func(request, *args, **kwargs)
+                current = gate(name)
+                if not await current.aacquire():
+                    return shed_response(request)
+                try:
+                    return await view_func(request, *args, **kwargs)
+                finally:
+                    current.release()
+            return _wrapped_async_view
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != "POST":
+                return view_func(request, *args, **kwargs)
+            current = gate(name)
+            if not current.acquire():
+                return shed_response(request)
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                current.release()
+        return _wrapped_view
+
+    return decorator
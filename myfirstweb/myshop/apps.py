@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MyshopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myshop'
+
+    def ready(self):
+        # Connect signal receivers (price quote invalidation on PriceLog writes,
+        # the query timer on new database connections)
+        from . import instrumentation, pricing  # noqa: F401
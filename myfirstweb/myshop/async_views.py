@@ -0,0 +1,337 @@
+"""
+Async versions of the booking funnel and the admin list views (ASGI).
+
+Same behaviour and templates as views.py / admin_views.py, but reads go
+through the async ORM and the async session API, so a worker keeps serving
+other sessions while it waits on the database. Catalog / availability /
+pricing helpers are synchronous (in-process caches) and run in one
+sync_to_async hop per request; the blocking booking commit runs on a bounded
+thread pool (ASYNC_BOOKING_WORKERS threads) so a spike of checkouts cannot
+open more database connections than that.
+
+Enabled with the ASYNC_VIEWS setting (MYSHOP_ASYNC_VIEWS=1); serve the app
+with an ASGI server (myfirstweb.asgi) to benefit from it.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+
+from . import admission, dashboard, idempotency, rollups
+from .admin_queries import filter_bookings, search_customers
+from .admin_views import admin_required
+from .availability import availability_index, rental_period
+from .booking import server_timing_header
+from .catalog import bump_catalog_version, get_available_bikes, get_categories, get_category
+from .context_processors import fragment_versions
+from .models import Bike, Rental
+from .pagination import akeyset_page, first_page_query, next_page_query, page_size_from
+from .pricing import get_quote, quote_many
+from .procedures import BookingConflict, get_procedures
+from .views import _booking_conflict
+
+# --- Thread pool for blocking work ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _booking_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ASYNC_BOOKING_WORKERS", 8),
+                    thread_name_prefix="myshop-booking",
+                )
+    return _pool
+
+
+def _in_worker(func, *args):
+    # Pool threads live outside the request cycle, so they clean up their own
+    # connections the way request_started / request_finished would
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the booking pool, keeping the request's context."""
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_booking_pool(), partial(context.run, _in_worker, func, *args))
+
+
+# --- Sync helpers (one thread hop each) ---
+
+def _category_bikes(category_name, rental_data):
+    """(bikes, fragment versions), or (None, None) for an unknown category."""
+    category = get_category(category_name)
+    if category is None:
+        return None, None
+    bikes = get_available_bikes(category)
+    period = rental_period(rental_data)
+    if period:
+        bikes = availability_index.free_bikes(bikes, *period)
+    return bikes, fragment_versions()
+
+
+def _category_quotes(rental_data):
+    """([(category, quote)], fragment versions)"""
+    categories = get_categories()
+    period = rental_period(rental_data)
+    quotes = quote_many(categories, *period) if period else {}
+    return [(category, quotes.get(category.pk)) for category in categories], fragment_versions()
+
+
+def _is_free(bike_id, rental_data):
+    period = rental_period(rental_data)
+    return not period or availability_index.is_free(bike_id, *period)
+
+
+def _commit_booking(customer_data, rental_data, bike_id, old_bike_status):
+    try:
+        booking = get_procedures().commit_booking(customer_data, rental_data, bike_id)
+    except BookingConflict:
+        availability_index.refresh_bike(bike_id)
+        raise
+    availability_index.refresh_bike(bike_id)
+    bump_catalog_version()
+    dashboard.rental_created(booking.total_price, old_bike_status, booking.bike_status)
+    rollups.period_booked(*rental_period(rental_data))
+    return booking
+
+
+# --- Booking funnel ---
+
+async def Home(request):
+    return render(request, "myshop_template/home.html")
+
+
+async def clear_session(request):
+    """Clear the booking draft and redirect to dates page"""
+    await request.draft.aflush()
+    return redirect("dates")
+
+
+async def Dates(request):
+    initial_data = await request.draft.aget("rental_data", {})
+    if request.method == "POST":
+        await request.draft.aset("rental_data", {
+            "email": request.POST.get("email"),
+            "pickup_date": request.POST.get("pickup_date"),
+            "pickup_time": request.POST.get("pickup_time"),
+            "return_date": request.POST.get("return_date"),
+            "return_time": request.POST.get("return_time"),
+        })
+        return redirect("bikes")
+    return render(
+        request, "myshop_template/1-dates.html", {"initial_data": initial_data}
+    )
+
+
+async def Bikes(request):
+    draft = request.draft
+    rental_data = await draft.aget("rental_data")
+    if rental_data is None:
+        return redirect("dates")
+
+    if request.method == "POST":
+        category = request.POST.get("category")
+        bike_id = request.POST.get("bike_id")
+
+        if category:
+            await draft.aset("selected_category", category)
+            return redirect("bikes")
+        elif bike_id:
+            await draft.aset("selected_bike_id", bike_id)
+            await draft.apop("selected_category", None)
+            return redirect("customer")
+
+    if request.GET.get("clear_category"):
+        await draft.apop("selected_category", None)
+        return redirect("bikes")
+
+    selected_category = await draft.aget("selected_category")
+    if selected_category:
+        category_bikes, versions = await sync_to_async(_category_bikes)(selected_category, rental_data)
+        if category_bikes is None:
+            await draft.apop("selected_category", None)
+            return redirect("bikes")
+        return render(
+            request,
+            "myshop_template/2-bikes-category.html",
+            {
+                "category": selected_category,
+                "bikes": category_bikes,
+                # Cache key of the bike cards fragment
+                "bike_ids": [bike.bike_id for bike in category_bikes],
+                **versions,
+            },
+        )
+
+    category_quotes, versions = await sync_to_async(_category_quotes)(rental_data)
+    return render(
+        request,
+        "myshop_template/2-bikes.html",
+        {
+            "categories": [category for category, _ in category_quotes],
+            "category_quotes": category_quotes,
+            **versions,
+        },
+    )
+
+
+async def CustomerView(request):
+    draft = request.draft
+    if not await draft.ahas_key("rental_data") or not await draft.ahas_key("selected_bike_id"):
+        return redirect("dates")
+
+    initial_data = await draft.aget("customer_data", {})
+
+    if request.method == "POST":
+        await draft.aset("customer_data", {
+            "first_name": request.POST.get("first_name"),
+            "last_name": request.POST.get("last_name"),
+            "phone": request.POST.get("phone"),
+            "citizen_id": request.POST.get("citizen_id"),
+            "line_id": request.POST.get("line_id"),
+        })
+        return redirect("checkout")
+
+    return render(
+        request, "myshop_template/3-customer.html", {"initial_data": initial_data}
+    )
+
+
+async def Checkout(request):
+    key = idempotency.submitted_key(request) if request.method == "POST" else None
+    replayed = await idempotency.areplay(key)
+    if replayed is not None:
+        return replayed
+
+    draft = request.draft
+    rental_data = await draft.aget("rental_data")
+    customer_data = await draft.aget("customer_data")
+    bike_id = await draft.aget("selected_bike_id")
+    if rental_data is None or customer_data is None or bike_id is None:
+        return redirect("dates")
+
+    bike = await Bike.objects.select_related("category").aget(pk=bike_id)
+
+    pickup_date = datetime.strptime(rental_data["pickup_date"], "%Y-%m-%d")
+    return_date = datetime.strptime(rental_data["return_date"], "%Y-%m-%d")
+    quote = await sync_to_async(get_quote)(bike.category, pickup_date, return_date)
+
+    if request.method == "POST":
+        if key != await draft.aget(idempotency.DRAFT_KEY):
+            key = None
+        elif not await idempotency.aclaim(key):
+            return await idempotency.areplay(key) or idempotency.still_pending()
+
+        if not await sync_to_async(_is_free)(bike_id, rental_data):
+            return await idempotency.afinish(key, _booking_conflict())
+
+        gate = admission.gate("booking")
+        if not await gate.aacquire():
+            await idempotency.arelease(key)
+            return admission.shed_response(request)
+
+        try:
+            booking = await run_blocking(_commit_booking, customer_data, rental_data, bike_id, bike.status)
+        except BookingConflict:
+            return await idempotency.afinish(key, _booking_conflict())
+        except Exception as e:
+            await idempotency.arelease(key)
+            return JsonResponse(
+                {"success": False, "message": f"Booking Failed: {str(e)}"}
+            )
+        finally:
+            gate.release()
+
+        await draft.aflush()
+
+        response = JsonResponse(
+            {
+                "success": True,
+                "message": "Booking Confirmed, Thank you!",
+                "rental_id": booking.rental_id,
+            }
+        )
+        response["Server-Timing"] = server_timing_header(booking.timings)
+        return await idempotency.afinish(key, response)
+
+    key = idempotency.new_key()
+    await draft.aset(idempotency.DRAFT_KEY, key)
+    return render(
+        request,
+        "myshop_template/4-checkout.html",
+        {
+            "rental": rental_data,
+            "customer": customer_data,
+            "bike": bike,
+            "quote": quote,
+            "rental_days": quote.days,
+            "rental_price": quote.rental_price,
+            "deposit_amount": quote.deposit,
+            "total_price": quote.total,
+            "idempotency_key": key,
+        },
+    )
+
+
+# --- Admin lists ---
+
+@admin_required
+async def CustomerList(request):
+    customers, next_cursor = await akeyset_page(
+        search_customers(request.GET),
+        'created_at',
+        cursor=request.GET.get('cursor'),
+        page_size=page_size_from(request.GET),
+    )
+    return render(request, 'myshop_template/admin/customer_list.html', {
+        'customers': customers,
+        'query': request.GET.get('q', ''),
+        'next_query': next_page_query(request.GET, next_cursor),
+        'first_query': first_page_query(request.GET),
+    })
+
+
+@admin_required
+async def BookingList(request):
+    rentals, next_cursor = await akeyset_page(
+        filter_bookings(request.GET),
+        'created_at',
+        cursor=request.GET.get('cursor'),
+        page_size=page_size_from(request.GET),
+    )
+    return render(request, 'myshop_template/admin/booking_list.html', {
+        'rentals': rentals,
+        'filters': request.GET,
+        'status_choices': Rental.PAYMENT_STATUS_CHOICES,
+        'next_query': next_page_query(request.GET, next_cursor),
+        'first_query': first_page_query(request.GET),
+    })
+
+
+@admin_required
+async def VehicleList(request):
+    # The template shows each bike's category, so join it in up front
+    bikes = [
+        bike async for bike in
+        Bike.objects.select_related('category').order_by('category', 'model_name')
+    ]
+    return render(request, 'myshop_template/admin/vehicle_list.html', {'bikes': bikes})
@@ -0,0 +1,159 @@
+"""
+In-process availability engine for the booking flow.
+
+Keeps an interval index of active rentals per bike so the bikes page can hide
+bikes that are already booked for the customer's pickup/return window, instead
+of letting CreateRental's trigger reject them at checkout.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Rental
+
+
+def rental_period(rental_data):
+    """Return (start, end) aware datetimes from the session's rental_data, or None."""
+    try:
+        start = _parse_datetime(rental_data["pickup_date"], rental_data.get("pickup_time"))
+        end = _parse_datetime(rental_data["return_date"], rental_data.get("return_time"))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if end <= start:
+        return None
+    return start, end
+
+
+def _parse_datetime(date_str, time_str):
+    if time_str:
+        value = datetime.strptime(f"{date_str} {time_str[:5]}", "%Y-%m-%d %H:%M")
+    else:
+        value = datetime.strptime(date_str, "%Y-%m-%d")
+    return timezone.make_aware(value, timezone.get_current_timezone())
+
+
+class _BikeIntervals:
+    """Active rentals of one bike, sorted by start, with a running max of end dates."""
+
+    __slots__ = ("starts", "max_ends")
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.max_ends = []
+        running = None
+        for _, end in intervals:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def overlaps(self, start, end):
+        # Intervals whose start is before `end` are candidates; the bike is busy
+        # if the latest end among them is after `start`.
+        k = bisect_left(self.starts, end)
+        return k > 0 and self.max_ends[k - 1] > start
+
+
+class AvailabilityIndex:
+    """Interval index of Active rentals keyed by bike_id.
+
+    The whole index is rebuilt lazily once it is older than
+    AVAILABILITY_INDEX_TTL seconds (to pick up writes from other processes),
+    and single bikes are refreshed right after this process writes to them.
+    """
+
+    def __init__(self, ttl=None):
+        self._lock = threading.Lock()
+        self._bikes = {}
+        self._loaded_at = None
+        self.ttl = ttl
+
+    def _get_ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, "AVAILABILITY_INDEX_TTL", 60)
+
+    def _active_rentals(self):
+        return Rental.objects.filter(payment_status="Active")
+
+    def rebuild(self):
+        grouped = {}
+        rows = self._active_rentals().values_list("bike_id", "start_date", "end_date")
+        for bike_id, start, end in rows:
+            grouped.setdefault(bike_id, []).append((start, end))
+        bikes = {bike_id: _BikeIntervals(intervals) for bike_id, intervals in grouped.items()}
+        with self._lock:
+            self._bikes = bikes
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self._get_ttl():
+            self.rebuild()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def refresh_bike(self, bike_id):
+        """Reload the intervals of a single bike after a write."""
+        if self._loaded_at is None:
+            return
+        bike_id = int(bike_id)
+        intervals = list(
+            self._active_rentals()
+            .filter(bike_id=bike_id)
+            .values_list("start_date", "end_date")
+        )
+        with self._lock:
+            if intervals:
+                self._bikes[bike_id] = _BikeIntervals(intervals)
+            else:
+                self._bikes.pop(bike_id, None)
+
+    def refresh_bikes(self, bike_ids):
+        """Reload the intervals of several bikes in one query (batch writes)."""
+        if self._loaded_at is None:
+            return
+        bike_ids = {int(bike_id) for bike_id in bike_ids}
+        if not bike_ids:
+            return
+        grouped = {}
+        rows = self._active_rentals().filter(bike_id__in=bike_ids).values_list("bike_id", "start_date", "end_date")
+        for bike_id, start, end in rows:
+            grouped.setdefault(bike_id, []).append((start, end))
+        with self._lock:
+            for bike_id in bike_ids:
+                if bike_id in grouped:
+                    self._bikes[bike_id] = _BikeIntervals(grouped[bike_id])
+                else:
+                    self._bikes.pop(bike_id, None)
+
+    def refresh_rental(self, rental_id):
+        """Reload the bike a rental belongs to (e.g. after it was returned)."""
+        if self._loaded_at is None:
+            return
+        bike_id = Rental.objects.filter(pk=rental_id).values_list("bike_id", flat=True).first()
+        if bike_id is not None:
+            self.refresh_bike(bike_id)
+
+    def is_free(self, bike_id, start, end):
+        self._ensure_fresh()
+        intervals = self._bikes.get(int(bike_id))
+        return intervals is None or not intervals.overlaps(start, end)
+
+    def free_bikes(self, bikes, start, end):
+        """Filter an iterable of Bike objects down to those free for [start, end)."""
+        self._ensure_fresh()
+        index = self._bikes
+        return [
+            bike for bike in bikes
+            if bike.bike_id not in index or not index[bike.bike_id].overlaps(start, end)
+        ]
+
+
+availability_index = AvailabilityIndex()
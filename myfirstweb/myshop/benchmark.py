@@ -0,0 +1,485 @@
+"""
+Load-testing benchmark for the booking funnel and the admin list pages.
+
+Each simulated customer walks Dates -> Bikes -> CustomerView -> Checkout with
+its own session, either in-process through Django's test client or over HTTP
+against a running server. Latency, throughput and queries per request (read
+from the Server-Timing header added by RequestStatsMiddleware) are reported
+per step and can be checked against a budget file or a previous run.
+
+With --async the sessions run on one event loop through the ASGI handler
+(AsyncClient), which is how to compare the async views (ASYNC_VIEWS) with the
+threaded sync ones at a given number of concurrent sessions.
+
+In-process runs get a fresh test database of their own, seeded with the
+synthetic dataset for the run's seed, so they are reproducible and never
+write to the configured databases. Running against those (in-process, or a
+server over HTTP whose checkout POSTs book real bikes) takes an explicit
+`configured_db`.
+"""
+
+import asyncio
+import http.cookiejar
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from . import dashboard
+from .availability import availability_index
+from .catalog import bump_catalog_version
+from .instrumentation import percentile
+from .models import Admin
+from .pricing import invalidate_quotes
+from .procedures import get_procedures
+from .synthetic import DatasetGenerator
+
+Sample = namedtuple("Sample", ["step", "ms", "status", "queries", "ok"])
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+CATEGORY_RE = re.compile(r'name="category"\s+value="([^"]+)"')
+BIKE_RE = re.compile(r'name="bike_id"\s+value="(\d+)"')
+IDEMPOTENCY_KEY_RE = re.compile(r'name="idempotency_key"\s+value="([^"]*)"')
+
+# Seeded into the isolated database; override per run with `dataset`
+DATASET = {"categories": 4, "bikes": 100, "customers": 1000, "rentals": 5000, "price_logs": 6}
+
+ADMIN_PAGES = [
+    ("admin.dashboard", "/shop-admin/dashboard/"),
+    ("admin.bookings", "/shop-admin/bookings/"),
+    ("admin.customers", "/shop-admin/customers/"),
+    ("admin.vehicles", "/shop-admin/vehicles/"),
+]
+
+
+# --- Transports ---
+
+class InProcessTransport:
+    """Requests through django.test.Client (no network, same process)."""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(HTTP_HOST="localhost")
+
+    def request(self, method, path, data=None):
+        if method == "POST":
+            response = self.client.post(path, data or {})
+        else:
+            response = self.client.get(path)
+        if response.streaming:
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, response.get("Server-Timing", ""), body
+
+
+class AsyncInProcessTransport:
+    """Requests through django.test.AsyncClient (the ASGI handler, same process)."""
+
+    def __init__(self):
+        from django.test import AsyncClient
+
+        class LocalhostAsyncClient(AsyncClient):
+            # AsyncClient always sends "Host: testserver"; use the host the
+            # sync transport uses so ALLOWED_HOSTS needs no test-only entry
+            def _base_scope(self, **request):
+                scope = super()._base_scope(**request)
+                scope["headers"] = [
+                    (name, b"localhost" if name == b"host" else value)
+                    for name, value in scope["headers"]
+                ]
+                return scope
+
+        self.client = LocalhostAsyncClient()
+
+    async def request(self, method, path, data=None):
+        if method == "POST":
+            response = await self.client.post(path, data or {})
+        else:
+            response = await self.client.get(path)
+        if response.streaming:
+            if response.is_async:
+                body = b"".join([chunk async for chunk in response.streaming_content])
+            else:
+                body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, response.get("Server-Timing", ""), body
+
+
+class HttpTransport:
+    """Requests over HTTP with a cookie jar, sending the CSRF token on POST."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {}
+        if method == "POST":
+            body = urllib.parse.urlencode(data or {}).encode()
+            headers["X-CSRFToken"] = self._csrf_token()
+            headers["Referer"] = url
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req) as response:
+                return response.status, response.headers.get("Server-Timing", ""), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("Server-Timing", ""), e.read()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects are timed as their own step, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# --- Scenarios ---
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def call(self, transport, step, method, path, data=None, check=None):
+        started = time.perf_counter()
+        status, server_timing, body = transport.request(method, path, data)
+        self._record(step, started, status, server_timing, body, check)
+        return status, body
+
+    async def acall(self, transport, step, method, path, data=None, check=None):
+        started = time.perf_counter()
+        status, server_timing, body = await transport.request(method, path, data)
+        self._record(step, started, status, server_timing, body, check)
+        return status, body
+
+    def _record(self, step, started, status, server_timing, body, check):
+        ms = (time.perf_counter() - started) * 1000
+        match = QUERIES_RE.search(server_timing)
+        ok = status < 400 and (check is None or check(body))
+        with self._lock:
+            self.samples.append(Sample(step, ms, status, int(match.group(1)) if match else None, ok))
+
+
+def _booking_ok(body):
+    try:
+        return json.loads(body).get("success", False)
+    except ValueError:
+        return False
+
+
+def funnel_requests(rng, checkout=True):
+    """One customer session through the four booking steps.
+
+    A generator of (step, method, path, data, check) requests; the response
+    body of each request is sent back in, so the same scenario drives both
+    the sync and the async runners.
+    """
+    pickup = date.today() + timedelta(days=rng.randint(30, 3000))
+    rental_days = rng.randint(1, 14)
+    yield "funnel.dates.get", "GET", "/dates/", None, None
+    yield "funnel.dates.post", "POST", "/dates/", {
+        "email": f"bench{rng.randint(0, 10**9)}@example.com",
+        "pickup_date": pickup.isoformat(),
+        "pickup_time": "10:00",
+        "return_date": (pickup + timedelta(days=rental_days)).isoformat(),
+        "return_time": "10:00",
+    }, None
+
+    body = yield "funnel.categories.get", "GET", "/bikes/", None, None
+    categories = CATEGORY_RE.findall(body.decode("utf-8", "replace"))
+    if not categories:
+        return
+    yield "funnel.categories.post", "POST", "/bikes/", {"category": rng.choice(categories)}, None
+
+    body = yield "funnel.bikes.get", "GET", "/bikes/", None, None
+    bikes = BIKE_RE.findall(body.decode("utf-8", "replace"))
+    if not bikes:
+        return
+    yield "funnel.bikes.post", "POST", "/bikes/", {"bike_id": rng.choice(bikes)}, None
+
+    yield "funnel.customer.get", "GET", "/customer/", None, None
+    yield "funnel.customer.post", "POST", "/customer/", {
+        "first_name": "Bench",
+        "last_name": f"User{rng.randint(0, 10**6)}",
+        "phone": f"08{rng.randint(0, 10**8 - 1):08d}",
+        "citizen_id": f"{rng.randint(10**12, 10**13 - 1)}",
+        "line_id": "bench",
+    }, None
+
+    body = yield "funnel.checkout.get", "GET", "/checkout/", None, None
+    if checkout:
+        # Post the form's idempotency key back, as the browser does
+        key = IDEMPOTENCY_KEY_RE.search(body.decode("utf-8", "replace"))
+        data = {"idempotency_key": key.group(1)} if key else None
+        yield "funnel.checkout.post", "POST", "/checkout/", data, _booking_ok
+
+
+def admin_requests(username, password):
+    yield "admin.login", "POST", "/shop-admin/login/", {
+        "username": username,
+        "password": password,
+    }, None
+    for step, path in ADMIN_PAGES:
+        yield step, "GET", path, None, None
+
+
+def run_scenario(transport, recorder, requests):
+    body = None
+    try:
+        while True:
+            step, method, path, data, check = requests.send(body)
+            _, body = recorder.call(transport, step, method, path, data, check)
+    except StopIteration:
+        pass
+
+
+async def arun_scenario(transport, recorder, requests):
+    body = None
+    try:
+        while True:
+            step, method, path, data, check = requests.send(body)
+            _, body = await recorder.acall(transport, step, method, path, data, check)
+    except StopIteration:
+        pass
+
+
+def run_funnel(transport, recorder, rng, checkout=True):
+    run_scenario(transport, recorder, funnel_requests(rng, checkout))
+
+
+def run_admin(transport, recorder, username, password):
+    run_scenario(transport, recorder, admin_requests(username, password))
+
+
+# --- Runner and report ---
+
+def summarize(samples, elapsed):
+    steps = {}
+    for sample in samples:
+        steps.setdefault(sample.step, []).append(sample)
+
+    report = {}
+    for step, items in sorted(steps.items()):
+        latencies = sorted(item.ms for item in items)
+        queries = [item.queries for item in items if item.queries is not None]
+        report[step] = {
+            "requests": len(items),
+            "errors": sum(1 for item in items if not item.ok),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "avg_queries": round(sum(queries) / len(queries), 2) if queries else None,
+            "max_queries": max(queries) if queries else None,
+        }
+    total = len(samples)
+    return {
+        "steps": report,
+        "overall": {
+            "requests": total,
+            "errors": sum(1 for sample in samples if not sample.ok),
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        },
+    }
+
+
+async def _run_async(recorder, sessions, concurrency, seed, checkout, admin_user, admin_password, admin_rounds):
+    # `concurrency` sessions in flight on one event loop
+    limit = asyncio.Semaphore(concurrency)
+
+    async def task(requests):
+        async with limit:
+            await arun_scenario(AsyncInProcessTransport(), recorder, requests)
+
+    tasks = [
+        task(funnel_requests(random.Random(seed * 100003 + i), checkout))
+        for i in range(sessions)
+    ]
+    if admin_user:
+        tasks += [task(admin_requests(admin_user, admin_password)) for _ in range(admin_rounds)]
+    await asyncio.gather(*tasks)
+
+
+def _reset_caches():
+    # Process-wide state that may hold rows of the other database
+    bump_catalog_version()
+    availability_index.invalidate()
+    invalidate_quotes()
+
+
+@contextmanager
+def _sqlite_test_files():
+    # Concurrent writers on SQLite's shared in-memory test database fail with
+    # "database table is locked" instead of waiting for each other
+    with tempfile.TemporaryDirectory() as directory:
+        changed = []
+        for alias in connections:
+            test_settings = connections[alias].settings_dict["TEST"]
+            if connections[alias].vendor == "sqlite" and not test_settings.get("NAME"):
+                test_settings["NAME"] = os.path.join(directory, f"{alias}.sqlite3")
+                changed.append(test_settings)
+        try:
+            yield
+        finally:
+            for test_settings in changed:
+                test_settings["NAME"] = None
+
+
+@contextmanager
+def isolated_database(seed=1, dataset=None, admin_user=None, admin_password=None):
+    """Swap the configured databases for fresh test ones seeded from `seed`.
+
+    Migrations do not create MySQL's stored procedures and triggers, so
+    bookings go through the "orm" procedure backend meanwhile.
+    """
+    with _sqlite_test_files():
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            with override_settings(PROCEDURE_BACKEND="orm"):
+                DatasetGenerator(seed=seed).generate(**{**DATASET, **(dataset or {})})
+                if admin_user:
+                    Admin.objects.create(username=admin_user, password=admin_password or "", role="Owner")
+                if dashboard.counters_enabled():
+                    dashboard.rebuild_counters()
+                _reset_caches()
+                yield
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            _reset_caches()
+
+
+def run_benchmark(sessions=50, concurrency=4, seed=1, base_url=None, checkout=True,
+                  admin_user=None, admin_password=None, admin_rounds=0, use_async=False,
+                  configured_db=False, dataset=None):
+    """Run `sessions` funnel walks (plus optional admin rounds) and return the report.
+
+    With `use_async` the sessions run in-process on one event loop through the
+    ASGI handler instead of on `concurrency` threads through the WSGI one.
+    In-process runs use `isolated_database(seed, dataset)` unless
+    `configured_db` is set; checkout against a server at `base_url` writes to
+    its database and needs `configured_db` too.
+    """
+    if base_url and checkout and not configured_db:
+        raise ValueError("Checkout against a running server books real bikes; pass configured_db=True.")
+    if base_url or configured_db:
+        database = nullcontext()
+    else:
+        database = isolated_database(seed, dataset, admin_user, admin_password)
+    with database:
+        report = _run(sessions, concurrency, seed, base_url, checkout,
+                      admin_user, admin_password, admin_rounds, use_async)
+    report["config"]["database"] = "configured" if base_url or configured_db else "isolated"
+    return report
+
+
+def _run(sessions, concurrency, seed, base_url, checkout, admin_user, admin_password, admin_rounds, use_async):
+    recorder = Recorder()
+    if use_async:
+        started = time.perf_counter()
+        asyncio.run(_run_async(
+            recorder, sessions, concurrency, seed, checkout, admin_user, admin_password, admin_rounds
+        ))
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return _report(recorder, elapsed, sessions, concurrency, seed, "in-process (asgi)",
+                       checkout, admin_rounds if admin_user else 0)
+
+    def new_transport():
+        return HttpTransport(base_url) if base_url else InProcessTransport()
+
+    def funnel_task(index):
+        try:
+            run_funnel(new_transport(), recorder, random.Random(seed * 100003 + index), checkout)
+        finally:
+            connections.close_all()
+
+    def admin_task(index):
+        try:
+            run_admin(new_transport(), recorder, admin_user, admin_password)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(funnel_task, i) for i in range(sessions)]
+        if admin_user:
+            futures += [pool.submit(admin_task, i) for i in range(admin_rounds)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    return _report(recorder, elapsed, sessions, concurrency, seed, base_url or "in-process",
+                   checkout, admin_rounds if admin_user else 0)
+
+
+def _report(recorder, elapsed, sessions, concurrency, seed, transport, checkout, admin_rounds):
+    report = summarize(recorder.samples, elapsed)
+    report["config"] = {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "seed": seed,
+        "transport": transport,
+        "checkout": checkout,
+        "procedures": get_procedures().name,
+        "async_views": getattr(settings, "ASYNC_VIEWS", False),
+        "admin_rounds": admin_rounds,
+    }
+    return report
+
+
+def check_budgets(report, budgets=None, baseline=None, max_regression=0.2):
+    """Return a list of human-readable budget / regression violations.
+
+    `budgets` maps step -> {"p95_ms": ..., "max_queries": ...}; `baseline` is a
+    previous report, and any step whose p95 grew by more than `max_regression`
+    (a fraction) counts as a regression.
+    """
+    violations = []
+    steps = report["steps"]
+    for step, limits in (budgets or {}).items():
+        result = steps.get(step)
+        if result is None:
+            continue
+        if "p95_ms" in limits and result["p95_ms"] > limits["p95_ms"]:
+            violations.append(f"{step}: p95 {result['p95_ms']}ms > budget {limits['p95_ms']}ms")
+        if "max_queries" in limits and (result["max_queries"] or 0) > limits["max_queries"]:
+            violations.append(f"{step}: {result['max_queries']} queries > budget {limits['max_queries']}")
+    for step, previous in ((baseline or {}).get("steps") or {}).items():
+        result = steps.get(step)
+        if result is None or not previous.get("p95_ms"):
+            continue
+        allowed = previous["p95_ms"] * (1 + max_regression)
+        if result["p95_ms"] > allowed:
+            violations.append(
+                f"{step}: p95 {result['p95_ms']}ms regressed from {previous['p95_ms']}ms "
+                f"(> {max_regression:.0%})"
+            )
+    return violations
@@ -0,0 +1,105 @@
+"""
+Booking commit for the checkout step.
+
+Runs SaveCustomerForBooking and CreateRental exactly once each, inside one
+transaction, as a single multi-statement batch that also returns the new
+customer and rental IDs, and records how long each step took.
+"""
+
+import logging
+import time
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+BookingResult = namedtuple(
+    "BookingResult",
+    ["customer_id", "rental_id", "total_price", "bike_status", "timings"],
+)
+
+# One round trip: both procedures plus the lookup of what they produced (IDs,
+# the trigger-computed price and the bike's new status). The rental is looked
+# up by (customer, bike, start) rather than LAST_INSERT_ID() so the result does
+# not depend on what the procedure's triggers insert.
+BOOKING_BATCH_SQL = """
+SET @customer_id = 0;
+CALL SaveCustomerForBooking(%s, %s, %s, %s, %s, %s, @customer_id);
+CALL CreateRental(@customer_id, %s, %s, %s);
+SELECT @customer_id, r.rental_id, r.total_price, b.status
+FROM rentals r JOIN bikes b ON b.bike_id = r.bike_id
+WHERE r.customer_id = @customer_id AND r.bike_id = %s AND r.start_date = %s
+ORDER BY r.rental_id DESC LIMIT 1;
+"""
+
+
+class StepTimer:
+    """Collects elapsed milliseconds per named step."""
+
+    def __init__(self):
+        self.timings = {}
+        self._started = time.perf_counter()
+        self._last = self._started
+
+    def lap(self, step):
+        now = time.perf_counter()
+        self.timings[step] = (now - self._last) * 1000
+        self._last = now
+
+    def finish(self):
+        self.timings["total"] = (time.perf_counter() - self._started) * 1000
+        return self.timings
+
+
+def server_timing_header(timings, prefix="booking"):
+    """Format step timings as a Server-Timing header value."""
+    return ", ".join(
+        f"{prefix}-{step};dur={duration:.2f}" for step, duration in timings.items()
+    )
+
+
+def _read_last_row(cursor):
+    # Walk every result set: errors raised by later statements (e.g. the
+    # CreateRental trigger rejecting an overlap) only surface on nextset().
+    row = None
+    while True:
+        if cursor.description:
+            row = cursor.fetchone() or row
+        if not cursor.nextset():
+            return row
+
+
+def commit_booking(customer_data, rental_data, bike_id):
+    """Save the customer and create the rental atomically; return a BookingResult."""
+    timer = StepTimer()
+    start_str = f"{rental_data['pickup_date']} {rental_data['pickup_time']}"
+    end_str = f"{rental_data['return_date']} {rental_data['return_time']}"
+    params = [
+        customer_data["citizen_id"],
+        customer_data["first_name"],
+        customer_data["last_name"],
+        customer_data["phone"],
+        rental_data["email"],
+        customer_data["line_id"],
+        bike_id,
+        start_str,
+        end_str,
+        bike_id,
+        start_str,
+    ]
+    timer.lap("prepare")
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(BOOKING_BATCH_SQL, params)
+            timer.lap("execute")
+            row = _read_last_row(cursor)
+            timer.lap("results")
+        if not row or not row[0] or not row[1]:
+            raise Exception("Failed to get customer/rental ID from stored procedures")
+    timer.lap("commit")
+
+    timings = timer.finish()
+    logger.debug("Booking committed for bike %s: %s", bike_id, timings)
+    return BookingResult(row[0], row[1], row[2], row[3], timings)
@@ -0,0 +1,86 @@
+"""
+Catalog cache for the public bikes pages.
+
+Categories and per-category available bike lists are stored in Django's cache
+framework under keys that include a catalog version number. Admin write paths
+(and bookings/returns, which change bike status) call `bump_catalog_version`,
+so stale entries are simply never read again and expire on their own. The
+price version (myshop.pricing) is part of the keys as well: category prices
+change through the database's price trigger, which logs to PriceLog rather
+than calling back into the app.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Bike, BikeCategory
+from .pricing import price_version
+
+VERSION_KEY = "myshop:catalog:version"
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 3600)
+
+
+def catalog_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog entry (call after any bike/category write)."""
+    cache = _cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (evicted or never set): start a fresh version
+        cache.set(VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def _cached(name, loader):
+    cache = _cache()
+    local_version, db_version = price_version()
+    key = f"myshop:catalog:{catalog_version()}:{local_version}.{db_version}:{name}"
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def get_categories():
+    """All categories, cheapest first."""
+    return _cached(
+        "categories",
+        lambda: list(BikeCategory.objects.all().order_by("price_daily")),
+    )
+
+
+def get_category(name):
+    """Category by name from the cached list, or None."""
+    for category in get_categories():
+        if category.name == name:
+            return category
+    return None
+
+
+def get_available_bikes(category):
+    """Bikes with status Available in `category`, with the category joined in."""
+    return _cached(
+        f"bikes:{category.pk}",
+        lambda: list(
+            Bike.objects.filter(status="Available", category=category)
+            .select_related("category")
+            .order_by("bike_id")
+        ),
+    )
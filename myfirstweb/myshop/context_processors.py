@@ -0,0 +1,31 @@
+"""
+Template context for the {% cache %} fragments of the public pages.
+"""
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .catalog import catalog_version
+from .pricing import price_version
+
+
+def _price_version():
+    return "{}.{}".format(*price_version())
+
+
+def fragment_versions():
+    """The versions the catalog fragments are keyed on, resolved now.
+
+    Async views pass these in their context: the lazy values below may query
+    the database, which must not happen while rendering in the event loop.
+    """
+    return {"catalog_version": catalog_version(), "price_version": _price_version()}
+
+
+def catalog(request):
+    # Lazy: only pages with a catalog fragment pay for the cache lookup
+    return {
+        "catalog_version": SimpleLazyObject(catalog_version),
+        "price_version": SimpleLazyObject(_price_version),
+        "catalog_fragment_timeout": getattr(settings, "CATALOG_FRAGMENT_TIMEOUT", 3600),
+    }
@@ -0,0 +1,221 @@
+"""
+Admin dashboard figures.
+
+`dashboard_stats` computes every tile in one conditional-aggregation query.
+With DASHBOARD_COUNTERS enabled the same figures are read from the
+dashboard_counters table instead, which the booking, return and vehicle
+management paths keep up to date incrementally. The overdue figures come from
+the overdue_rentals queue that myshop.overdue maintains.
+"""
+
+from collections import Counter
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DashboardCounter
+
+BIKE_STATUS_COUNTERS = {
+    "Available": "bikes_available",
+    "Rented": "bikes_rented",
+    "Fix": "bikes_fix",
+}
+
+# One scan of bikes plus two indexed lookups on rentals and one read of the
+# (small) overdue queue, in a single statement
+STATS_SQL = """
+SELECT
+    COUNT(*),
+    COALESCE(SUM(CASE WHEN status = 'Available' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN status = 'Rented' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN status = 'Fix' THEN 1 ELSE 0 END), 0),
+    (SELECT COUNT(*) FROM rentals WHERE payment_status = 'Active'),
+    (SELECT COALESCE(SUM(total_price), 0) FROM rentals
+     WHERE created_at >= %s AND payment_status <> 'Cancelled'),
+    (SELECT COUNT(*) FROM overdue_rentals),
+    (SELECT COALESCE(SUM(late_fee), 0) FROM overdue_rentals)
+FROM bikes
+"""
+
+
+def counters_enabled():
+    return getattr(settings, "DASHBOARD_COUNTERS", False)
+
+
+def _month_start(now=None):
+    now = timezone.localtime(now)
+    return timezone.make_aware(
+        datetime.combine(now.date().replace(day=1), time.min), timezone.get_current_timezone()
+    )
+
+
+def _revenue_counter(now=None):
+    return f"revenue:{timezone.localtime(now):%Y-%m}"
+
+
+def _tiles(total, available, rented, fix, active_rentals, revenue_month, overdue_rentals, overdue_fees):
+    total = int(total)
+    rented = int(rented)
+    return {
+        "total_bikes": total,
+        "available_bikes": int(available),
+        "rented_bikes": rented,
+        "fix_bikes": int(fix),
+        "active_rentals": int(active_rentals),
+        "utilization": round(rented * 100 / total, 1) if total else 0,
+        "revenue_month": Decimal(str(revenue_month)),
+        "overdue_rentals": int(overdue_rentals),
+        "overdue_fees": Decimal(str(overdue_fees)),
+    }
+
+
+def aggregate_stats():
+    """All dashboard figures from one SQL statement."""
+    with connection.cursor() as cursor:
+        cursor.execute(STATS_SQL, [_month_start()])
+        row = cursor.fetchone()
+    return _tiles(*row)
+
+
+def counter_stats():
+    """Dashboard figures from the counter table, or None if it has not been seeded."""
+    names = ["bikes_total", *BIKE_STATUS_COUNTERS.values(), "rentals_active", "rentals_overdue", "overdue_fees"]
+    values = dict(
+        DashboardCounter.objects.filter(name__in=names + [_revenue_counter()])
+        .values_list("name", "value")
+    )
+    if any(name not in values for name in names):
+        return None
+    return _tiles(
+        values["bikes_total"],
+        values["bikes_available"],
+        values["bikes_rented"],
+        values["bikes_fix"],
+        values["rentals_active"],
+        values.get(_revenue_counter(), 0),
+        values["rentals_overdue"],
+        values["overdue_fees"],
+    )
+
+
+def dashboard_stats():
+    if counters_enabled():
+        stats = counter_stats()
+        if stats is not None:
+            return stats
+        return rebuild_counters()
+    return aggregate_stats()
+
+
+def rebuild_counters():
+    """Re-seed the counter table from the aggregate query and return the stats."""
+    stats = aggregate_stats()
+    values = {
+        "bikes_total": stats["total_bikes"],
+        "bikes_available": stats["available_bikes"],
+        "bikes_rented": stats["rented_bikes"],
+        "bikes_fix": stats["fix_bikes"],
+        "rentals_active": stats["active_rentals"],
+        _revenue_counter(): stats["revenue_month"],
+        "rentals_overdue": stats["overdue_rentals"],
+        "overdue_fees": stats["overdue_fees"],
+    }
+    for name, value in values.items():
+        DashboardCounter.objects.update_or_create(name=name, defaults={"value": value})
+    return stats
+
+
+# --- Incremental updates (no-ops unless DASHBOARD_COUNTERS is on) ---
+
+def _add(name, delta):
+    if not delta:
+        return
+    updated = DashboardCounter.objects.filter(name=name).update(value=F("value") + delta)
+    if not updated:
+        try:
+            DashboardCounter.objects.create(name=name, value=delta)
+        except IntegrityError:
+            DashboardCounter.objects.filter(name=name).update(value=F("value") + delta)
+
+
+def _status_changed(old_status, new_status):
+    if old_status == new_status:
+        return
+    if old_status in BIKE_STATUS_COUNTERS:
+        _add(BIKE_STATUS_COUNTERS[old_status], -1)
+    if new_status in BIKE_STATUS_COUNTERS:
+        _add(BIKE_STATUS_COUNTERS[new_status], 1)
+
+
+def bike_added(status="Available", count=1):
+    if counters_enabled():
+        _add("bikes_total", count)
+        _add(BIKE_STATUS_COUNTERS.get(status, "bikes_available"), count)
+
+
+def bike_removed(status):
+    if counters_enabled():
+        _add("bikes_total", -1)
+        if status in BIKE_STATUS_COUNTERS:
+            _add(BIKE_STATUS_COUNTERS[status], -1)
+
+
+def bike_status_changed(old_status, new_status):
+    if counters_enabled():
+        _status_changed(old_status, new_status)
+
+
+def rental_created(total_price, old_bike_status, new_bike_status):
+    if counters_enabled():
+        _add("rentals_active", 1)
+        _add(_revenue_counter(), total_price or 0)
+        _status_changed(old_bike_status, new_bike_status)
+
+
+def rental_returned(was_active, old_bike_status):
+    # AdminReturnBike marks the rental Done and its trigger frees the bike
+    if counters_enabled():
+        if was_active:
+            _add("rentals_active", -1)
+        _status_changed(old_bike_status, "Available")
+
+
+def overdue_changed(count_delta, fee_delta):
+    # Called by myshop.overdue as rentals enter, leave or get re-priced in the queue
+    if counters_enabled():
+        _add("rentals_overdue", count_delta)
+        _add("overdue_fees", fee_delta)
+
+
+# --- Batch updates: one UPDATE per counter, however many items ---
+
+def _status_deltas(changes, deltas):
+    for old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        if old_status in BIKE_STATUS_COUNTERS:
+            deltas[BIKE_STATUS_COUNTERS[old_status]] -= 1
+        if new_status in BIKE_STATUS_COUNTERS:
+            deltas[BIKE_STATUS_COUNTERS[new_status]] += 1
+    return deltas
+
+
+def bikes_status_changed(changes):
+    """`changes` is an iterable of (old_status, new_status) pairs."""
+    if counters_enabled():
+        for name, delta in _status_deltas(changes, Counter()).items():
+            _add(name, delta)
+
+
+def rentals_returned(returns):
+    """`returns` is an iterable of (was_active, old_bike_status) pairs."""
+    if counters_enabled():
+        returns = list(returns)
+        deltas = Counter({"rentals_active": -sum(1 for was_active, _ in returns if was_active)})
+        _status_deltas(((old_status, "Available") for _, old_status in returns), deltas)
+        for name, delta in deltas.items():
+            _add(name, delta)
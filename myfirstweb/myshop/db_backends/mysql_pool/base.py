@@ -0,0 +1,98 @@
+"""
+MySQL backend with a process-wide connection pool.
+
+The stock django.db.backends.mysql opens (and closes) a server connection
+for every request, re-sending the init_command each time. This wrapper keeps
+the raw MySQLdb connections in a bounded myshop.db_pool.ConnectionPool: the
+Django connection "closes" by handing its raw connection back, and the next
+request in any thread picks it up again, already initialised.
+
+Configure it through OPTIONS["pool"] (all keys optional):
+
+    "ENGINE": "myshop.db_backends.mysql_pool",
+    "OPTIONS": {
+        ...,
+        "pool": {"max_size": 10, "timeout": 5, "max_lifetime": 1800, "check_after": 10},
+    },
+
+Keep max_size at or above the number of threads that use the database at
+once per process (WSGI threads, ASYNC_BOOKING_WORKERS, ...); the pool
+metrics on the shop-admin stats endpoint show whether requests wait.
+"""
+
+from django.db.backends.mysql import base as mysql_base
+
+from myshop.db_pool import ConnectionPool, PoolTimeout, get_pool
+
+POOL_DEFAULTS = {
+    "max_size": 10,
+    "timeout": 5.0,
+    "max_lifetime": 1800,
+    "check_after": 10,
+}
+
+
+def _connect(conn_params):
+    # What mysql's DatabaseWrapper.get_new_connection() does, minus the pool
+    connection = mysql_base.Database.connect(**conn_params)
+    if connection.encoders.get(bytes) is bytes:
+        connection.encoders.pop(bytes)
+    return connection
+
+
+def _ping(connection):
+    connection.ping()
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    def _pool_options(self):
+        options = dict(POOL_DEFAULTS)
+        options.update(self.settings_dict["OPTIONS"].get("pool") or {})
+        return options
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # "pool" is ours, not a MySQLdb.connect() argument
+        kwargs.pop("pool", None)
+        return kwargs
+
+    @property
+    def pool(self):
+        def factory():
+            conn_params = self.get_connection_params()
+            return ConnectionPool(
+                connect=lambda: _connect(conn_params),
+                ping=_ping,
+                **self._pool_options(),
+            )
+
+        return get_pool(self.alias, factory)
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.acquire()
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+
+    def init_connection_state(self):
+        # Session settings (SQL mode, isolation level, ...) survive in the
+        # pooled connection; only send them the first time it is opened
+        if getattr(self.connection, "myshop_initialised", False):
+            return
+        super().init_connection_state()
+        self.connection.myshop_initialised = True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        # A connection closed mid-transaction or after an error is in an
+        # unknown state: drop it rather than hand it to the next request
+        discard = self.in_atomic_block or (self.errors_occurred and not self.is_usable())
+        if not discard:
+            try:
+                if not connection.get_autocommit():
+                    connection.rollback()
+            except self.Database.Error:
+                discard = True
+        self.pool.release(connection, discard=discard)
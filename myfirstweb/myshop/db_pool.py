@@ -0,0 +1,190 @@
+"""
+A small bounded pool of DB-API connections.
+
+Used by the pooled MySQL backend (myshop.db_backends.mysql_pool), but it
+only needs a `connect()` callable and connection objects with `close()`,
+so it can be exercised with any stand-in connection.
+
+- At most `max_size` connections exist at once; `acquire()` waits up to
+  `timeout` seconds for one to be released, then raises PoolTimeout.
+- Connections older than `max_lifetime` seconds are closed instead of reused.
+- A connection idle for more than `check_after` seconds is health-checked
+  with `ping(conn)` before it is handed out, and replaced if that fails.
+
+`metrics()` reports checkouts, waits, wait time, timeouts and the current
+size so the pool can be sized against the number of workers.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class _Pooled:
+    __slots__ = ("connection", "created_at", "released_at")
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created_at = now
+        self.released_at = now
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, timeout=5.0, max_lifetime=1800, check_after=10, ping=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.ping = ping
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}  # id(connection) -> _Pooled
+        self._opening = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "closed_expired": 0,
+            "closed_unhealthy": 0,
+            "discarded": 0,
+        }
+
+    # --- Checkout / release ---
+
+    def acquire(self):
+        """Return a healthy connection, opening one if the pool has room."""
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                while self._idle:
+                    item = self._idle.pop()  # most recently used first: warmest
+                    if self._usable(item, time.monotonic()):
+                        return self._check_out(item, started, waited)
+                if len(self._in_use) + self._opening < self.max_size:
+                    self._opening += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size {self.max_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        # Open outside the lock so other threads can still release / reuse
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._stats["created"] += 1
+            return self._check_out(_Pooled(connection, time.monotonic()), started, waited)
+
+    def _check_out(self, item, started, waited):
+        # Called with the lock held
+        self._in_use[id(item.connection)] = item
+        self._stats["checkouts"] += 1
+        if waited:
+            wait_ms = (time.monotonic() - started) * 1000
+            self._stats["waits"] += 1
+            self._stats["wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        return item.connection
+
+    def _usable(self, item, now):
+        # Called with the lock held; closes and drops connections that fail
+        if self.max_lifetime is not None and now - item.created_at > self.max_lifetime:
+            self._stats["closed_expired"] += 1
+            self._close(item.connection)
+            return False
+        if self.ping is not None and now - item.released_at > self.check_after:
+            try:
+                self.ping(item.connection)
+            except Exception:
+                self._stats["closed_unhealthy"] += 1
+                self._close(item.connection)
+                return False
+        return True
+
+    def release(self, connection, discard=False):
+        """Give a connection back; `discard` closes it (e.g. after an error)."""
+        with self._cond:
+            item = self._in_use.pop(id(connection), None)
+            if item is None:
+                return
+            now = time.monotonic()
+            if discard or (self.max_lifetime is not None and now - item.created_at > self.max_lifetime):
+                self._stats["discarded" if discard else "closed_expired"] += 1
+                self._close(connection)
+            else:
+                item.released_at = now
+                self._idle.append(item)
+            self._cond.notify()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close idle connections (checked-out ones are closed on release)."""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop().connection)
+
+    # --- Metrics ---
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            in_use = len(self._in_use)
+            idle = len(self._idle)
+        checkouts = stats["checkouts"]
+        stats.update({
+            "max_size": self.max_size,
+            "size": in_use + idle,
+            "in_use": in_use,
+            "idle": idle,
+            "wait_ms": round(stats["wait_ms"], 2),
+            "max_wait_ms": round(stats["max_wait_ms"], 2),
+            "avg_wait_ms": round(stats["wait_ms"] / stats["waits"], 2) if stats["waits"] else 0.0,
+            "wait_ratio": round(stats["waits"] / checkouts, 4) if checkouts else 0.0,
+        })
+        return stats
+
+
+# Pools by database alias, shared by all threads of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """Return the pool for `alias`, creating it with `factory()` the first time."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = factory()
+    return pool
+
+
+def pool_metrics():
+    """Metrics of every pool in this process, keyed by database alias."""
+    return {alias: pool.metrics() for alias, pool in list(_pools.items())}
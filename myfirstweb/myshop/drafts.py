@@ -0,0 +1,379 @@
+"""
+Server-side booking drafts.
+
+By default the booking funnel keeps its state (dates, category, bike,
+customer details) in the session, i.e. in the signed cookie, which grows with
+every step. With the BOOKING_DRAFT_STORE setting the state is kept on the
+server instead and the client only carries an opaque token
+(`secrets.token_urlsafe`, 22 characters) in the BOOKING_DRAFT_COOKIE_NAME
+cookie: every request and response carries the same few bytes whatever step
+the customer is on, and a reload (or a second tab) picks the draft up again.
+
+Backends (BOOKING_DRAFT_STORE):
+
+- "locmem": an LRU dict in this process, capped at `max_bytes` of serialized
+  drafts. Per worker, so only for a single process (or sticky sessions).
+- "file": one JSON file per draft under `path`, shared by the workers of one
+  host and kept across restarts; at most `max_entries` files.
+- "cache": a Django cache alias (`alias`), e.g. Memcached or Redis shared by
+  every host; the LocMemCache "default" alias stands in for it locally.
+- or the dotted path of a class with the same get/set/delete interface.
+
+BOOKING_DRAFT_OPTIONS is passed to the backend as keyword arguments. A draft
+expires SESSION_COOKIE_AGE seconds after it was last read or written, like
+the session it replaces.
+
+`BookingDraftMiddleware` puts the draft on `request.draft`; with the store
+turned off (BOOKING_DRAFT_STORE = None) `request.draft` is the session itself,
+so the views only ever use `request.draft`.
+"""
+
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+TOKEN_BYTES = 16  # 22 URL-safe characters
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{22}$")
+_MISSING = object()
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"))
+
+
+class LocMemDraftStore:
+    """Drafts in a per-process LRU dict, capped at `max_bytes` of JSON."""
+
+    def __init__(self, ttl, max_bytes=8 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._drafts = OrderedDict()  # token -> (expires_at, json), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, token):
+        _, payload = self._drafts.pop(token)
+        self._bytes -= len(payload)
+
+    def _evict(self, now):
+        # Every entry has the same TTL, so the least recently used expires first
+        while self._drafts:
+            token, (expires_at, _) = next(iter(self._drafts.items()))
+            if expires_at > now and self._bytes <= self.max_bytes:
+                break
+            self._remove(token)
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            item = self._drafts.get(token)
+            if item is None:
+                return None
+            if item[0] <= now:
+                self._remove(token)
+                return None
+            self._drafts[token] = (now + self.ttl, item[1])
+            self._drafts.move_to_end(token)
+        return json.loads(item[1])
+
+    def set(self, token, data):
+        payload = _dumps(data)
+        now = time.monotonic()
+        with self._lock:
+            if token in self._drafts:
+                self._remove(token)
+            self._drafts[token] = (now + self.ttl, payload)
+            self._bytes += len(payload)
+            self._evict(now)
+
+    def delete(self, token):
+        with self._lock:
+            if token in self._drafts:
+                self._remove(token)
+
+    def __len__(self):
+        return len(self._drafts)
+
+
+class FileDraftStore:
+    """One JSON file per draft; the file's mtime is its last use."""
+
+    CULL_EVERY = 100  # Writes between two sweeps of the directory
+
+    def __init__(self, ttl, path=None, max_entries=100000):
+        self.ttl = ttl
+        self.path = path or os.path.join(tempfile.gettempdir(), "myshop-drafts")
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, token):
+        return os.path.join(self.path, token + ".json")
+
+    def get(self, token):
+        filename = self._file(token)
+        try:
+            if os.stat(filename).st_mtime + self.ttl <= time.time():
+                self.delete(token)
+                return None
+            with open(filename, encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(filename)  # Sliding expiry
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def set(self, token, data):
+        # Write then rename, so a concurrent read never sees half a file
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(_dumps(data))
+            os.replace(tmp, self._file(token))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self.cull()
+
+    def delete(self, token):
+        try:
+            os.remove(self._file(token))
+        except FileNotFoundError:
+            pass
+
+    def cull(self):
+        """Remove expired drafts, then the least recently used beyond max_entries."""
+        now = time.time()
+        live = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                stale = entry.name.endswith(".tmp") and mtime + 60 <= now
+                if stale or mtime + self.ttl <= now:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                elif entry.name.endswith(".json"):
+                    live.append((mtime, entry.path))
+        live.sort()
+        for _, path in live[: max(len(live) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class CacheDraftStore:
+    """Drafts in a Django cache; its own size limits bound the memory."""
+
+    def __init__(self, ttl, alias="default", key_prefix="myshop:draft:"):
+        self.ttl = ttl
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    def _key(self, token):
+        return self.key_prefix + token
+
+    def get(self, token):
+        cache = caches[self.alias]
+        data = cache.get(self._key(token))
+        if data is not None:
+            cache.touch(self._key(token), self.ttl)
+        return data
+
+    def set(self, token, data):
+        caches[self.alias].set(self._key(token), data, self.ttl)
+
+    def delete(self, token):
+        caches[self.alias].delete(self._key(token))
+
+
+BACKENDS = {
+    "locmem": LocMemDraftStore,
+    "file": FileDraftStore,
+    "cache": CacheDraftStore,
+}
+
+_store = None
+_store_config = None
+
+
+def get_draft_store():
+    """The configured draft store, or None when drafts live in the session."""
+    global _store, _store_config
+    backend = getattr(settings, "BOOKING_DRAFT_STORE", None)
+    options = getattr(settings, "BOOKING_DRAFT_OPTIONS", {})
+    if backend is None:
+        return None
+    # Rebuilt when the settings change (tests override them)
+    config = (backend, tuple(sorted(options.items())), settings.SESSION_COOKIE_AGE)
+    if config != _store_config:
+        cls = BACKENDS[backend] if backend in BACKENDS else import_string(backend)
+        _store = cls(ttl=settings.SESSION_COOKIE_AGE, **options)
+        _store_config = config
+    return _store
+
+
+class BookingDraft:
+    """One customer's draft, with the parts of the session API the funnel uses.
+
+    Loaded from the store on first access and written back by the middleware
+    at the end of the request, only if something changed.
+    """
+
+    def __init__(self, store, token=None):
+        self.store = store
+        self.token = token
+        self._data = None
+        self.modified = False
+        self._flushed_token = None
+
+    def _load(self):
+        if self._data is None:
+            self._data = (self.store.get(self.token) if self.token else None) or {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        data = self._load()
+        if data.get(key, _MISSING) != value:
+            data[key] = value
+            self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def pop(self, key, *args):
+        data = self._load()
+        if key in data:
+            self.modified = True
+        return data.pop(key, *args)
+
+    def flush(self):
+        """Drop the draft and its token."""
+        if self.token:
+            self._flushed_token = self.token
+        self.token = None
+        self._data = {}
+        self.modified = False
+
+    async def _aload(self):
+        if self._data is None:
+            await sync_to_async(self._load)()
+
+    async def aget(self, key, default=None):
+        await self._aload()
+        return self.get(key, default)
+
+    async def aset(self, key, value):
+        await self._aload()
+        self[key] = value
+
+    async def apop(self, key, *args):
+        await self._aload()
+        return self.pop(key, *args)
+
+    async def ahas_key(self, key):
+        await self._aload()
+        return key in self
+
+    async def aflush(self):
+        self.flush()
+
+    def save(self):
+        """Write back what changed; returns True if the client needs a new token."""
+        if self._flushed_token:
+            self.store.delete(self._flushed_token)
+            self._flushed_token = None
+        if not self.modified or not self._data:
+            return False
+        new_token = self.token is None
+        if new_token:
+            self.token = secrets.token_urlsafe(TOKEN_BYTES)
+        self.store.set(self.token, self._data)
+        self.modified = False
+        return new_token
+
+
+class BookingDraftMiddleware:
+    """Sets `request.draft`; needs SessionMiddleware above it."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        store = get_draft_store()
+        if store is None:
+            request.draft = request.session
+            return None
+        token = request.COOKIES.get(settings.BOOKING_DRAFT_COOKIE_NAME)
+        if token and not _TOKEN_RE.match(token):
+            token = None  # Not one of ours (and never a path for the file store)
+        request.draft = BookingDraft(store, token)
+        return request.draft
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        draft = self._start(request)
+        response = self.get_response(request)
+        if draft is not None:
+            self._finish(request, draft, draft.save(), response)
+        return response
+
+    async def __acall__(self, request):
+        draft = self._start(request)
+        response = await self.get_response(request)
+        if draft is not None:
+            self._finish(request, draft, await sync_to_async(draft.save)(), response)
+        return response
+
+    def _finish(self, request, draft, new_token, response):
+        name = settings.BOOKING_DRAFT_COOKIE_NAME
+        if new_token:
+            # A browser-session cookie: the store decides when the draft expires
+            response.set_cookie(
+                name,
+                draft.token,
+                path=settings.SESSION_COOKIE_PATH,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        elif draft.token is None and name in request.COOKIES:
+            response.delete_cookie(
+                name, path=settings.SESSION_COOKIE_PATH, samesite=settings.SESSION_COOKIE_SAMESITE
+            )
@@ -0,0 +1,138 @@
+"""
+Streaming CSV / JSON Lines exports of rentals, customers and the fleet.
+
+Rows are read in primary-key chunks (WHERE pk > last ORDER BY pk LIMIT n),
+because the MySQL driver buffers whole result sets client-side; together with
+StreamingHttpResponse this keeps memory flat regardless of the export size.
+"""
+
+import csv
+import json
+
+from .admin_queries import filter_bookings, search_customers
+from .models import Bike
+
+CHUNK_SIZE = 2000
+
+# dataset -> list of (column header, ORM field path); the first column is the pk
+EXPORT_COLUMNS = {
+    "rentals": [
+        ("rental_id", "rental_id"),
+        ("created_at", "created_at"),
+        ("customer_id", "customer_id"),
+        ("customer_first_name", "customer__first_name"),
+        ("customer_last_name", "customer__last_name"),
+        ("bike_id", "bike_id"),
+        ("license_plate", "bike__license_plate"),
+        ("model_name", "bike__model_name"),
+        ("start_date", "start_date"),
+        ("end_date", "end_date"),
+        ("actual_return_date", "actual_return_date"),
+        ("total_price", "total_price"),
+        ("payment_status", "payment_status"),
+    ],
+    "customers": [
+        ("customer_id", "customer_id"),
+        ("citizen_id", "citizen_id"),
+        ("first_name", "first_name"),
+        ("last_name", "last_name"),
+        ("phone", "phone"),
+        ("email", "email"),
+        ("line_id", "line_id"),
+        ("created_at", "created_at"),
+    ],
+    "bikes": [
+        ("bike_id", "bike_id"),
+        ("license_plate", "license_plate"),
+        ("model_name", "model_name"),
+        ("category", "category__name"),
+        ("status", "status"),
+        ("engine_size", "engine_size"),
+        ("description", "description"),
+        ("image_url", "image_url"),
+    ],
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def filter_bikes(params):
+    bikes = Bike.objects.all()
+    status = params.get("status")
+    if status in dict(Bike.STATUS_CHOICES):
+        bikes = bikes.filter(status=status)
+    category_id = params.get("category_id")
+    if category_id and category_id.isdigit():
+        bikes = bikes.filter(category_id=category_id)
+    return bikes
+
+
+def export_queryset(dataset, params):
+    """The rows the matching admin list would show, unordered and unpaginated."""
+    if dataset == "rentals":
+        return filter_bookings(params)
+    if dataset == "customers":
+        return search_customers(params)
+    if dataset == "bikes":
+        return filter_bikes(params)
+    raise KeyError(dataset)
+
+
+def iter_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield value tuples in pk order, one bounded query per chunk."""
+    pk_name = queryset.model._meta.pk.name
+    queryset = queryset.order_by(pk_name).values_list(*fields)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(**{f"{pk_name}__gt": last_pk})
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_pk = rows[-1][0]
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_jsonl(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), default=_json_default, ensure_ascii=False) + "\n"
+
+
+def stream_export(dataset, fmt, params, chunk_size=CHUNK_SIZE):
+    columns = EXPORT_COLUMNS[dataset]
+    headers = [header for header, _ in columns]
+    fields = [field for _, field in columns]
+    rows = iter_rows(export_queryset(dataset, params), fields, chunk_size)
+    if fmt == "jsonl":
+        return stream_jsonl(headers, rows)
+    return stream_csv(headers, rows)
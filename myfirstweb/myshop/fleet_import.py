@@ -0,0 +1,166 @@
+"""
+Bulk fleet import from CSV.
+
+Rows are validated in one pass (required fields, column lengths, category
+names, duplicate plates within the file and against the license_plate unique
+index), then inserted with bulk_create in batched transactions. This skips the
+per-plate AdminAddBike procedure, which is what makes thousands of rows per
+second possible; the checks it relied on are done here instead.
+"""
+
+import csv
+import io
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+
+from .models import Bike, BikeCategory
+
+DEFAULT_BATCH_SIZE = 500
+PLATE_LOOKUP_CHUNK = 1000
+
+# Accepted header spellings -> Bike field
+COLUMN_ALIASES = {
+    "model": "model_name",
+    "model_name": "model_name",
+    "plate": "license_plate",
+    "license_plate": "license_plate",
+    "category": "category",
+    "category_name": "category",
+    "engine": "engine_size",
+    "engine_size": "engine_size",
+    "description": "description",
+    "image": "image_url",
+    "image_url": "image_url",
+}
+REQUIRED_COLUMNS = ("model_name", "license_plate", "category")
+ERROR_FILE_HEADERS = ["row", "license_plate", "error"]
+
+RowError = namedtuple("RowError", ["row", "license_plate", "error"])
+ImportResult = namedtuple("ImportResult", ["total", "created", "errors"])
+
+
+def _field_limit(name):
+    return Bike._meta.get_field(name).max_length
+
+
+def read_csv(file_obj):
+    """Yield (row_number, row dict keyed by Bike field) from a text or binary CSV file."""
+    if isinstance(file_obj.read(0), bytes):
+        file_obj = io.TextIOWrapper(file_obj, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(file_obj)
+    headers = {
+        header: COLUMN_ALIASES.get(header.strip().lower().replace(" ", "_"))
+        for header in reader.fieldnames or []
+    }
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers.values()]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    # Row 1 is the header line
+    for number, raw in enumerate(reader, start=2):
+        yield number, {
+            field: (raw.get(header) or "").strip()
+            for header, field in headers.items() if field
+        }
+
+
+def _existing_plates(plates):
+    # Compared case-insensitively, like the unique index under MySQL's collation
+    existing = set()
+    plates = list(plates)
+    for i in range(0, len(plates), PLATE_LOOKUP_CHUNK):
+        chunk = plates[i:i + PLATE_LOOKUP_CHUNK]
+        existing.update(
+            plate.upper()
+            for plate in Bike.objects.filter(license_plate__in=chunk).values_list("license_plate", flat=True)
+        )
+    return existing
+
+
+def validate_rows(rows):
+    """Return (bikes, errors): unsaved Bike objects with their row numbers, and RowErrors."""
+    categories = {category.name.lower(): category for category in BikeCategory.objects.all()}
+    limits = {field: _field_limit(field) for field in ("model_name", "license_plate", "engine_size", "description", "image_url")}
+
+    candidates = []
+    errors = []
+    seen_plates = {}
+    for number, row in rows:
+        plate = row.get("license_plate", "")
+        problems = []
+        for field in REQUIRED_COLUMNS:
+            if not row.get(field):
+                problems.append(f"{field} is required")
+        for field, limit in limits.items():
+            if len(row.get(field) or "") > limit:
+                problems.append(f"{field} is longer than {limit} characters")
+        category = categories.get(row.get("category", "").lower())
+        if row.get("category") and category is None:
+            problems.append(f"unknown category '{row['category']}'")
+        if plate:
+            first = seen_plates.setdefault(plate.upper(), number)
+            if first != number:
+                problems.append(f"duplicate license_plate (also on row {first})")
+
+        if problems:
+            errors.append(RowError(number, plate, "; ".join(problems)))
+            continue
+        candidates.append((number, Bike(
+            model_name=row["model_name"],
+            license_plate=plate,
+            category=category,
+            engine_size=row.get("engine_size") or None,
+            description=row.get("description") or None,
+            image_url=row.get("image_url") or None,
+        )))
+
+    existing = _existing_plates(bike.license_plate for _, bike in candidates)
+    bikes = []
+    for number, bike in candidates:
+        if bike.license_plate.upper() in existing:
+            errors.append(RowError(number, bike.license_plate, "license_plate already exists"))
+        else:
+            bikes.append((number, bike))
+    errors.sort()
+    return bikes, errors
+
+
+def _insert_batch(batch, errors):
+    try:
+        with transaction.atomic():
+            Bike.objects.bulk_create([bike for _, bike in batch])
+        return len(batch)
+    except IntegrityError:
+        pass
+    # Something changed since validation (e.g. a plate added concurrently):
+    # retry row by row so only the offending rows fail.
+    created = 0
+    for number, bike in batch:
+        try:
+            with transaction.atomic():
+                bike.save(force_insert=True)
+            created += 1
+        except IntegrityError as e:
+            errors.append(RowError(number, bike.license_plate, str(e)))
+    return created
+
+
+def import_bikes(rows, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Validate and insert (row_number, row) pairs; return an ImportResult."""
+    rows = list(rows)
+    bikes, errors = validate_rows(rows)
+    created = 0
+    if not dry_run:
+        for i in range(0, len(bikes), batch_size):
+            created += _insert_batch(bikes[i:i + batch_size], errors)
+        errors.sort()
+    return ImportResult(len(rows), created, errors)
+
+
+def error_file(errors):
+    """Per-row error report as CSV text."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(ERROR_FILE_HEADERS)
+    writer.writerows(errors)
+    return out.getvalue()
@@ -0,0 +1,140 @@
+"""
+Idempotent checkout submissions.
+
+Every render of the checkout page puts a fresh random key in the booking
+draft (`checkout_key`) and in the form; the browser posts it back as the
+`idempotency_key` field or an Idempotency-Key header. The first POST with
+the key claims it in the cache, and its outcome (the booking, or a conflict)
+is kept there for IDEMPOTENCY_TTL seconds. A repeat of that POST (a
+double-click, a browser or proxy retry) gets the stored JSON response back
+before the draft or the database is looked at; one that arrives while the
+first is still running waits up to IDEMPOTENCY_WAIT seconds for its result.
+
+Only keys minted for the current draft are claimed, so a client cannot fill
+the store with keys of its own. A failed attempt ("Booking Failed") releases
+its key and may be retried. The store is the IDEMPOTENCY_CACHE_ALIAS cache:
+with several workers it must be shared (Memcached/Redis) for a retry that
+lands on another worker to be recognised.
+"""
+
+import asyncio
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+DRAFT_KEY = "checkout_key"
+HEADER = "Idempotency-Key"
+FIELD = "idempotency_key"
+
+# A claim whose request died without finishing lapses after this many seconds
+PENDING_TTL = 30
+POLL_INTERVAL = 0.05
+_PENDING = "pending"
+
+
+def _cache():
+    return caches[getattr(settings, "IDEMPOTENCY_CACHE_ALIAS", "default")]
+
+
+def _cache_key(key):
+    return "myshop:idempotency:" + key
+
+
+def _ttl():
+    return getattr(settings, "IDEMPOTENCY_TTL", 600)
+
+
+def _wait():
+    return getattr(settings, "IDEMPOTENCY_WAIT", 5)
+
+
+def new_key():
+    return secrets.token_urlsafe(16)
+
+
+def submitted_key(request):
+    key = request.POST.get(FIELD) or request.headers.get(HEADER)
+    return key[:64] if key else None
+
+
+def _response(stored):
+    status, content = stored
+    response = HttpResponse(content, status=status, content_type="application/json")
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def still_pending():
+    return JsonResponse(
+        {
+            "success": False,
+            "pending": True,
+            "message": "Your booking is still being processed. Please wait a moment.",
+        },
+        status=409,
+    )
+
+
+def replay(key):
+    """The stored response to a submission with `key`, or None if there is none."""
+    if not key:
+        return None
+    cache = _cache()
+    deadline = time.monotonic() + _wait()
+    stored = cache.get(_cache_key(key))
+    while stored == _PENDING:
+        if time.monotonic() >= deadline:
+            return still_pending()
+        time.sleep(POLL_INTERVAL)
+        stored = cache.get(_cache_key(key))
+    return _response(stored) if stored is not None else None
+
+
+async def areplay(key):
+    if not key:
+        return None
+    cache = _cache()
+    deadline = time.monotonic() + _wait()
+    stored = await cache.aget(_cache_key(key))
+    while stored == _PENDING:
+        if time.monotonic() >= deadline:
+            return still_pending()
+        await asyncio.sleep(POLL_INTERVAL)
+        stored = await cache.aget(_cache_key(key))
+    return _response(stored) if stored is not None else None
+
+
+def claim(key):
+    """True if this is the first submission with `key`."""
+    return _cache().add(_cache_key(key), _PENDING, PENDING_TTL)
+
+
+async def aclaim(key):
+    return await _cache().aadd(_cache_key(key), _PENDING, PENDING_TTL)
+
+
+def finish(key, response):
+    """Keep `response` as the outcome of `key` (if any); returns it."""
+    if key:
+        _cache().set(_cache_key(key), (response.status_code, response.content), _ttl())
+    return response
+
+
+async def afinish(key, response):
+    if key:
+        await _cache().aset(_cache_key(key), (response.status_code, response.content), _ttl())
+    return response
+
+
+def release(key):
+    """Let a failed submission with `key` be tried again."""
+    if key:
+        _cache().delete(_cache_key(key))
+
+
+async def arelease(key):
+    if key:
+        await _cache().adelete(_cache_key(key))
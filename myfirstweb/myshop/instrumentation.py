@@ -0,0 +1,221 @@
+"""
+Per-request SQL and latency instrumentation.
+
+RequestStatsMiddleware records, for every request, the number of queries,
+total DB time, the slowest statements (stored procedure CALLs included),
+template render time and the view name. The figures are sent back in a
+Server-Timing header, kept in a rolling in-memory window per view (served by
+the admin stats endpoint) and logged when a request is slower than
+REQUEST_STATS_SLOW_MS.
+
+Statements are timed by an execute wrapper installed on every database
+connection as it is opened; it reports to the stats of the current request
+through a context variable, so queries run by async views (in sync_to_async
+or thread pool workers, which copy the context) are counted too.
+"""
+
+import contextvars
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger("myshop.slow_requests")
+
+UNRESOLVED = "<unresolved>"
+
+_current = contextvars.ContextVar("myshop_request_stats", default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestStats:
+    """Figures collected while one request is being handled."""
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.slowest = []  # min-heap of (duration_ms, sql)
+
+    def record_query(self, sql, duration_ms):
+        self.queries += 1
+        self.db_ms += duration_ms
+        item = (duration_ms, sql[:300])
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, item)
+        elif duration_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def slowest_queries(self):
+        return [
+            {"ms": round(duration, 2), "sql": sql}
+            for duration, sql in sorted(self.slowest, reverse=True)
+        ]
+
+
+def record_template_render(duration_ms):
+    """Called by the timed template backend after each top-level render."""
+    stats = _current.get()
+    if stats is not None:
+        stats.template_ms += duration_ms
+
+
+def _time_query(execute, sql, params, many, context):
+    """Execute wrapper timing every statement run while a request is being measured."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_query_timer(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    _install_query_timer(connection)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StatsRegistry:
+    """Rolling window of recent requests per view, plus the latest slow requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._slow = deque(maxlen=50)
+
+    def add(self, view, total_ms, stats):
+        window = _setting("REQUEST_STATS_WINDOW", 500)
+        with self._lock:
+            samples = self._views.get(view)
+            if samples is None or samples.maxlen != window:
+                samples = self._views[view] = deque(samples or (), maxlen=window)
+            samples.append((total_ms, stats.queries, stats.db_ms, stats.template_ms))
+
+    def add_slow(self, entry):
+        with self._lock:
+            self._slow.append(entry)
+
+    def snapshot(self):
+        with self._lock:
+            views = {view: list(samples) for view, samples in self._views.items()}
+            slow = list(self._slow)
+
+        summary = {}
+        for view, samples in views.items():
+            count = len(samples)
+            totals = sorted(sample[0] for sample in samples)
+            summary[view] = {
+                "requests": count,
+                "p50_ms": round(percentile(totals, 0.50), 2),
+                "p95_ms": round(percentile(totals, 0.95), 2),
+                "p99_ms": round(percentile(totals, 0.99), 2),
+                "max_ms": round(totals[-1], 2),
+                "avg_queries": round(sum(sample[1] for sample in samples) / count, 2),
+                "avg_db_ms": round(sum(sample[2] for sample in samples) / count, 2),
+                "avg_template_ms": round(sum(sample[3] for sample in samples) / count, 2),
+            }
+        return {"views": summary, "slow_requests": slow}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._slow.clear()
+
+
+registry = StatsRegistry()
+
+
+class RequestStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported have no timer yet
+        for alias in connections:
+            _install_query_timer(connections[alias])
+        stats = RequestStats(_setting("REQUEST_STATS_TOP_QUERIES", 5))
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats(_setting("REQUEST_STATS_TOP_QUERIES", 5))
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, started)
+
+    def _finish(self, request, response, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        # One entry for every URL that did not resolve (404s, scanners): the
+        # path is only kept in the slow-request log
+        view = match.view_name if match else UNRESOLVED
+        registry.add(view, total_ms, stats)
+        self._add_server_timing(response, total_ms, stats)
+
+        if total_ms >= _setting("REQUEST_STATS_SLOW_MS", 500):
+            entry = {
+                "view": view,
+                "method": request.method,
+                "path": request.path,
+                "ms": round(total_ms, 2),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_ms, 2),
+                "template_ms": round(stats.template_ms, 2),
+                "slowest": stats.slowest_queries(),
+            }
+            registry.add_slow(entry)
+            logger.warning("Slow request %s %s (%s): %s", request.method, request.path, view, entry)
+        return response
+
+    def _add_server_timing(self, response, total_ms, stats):
+        app_ms = max(0.0, total_ms - stats.db_ms - stats.template_ms)
+        timing = (
+            f'db;dur={stats.db_ms:.2f};desc="{stats.queries} queries", '
+            f"tpl;dur={stats.template_ms:.2f}, "
+            f"app;dur={app_ms:.2f}, "
+            f"total;dur={total_ms:.2f}"
+        )
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
@@ -0,0 +1,87 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myshop.benchmark import DATASET, check_budgets, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the booking funnel (Dates -> Bikes -> Customer -> Checkout) and the "
+        "admin list pages; report p50/p95/p99 latency, throughput and queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=50, help="Customer sessions to simulate.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Sessions running at once.")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for reproducible runs.")
+        parser.add_argument("--url", help="Benchmark a running server over HTTP instead of in-process.")
+        parser.add_argument("--async", dest="use_async", action="store_true",
+                            help="Run the sessions in-process on one event loop through the ASGI handler.")
+        parser.add_argument("--no-checkout", action="store_true", help="Stop before the booking POST (no writes).")
+        parser.add_argument("--configured-db", action="store_true",
+                            help="Run against the configured database instead of an isolated seeded one; "
+                                 "with --url, needed before checkout writes to the server's database.")
+        parser.add_argument("--bikes", type=int, default=DATASET["bikes"], help="Bikes in the isolated dataset.")
+        parser.add_argument("--rentals", type=int, default=DATASET["rentals"],
+                            help="Rentals in the isolated dataset.")
+        parser.add_argument("--admin-user", help="Admin username for the admin page scenario.")
+        parser.add_argument("--admin-password", default="")
+        parser.add_argument("--admin-rounds", type=int, default=10)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--budget", help="JSON file of per-step budgets: {step: {p95_ms, max_queries}}.")
+        parser.add_argument("--baseline", help="Previous JSON report to compare p95 latencies against.")
+        parser.add_argument("--max-regression", type=float, default=0.2,
+                            help="Allowed p95 growth over the baseline, as a fraction (default 0.2).")
+
+    def handle(self, *args, **options):
+        if options["use_async"] and options["url"]:
+            raise CommandError("--async runs in-process; it cannot be combined with --url.")
+        if options["url"] and not options["no_checkout"] and not options["configured_db"]:
+            raise CommandError(
+                "Checkout against --url books real bikes in the server's database; "
+                "pass --configured-db to allow it, or --no-checkout."
+            )
+        report = run_benchmark(
+            sessions=options["sessions"],
+            concurrency=options["concurrency"],
+            seed=options["seed"],
+            base_url=options["url"],
+            checkout=not options["no_checkout"],
+            admin_user=options["admin_user"],
+            admin_password=options["admin_password"],
+            admin_rounds=options["admin_rounds"],
+            use_async=options["use_async"],
+            configured_db=options["configured_db"],
+            dataset={"bikes": options["bikes"], "rentals": options["rentals"]},
+        )
+
+        self.stdout.write(f"{'step':32} {'reqs':>6} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+        for step, result in report["steps"].items():
+            self.stdout.write(
+                f"{step:32} {result['requests']:>6} {result['errors']:>5} "
+                f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+                f"{result['avg_queries'] if result['avg_queries'] is not None else '-':>8}"
+            )
+        overall = report["overall"]
+        self.stdout.write(
+            f"{overall['requests']} requests in {overall['duration_s']}s "
+            f"({overall['throughput_rps']} req/s), {overall['errors']} errors"
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        budgets = baseline = None
+        if options["budget"]:
+            with open(options["budget"]) as f:
+                budgets = json.load(f)
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        violations = check_budgets(report, budgets, baseline, options["max_regression"])
+        if violations:
+            raise CommandError("Performance budget exceeded:\n  " + "\n  ".join(violations))
+        if budgets or baseline:
+            self.stdout.write(self.style.SUCCESS("All steps within budget."))
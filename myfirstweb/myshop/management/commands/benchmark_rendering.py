@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myshop.render_benchmark import CONFIGS, render_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Render time of the public pages without template caching, with the cached loader, "
+        "and with the cached loader plus catalog fragment caching."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Requests per page and configuration.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        results = render_benchmark(options["iterations"])
+
+        self.stdout.write(f"{'page':12} {'config':14} {'ms':>8} {'tpl_ms':>8}")
+        for page in results["fragments"]:
+            for config in CONFIGS:
+                result = results[config][page]
+                self.stdout.write(f"{page:12} {config:14} {result['ms']:>8} {result['tpl_ms']:>8}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myshop.session_benchmark import FUNNEL_ENGINES, codec_benchmark, funnel_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stock signed-cookie session engine with the compact one: cookie size, "
+        "signing / verifying cost and Set-Cookie traffic over the booking funnel (also with "
+        "server-side booking drafts)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000, help="Sign / verify repetitions per measurement.")
+        parser.add_argument("--sessions", type=int, default=20, help="Funnel sessions per engine (no checkout).")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        codec = codec_benchmark(options["iterations"])
+        funnel = funnel_benchmark(options["sessions"], options["seed"])
+
+        self.stdout.write(f"{'session after':14} {'engine':8} {'bytes':>6} {'sign_us':>8} {'verify_us':>10}")
+        for state, engines in codec.items():
+            for engine, result in engines.items():
+                self.stdout.write(
+                    f"{state:14} {engine:8} {result['bytes']:>6} {result['sign_us']:>8} {result['verify_us']:>10}"
+                )
+        self.stdout.write("")
+        self.stdout.write(f"{'engine':8} {'requests':>8} {'set-cookie':>10} {'sent_bytes':>10} {'recv_bytes':>10} {'ms':>8}")
+        for engine in FUNNEL_ENGINES:
+            result = funnel[engine]
+            self.stdout.write(
+                f"{engine:8} {result['requests']:>8} {result['set_cookies']:>10} "
+                f"{result['bytes_sent']:>10} {result['bytes_received']:>10} {result['ms']:>8}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"codec": codec, "funnel": funnel}, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,81 @@
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myshop import dashboard
+from myshop.availability import availability_index
+from myshop.catalog import bump_catalog_version
+from myshop.synthetic import DEFAULT_END, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset: categories, bikes, customers, "
+        "non-overlapping seasonal rentals and PriceLog history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=4)
+        parser.add_argument("--bikes", type=int, default=200)
+        parser.add_argument("--customers", type=int, default=5000)
+        parser.add_argument("--rentals", type=int, default=100000)
+        parser.add_argument("--price-logs", type=int, default=6, help="Price changes per category.")
+        parser.add_argument("--years", type=float, default=3, help="Length of the rental history.")
+        parser.add_argument("--end-date", help=f"Last day of history, YYYY-MM-DD (default: {DEFAULT_END:%Y-%m-%d}).")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--tag", default="SYN", help="Prefix for synthetic plates and category names.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="Delete data from previous runs with the same tag first.")
+
+    def handle(self, *args, **options):
+        if options["categories"] < 1 or options["bikes"] < 1 or options["customers"] < 1:
+            raise CommandError("--categories, --bikes and --customers must be at least 1.")
+
+        end = DEFAULT_END
+        if options["end_date"]:
+            try:
+                end = datetime.combine(
+                    datetime.strptime(options["end_date"], "%Y-%m-%d").date(), dt_time.min, tzinfo=dt_timezone.utc
+                )
+            except ValueError:
+                raise CommandError("--end-date must be YYYY-MM-DD.")
+
+        generator = DatasetGenerator(
+            seed=options["seed"],
+            tag=options["tag"],
+            start=end - timedelta(days=365 * options["years"]),
+            end=end,
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+
+        days = (generator.end - generator.start).days
+        if options["rentals"] / options["bikes"] > days / 2:
+            self.stderr.write(
+                "Warning: more rentals per bike than fit in the history window; "
+                "later rentals will run into the future. Add bikes or raise --years."
+            )
+
+        started = time.perf_counter()
+        if options["clear"]:
+            self.stdout.write(f"Removing previous '{options['tag']}' data")
+            generator.clear()
+        counts = generator.generate(
+            categories=options["categories"],
+            bikes=options["bikes"],
+            customers=options["customers"],
+            rentals=options["rentals"],
+            price_logs=options["price_logs"],
+        )
+        elapsed = time.perf_counter() - started
+
+        bump_catalog_version()
+        availability_index.invalidate()
+        if dashboard.counters_enabled():
+            dashboard.rebuild_counters()
+
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary} in {elapsed:.1f}s ({counts['rentals'] / elapsed:.0f} rentals/s)"
+        ))
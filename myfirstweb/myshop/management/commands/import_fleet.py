@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myshop import dashboard
+from myshop.catalog import bump_catalog_version
+from myshop.fleet_import import DEFAULT_BATCH_SIZE, error_file, import_bikes, read_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import bikes from a CSV with columns model_name, license_plate, "
+        "category, engine_size, description, image_url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, insert nothing.")
+        parser.add_argument("--error-file", help="Write rejected rows to this CSV file.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options["csv_path"], encoding="utf-8-sig", newline="") as f:
+                result = import_bikes(
+                    read_csv(f),
+                    batch_size=options["batch_size"],
+                    dry_run=options["dry_run"],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        if result.created:
+            bump_catalog_version()
+            dashboard.bike_added(count=result.created)
+
+        if options["error_file"] and result.errors:
+            with open(options["error_file"], "w", encoding="utf-8", newline="") as f:
+                f.write(error_file(result.errors))
+
+        for error in result.errors[:20]:
+            self.stderr.write(f"row {error.row} ({error.license_plate}): {error.error}")
+        if len(result.errors) > 20:
+            self.stderr.write(f"... and {len(result.errors) - 20} more")
+
+        rate = result.total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.total} rows, {result.created} created, {len(result.errors)} rejected "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/s)" + (" [dry run]" if options["dry_run"] else "")
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from myshop.dashboard import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Re-seed the dashboard_counters table from the live bikes/rentals tables."
+
+    def handle(self, *args, **options):
+        stats = rebuild_counters()
+        for name, value in stats.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Dashboard counters rebuilt."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myshop.rollups import refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute the report rollups for the days changed since the last refresh (normally done by run_scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild both rollup tables from the whole rentals table.")
+
+    def handle(self, *args, **options):
+        result = refresh(full=options["full"])
+        for name, value in result.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Rollups refreshed."))
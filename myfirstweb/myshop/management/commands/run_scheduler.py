@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myshop.scheduler import run_forever, run_pending, scheduled_jobs
+
+
+class Command(BaseCommand):
+    help = "Run the scheduled jobs (SCHEDULED_JOBS) that are due, once or in a loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", action="append", dest="jobs", help="Only this job (repeatable).")
+        parser.add_argument("--force", action="store_true", help="Run the jobs even if they are not due yet.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, checking for due jobs every --tick seconds.")
+        parser.add_argument("--tick", type=float, default=30)
+
+    def handle(self, *args, **options):
+        unknown = set(options["jobs"] or []) - set(scheduled_jobs())
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+
+        if options["loop"]:
+            if options["force"]:
+                raise CommandError("--force cannot be combined with --loop.")
+            self.stdout.write(f"Scheduler running, checking every {options['tick']}s (Ctrl+C to stop)")
+            try:
+                run_forever(options["tick"], options["jobs"], log=self.stdout.write)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        results = run_pending(options["jobs"], force=options["force"])
+        if not results:
+            self.stdout.write("No jobs due.")
+        for name, result in results.items():
+            self.stdout.write(f"{name}: {result if result is not None else 'skipped (running elsewhere)'}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from myshop.overdue import DEFAULT_BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = "Update the overdue rental queue now (normally done by run_scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Check every Active rental, not just those changed since the last sweep.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = sweep(batch_size=options["batch_size"], full=options["full"])
+        for name, value in result.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Overdue queue updated."))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0002_pricelog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['created_at', 'rental_id'], name='rentals_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0005_dashboard_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bike',
+            index=models.Index(fields=['status', 'category'], name='bikes_status_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricelog',
+            index=models.Index(fields=['category', 'change_date'], name='price_logs_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['payment_status', 'created_at', 'rental_id'], name='rentals_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['bike', 'start_date', 'end_date'], name='rentals_bike_period_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_duration_ms', models.PositiveIntegerField(default=0)),
+                ('last_result', models.CharField(blank=True, default='', max_length=255)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'job_states',
+            },
+        ),
+        migrations.CreateModel(
+            name='OverdueRental',
+            fields=[
+                ('rental', models.OneToOneField(db_column='rental_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='overdue', serialize=False, to='myshop.rental')),
+                ('end_date', models.DateTimeField()),
+                ('daily_rate', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('days_late', models.PositiveIntegerField(default=1)),
+                ('late_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('next_fee_at', models.DateTimeField()),
+                ('flagged_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'overdue_rentals',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['payment_status', 'end_date', 'rental_id'], name='rentals_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='overduerental',
+            index=models.Index(fields=['next_fee_at'], name='overdue_next_fee_idx'),
+        ),
+    ]
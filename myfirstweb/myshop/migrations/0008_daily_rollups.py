@@ -0,0 +1,90 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0007_overdue_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rented_hours', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+            ],
+            options={
+                'db_table': 'daily_rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rented_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+            ],
+            options={
+                'db_table': 'monthly_rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'rollup_dirty_days',
+            },
+        ),
+        migrations.AddField(
+            model_name='jobstate',
+            name='position',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['payment_status', 'actual_return_date'], name='rentals_status_returned_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='bike',
+            field=models.ForeignKey(db_column='bike_id', on_delete=django.db.models.deletion.CASCADE, to='myshop.bike'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='category',
+            field=models.ForeignKey(db_column='category_id', on_delete=django.db.models.deletion.CASCADE, to='myshop.bikecategory'),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='bike',
+            field=models.ForeignKey(db_column='bike_id', on_delete=django.db.models.deletion.CASCADE, to='myshop.bike'),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='category',
+            field=models.ForeignKey(db_column='category_id', on_delete=django.db.models.deletion.CASCADE, to='myshop.bikecategory'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyrollup',
+            index=models.Index(fields=['bike', 'day'], name='daily_rollups_bike_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'bike'), name='daily_rollups_day_bike_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(fields=('month', 'bike'), name='monthly_rollups_month_bike_uniq'),
+        ),
+    ]
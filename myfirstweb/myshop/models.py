@@ -45,6 +45,10 @@ class PriceLog(models.Model):
 
     class Meta:
         db_table = 'price_logs'
+        indexes = [
+            # Price history per category, newest first
+            models.Index(fields=['category', 'change_date'], name='price_logs_category_date_idx'),
+        ]
 
     def __str__(self):
         return f"Log {self.log_id} - {self.category}"
@@ -69,6 +73,10 @@ class Bike(models.Model):
 
     class Meta:
         db_table = 'bikes'
+        indexes = [
+            # Available bikes of a category (bikes page, catalog cache misses)
+            models.Index(fields=['status', 'category'], name='bikes_status_category_idx'),
+        ]
 
     def __str__(self):
         return f"{self.model_name} ({self.license_plate})"
@@ -86,6 +94,15 @@ class Customer(models.Model):
 
     class Meta:
         db_table = 'customers'
+        indexes = [
+            # Prefix lookups for the admin customer search (citizen_id is already unique)
+            models.Index(fields=['phone'], name='customers_phone_idx'),
+            models.Index(fields=['first_name', 'last_name'], name='customers_name_idx'),
+            models.Index(fields=['last_name'], name='customers_last_name_idx'),
+            models.Index(fields=['line_id'], name='customers_line_id_idx'),
+            # Keyset pagination of the customer directory
+            models.Index(fields=['created_at', 'customer_id'], name='customers_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -109,6 +126,124 @@ class Rental(models.Model):
 
     class Meta:
         db_table = 'rentals'
+        indexes = [
+            # Keyset pagination of the admin booking list
+            models.Index(fields=['created_at', 'rental_id'], name='rentals_created_idx'),
+            # Active rentals (availability index) and the status-filtered booking list
+            models.Index(fields=['payment_status', 'created_at', 'rental_id'], name='rentals_status_created_idx'),
+            # Overlap checks for one bike: bike_id = ? AND start_date < ? AND end_date > ?
+            models.Index(fields=['bike', 'start_date', 'end_date'], name='rentals_bike_period_idx'),
+            # Overdue sweep: payment_status = 'Active' AND end_date in (last run, now]
+            models.Index(fields=['payment_status', 'end_date', 'rental_id'], name='rentals_status_end_idx'),
+            # Late returns for the rollup refresh: payment_status = 'Done' AND actual_return_date > ?
+            models.Index(fields=['payment_status', 'actual_return_date'], name='rentals_status_returned_idx'),
+        ]
 
     def __str__(self):
         return f"Rental {self.rental_id} - {self.customer}"
+
+
+class DashboardCounter(models.Model):
+    """Incrementally maintained dashboard figures (see myshop.dashboard)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'dashboard_counters'
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class OverdueRental(models.Model):
+    """Queue of Active rentals past their end date (see myshop.overdue)."""
+    rental = models.OneToOneField(
+        Rental, on_delete=models.CASCADE, primary_key=True, db_column='rental_id', related_name='overdue'
+    )
+    end_date = models.DateTimeField()
+    daily_rate = models.DecimalField(max_digits=10, decimal_places=2)
+    days_late = models.PositiveIntegerField(default=1)
+    late_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    # When days_late next goes up; the sweeper only re-prices rows past this
+    next_fee_at = models.DateTimeField()
+    flagged_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'overdue_rentals'
+        indexes = [
+            models.Index(fields=['next_fee_at'], name='overdue_next_fee_idx'),
+        ]
+
+    def __str__(self):
+        return f"Rental {self.rental_id} overdue {self.days_late}d"
+
+
+class JobState(models.Model):
+    """Last run and lease of a scheduled job (see myshop.scheduler)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    watermark = models.DateTimeField(blank=True, null=True)
+    # For jobs that follow an auto-increment key instead (e.g. last rental_id seen)
+    position = models.BigIntegerField(blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_duration_ms = models.PositiveIntegerField(default=0)
+    last_result = models.CharField(max_length=255, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'job_states'
+
+    def __str__(self):
+        return f"{self.name} (last run {self.last_run_at})"
+
+
+class DailyRollup(models.Model):
+    """Rental totals per day and bike, for the reports (see myshop.rollups)."""
+    day = models.DateField()
+    bike = models.ForeignKey(Bike, on_delete=models.CASCADE, db_column='bike_id')
+    category = models.ForeignKey(BikeCategory, on_delete=models.CASCADE, db_column='category_id')
+    bookings = models.PositiveIntegerField(default=0)  # Rentals picked up that day
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Their total_price
+    rented_hours = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # Out on rental that day
+
+    class Meta:
+        db_table = 'daily_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'bike'], name='daily_rollups_day_bike_uniq'),
+        ]
+        indexes = [
+            # Per-bike history (utilization per bike)
+            models.Index(fields=['bike', 'day'], name='daily_rollups_bike_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} bike {self.bike_id}"
+
+
+class MonthlyRollup(models.Model):
+    """DailyRollup summed per calendar month (month = its first day), for long report ranges."""
+    month = models.DateField()
+    bike = models.ForeignKey(Bike, on_delete=models.CASCADE, db_column='bike_id')
+    category = models.ForeignKey(BikeCategory, on_delete=models.CASCADE, db_column='category_id')
+    bookings = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    rented_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'monthly_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'bike'], name='monthly_rollups_month_bike_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} bike {self.bike_id}"
+
+
+class RollupDirtyDay(models.Model):
+    """A day whose rollup rows must be recomputed on the next refresh."""
+    day = models.DateField(primary_key=True)
+
+    class Meta:
+        db_table = 'rollup_dirty_days'
+
+    def __str__(self):
+        return str(self.day)
@@ -0,0 +1,158 @@
+"""
+Overdue rentals: a queue of Active rentals past their end date.
+
+`sweep()` keeps the overdue_rentals table in step with the rentals table
+without scanning it. Each run only looks at rows whose state can have changed
+since the previous run (the watermark kept in job_states):
+
+- Active rentals whose end_date passed since the last run, found with a range
+  scan of rentals_status_end_idx, plus Active rentals created since then with
+  an end date already behind us (rentals_status_created_idx);
+- queued rentals that are no longer Active (returned outside the admin views,
+  e.g. directly by AdminReturnBike);
+- queued rentals whose late fee went up a day (overdue_next_fee_idx).
+
+The late fee is the category's daily rate for every started day past the end
+date. The dashboard reads the count and total fee from the queue (or from the
+counter table), never from rentals.
+"""
+
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dashboard
+from .models import JobState, OverdueRental, Rental
+
+JOB_NAME = "overdue_sweep"
+FEE_PERIOD = timedelta(days=1)
+DEFAULT_BATCH_SIZE = 500
+
+
+def days_late(end_date, now):
+    """Started days past `end_date` (at least 1 once it has passed)."""
+    return max(1, math.ceil((now - end_date) / FEE_PERIOD))
+
+
+def late_fee(daily_rate, days):
+    return (Decimal(daily_rate) * days).quantize(Decimal("0.01"))
+
+
+def _queue_row(rental_id, end_date, daily_rate, now):
+    days = days_late(end_date, now)
+    return OverdueRental(
+        rental_id=rental_id,
+        end_date=end_date,
+        daily_rate=daily_rate,
+        days_late=days,
+        late_fee=late_fee(daily_rate, days),
+        next_fee_at=end_date + days * FEE_PERIOD,
+    )
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of rows from `queryset` in rental_id order, `batch_size` at a time."""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(rental_id__gt=last_id).order_by("rental_id")[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _flag(queryset, now, batch_size):
+    flagged = 0
+    candidates = queryset.values_list("rental_id", "end_date", "bike__category__price_daily")
+    for rows in _batches(candidates, batch_size):
+        with transaction.atomic():
+            queued = set(
+                OverdueRental.objects.filter(pk__in=[row[0] for row in rows]).values_list("pk", flat=True)
+            )
+            new = [_queue_row(*row, now) for row in rows if row[0] not in queued]
+            OverdueRental.objects.bulk_create(new, ignore_conflicts=True)
+            dashboard.overdue_changed(len(new), sum((row.late_fee for row in new), Decimal(0)))
+        flagged += len(new)
+    return flagged
+
+
+def _clear_resolved(now, batch_size):
+    # The queue is small (only overdue rentals), so this join is cheap
+    resolved = OverdueRental.objects.filter(
+        ~Q(rental__payment_status="Active") | Q(rental__end_date__gt=now)
+    ).values_list("rental_id", flat=True)
+    cleared = 0
+    while True:
+        rental_ids = list(resolved[:batch_size])
+        if not rental_ids:
+            return cleared
+        cleared += clear(rental_ids)
+
+
+def _reprice(now, batch_size):
+    repriced = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                OverdueRental.objects.select_for_update()
+                .filter(next_fee_at__lte=now)
+                .order_by("next_fee_at")[:batch_size]
+            )
+            if not rows:
+                return repriced
+            delta = Decimal(0)
+            for row in rows:
+                old_fee = row.late_fee
+                row.days_late = days_late(row.end_date, now)
+                row.late_fee = late_fee(row.daily_rate, row.days_late)
+                row.next_fee_at = row.end_date + row.days_late * FEE_PERIOD
+                delta += row.late_fee - old_fee
+            OverdueRental.objects.bulk_update(rows, ["days_late", "late_fee", "next_fee_at"])
+            dashboard.overdue_changed(0, delta)
+        repriced += len(rows)
+
+
+def sweep(now=None, batch_size=DEFAULT_BATCH_SIZE, full=False):
+    """Bring the overdue queue up to date; returns what changed.
+
+    `full` ignores the watermark and checks every Active rental, e.g. after
+    rentals were bulk-loaded behind the sweeper's back.
+    """
+    now = now or timezone.now()
+    state, _ = JobState.objects.get_or_create(name=JOB_NAME)
+    since = None if full else state.watermark
+
+    active = Rental.objects.filter(payment_status="Active", end_date__lte=now)
+    if since is None:
+        flagged = _flag(active, now, batch_size)
+    else:
+        flagged = _flag(active.filter(end_date__gt=since), now, batch_size)
+        # Bookings entered with an end date that was already past
+        flagged += _flag(active.filter(created_at__gt=since, end_date__lte=since), now, batch_size)
+
+    result = {
+        "flagged": flagged,
+        "cleared": _clear_resolved(now, batch_size),
+        "repriced": _reprice(now, batch_size),
+    }
+    JobState.objects.filter(name=JOB_NAME).update(watermark=now)
+    return result
+
+
+def clear(rental_ids):
+    """Drop rentals from the queue (called when they are returned); returns how many."""
+    with transaction.atomic():
+        rows = list(
+            OverdueRental.objects.select_for_update()
+            .filter(pk__in=list(rental_ids))
+            .values_list("rental_id", "late_fee")
+        )
+        if rows:
+            OverdueRental.objects.filter(pk__in=[rental_id for rental_id, _ in rows]).delete()
+            dashboard.overdue_changed(-len(rows), -sum((fee for _, fee in rows), Decimal(0)))
+    return len(rows)
+
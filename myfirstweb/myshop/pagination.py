@@ -0,0 +1,108 @@
+"""
+Keyset (cursor) pagination for the admin lists.
+
+Pages are ordered by (order_field DESC, pk DESC) and the cursor carries the
+last row's values, so fetching page N costs the same as fetching page 1
+instead of growing with OFFSET.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import F, Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(value, pk):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (value, pk) from a cursor string, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        if value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def page_size_from(params, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(params.get("page_size", default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _keyset_queryset(queryset, order_field, cursor, page_size):
+    pk_name = queryset.model._meta.pk.name
+    queryset = queryset.order_by(F(order_field).desc(nulls_last=True), f"-{pk_name}")
+
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        if value is None:
+            queryset = queryset.filter(
+                Q(**{f"{order_field}__isnull": True, f"{pk_name}__lt": pk})
+            )
+        else:
+            queryset = queryset.filter(
+                Q(**{f"{order_field}__lt": value})
+                | Q(**{order_field: value, f"{pk_name}__lt": pk})
+                | Q(**{f"{order_field}__isnull": True})
+            )
+    return queryset[:page_size + 1]
+
+
+def _split_page(rows, order_field, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, order_field), last.pk)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, order_field, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return (rows, next_cursor) for one page of `queryset`.
+
+    `order_field` may be NULL (e.g. created_at); NULL rows sort last and are
+    paged by primary key alone.
+    """
+    rows = list(_keyset_queryset(queryset, order_field, cursor, page_size))
+    return _split_page(rows, order_field, page_size)
+
+
+async def akeyset_page(queryset, order_field, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Async version of keyset_page (async ORM iteration)."""
+    rows = [row async for row in _keyset_queryset(queryset, order_field, cursor, page_size)]
+    return _split_page(rows, order_field, page_size)
+
+
+def next_page_query(params, next_cursor):
+    """Querystring for the next page, keeping the current filters."""
+    if not next_cursor:
+        return None
+    query = params.copy()
+    query["cursor"] = next_cursor
+    return query.urlencode()
+
+
+def first_page_query(params):
+    """Querystring for the first page, or None if we are already on it."""
+    if not params.get("cursor"):
+        return None
+    query = params.copy()
+    del query["cursor"]
+    return query.urlencode()
@@ -0,0 +1,167 @@
+"""
+Rental price quotes.
+
+`quote` is a pure function: it prices a rental as the daily rate times the
+rental days, plus the deposit, which is what the CreateRental triggers charge
+on MySQL. With PRICE_BLOCKS on it uses the cheapest mix of monthly, weekly and
+daily blocks for the category instead; turn that on only together with a
+CreateRental that charges the same, or checkout shows one price and the
+database charges another. `get_quote` and the batch helpers memoize quotes
+per price version; the version moves whenever a PriceLog row is written.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import PriceLog
+
+DAYS_PER_WEEK = 7
+DAYS_PER_MONTH = 30
+
+Quote = namedtuple(
+    "Quote",
+    ["days", "months", "weeks", "extra_days", "rental_price", "deposit", "total"],
+)
+
+
+def rental_days(start, end):
+    """Number of rental days, counting both pickup and return day (at least 1)."""
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    return max(1, (end - start).days + 1)
+
+
+def cheapest_blocks(days, price_daily, price_weekly, price_monthly):
+    """Return (months, weeks, extra_days, price) covering `days` at the lowest price.
+
+    A block may run past the end of the rental when that is cheaper, e.g. a
+    weekly rate for a six-day rental.
+    """
+    best = None
+    for months in range(days // DAYS_PER_MONTH + 2):
+        remaining = max(0, days - months * DAYS_PER_MONTH)
+        for weeks in range(remaining // DAYS_PER_WEEK + 2):
+            extra_days = max(0, remaining - weeks * DAYS_PER_WEEK)
+            price = months * price_monthly + weeks * price_weekly + extra_days * price_daily
+            if best is None or price < best[3]:
+                best = (months, weeks, extra_days, price)
+            if extra_days == 0:
+                break
+        if remaining == 0:
+            break
+    return best
+
+
+def price_blocks():
+    return getattr(settings, "PRICE_BLOCKS", False)
+
+
+def quote(category, start, end):
+    """Price a rental of `category` from `start` to `end` (dates or datetimes)."""
+    return price_days(category, rental_days(start, end))
+
+
+def price_days(category, days, blocks=None):
+    """Price `days` rental days of `category`; `blocks` defaults to PRICE_BLOCKS."""
+    if blocks is None:
+        blocks = price_blocks()
+    if blocks:
+        months, weeks, extra_days, rental_price = cheapest_blocks(
+            days, category.price_daily, category.price_weekly, category.price_monthly
+        )
+    else:
+        months, weeks, extra_days, rental_price = 0, 0, days, days * category.price_daily
+    deposit = category.deposit_amount
+    return Quote(days, months, weeks, extra_days, rental_price, deposit, rental_price + deposit)
+
+
+# --- Memoized quotes ---
+
+_memo = {}
+_memo_lock = threading.Lock()
+_local_version = 0
+_db_version = None
+_db_version_checked_at = None
+
+
+def _memo_max_size():
+    return getattr(settings, "PRICE_QUOTE_CACHE_SIZE", 4096)
+
+
+def price_version():
+    """Current price version: local PriceLog saves plus the latest PriceLog id.
+
+    PriceLog rows are usually written by the database trigger on price changes,
+    so the latest log id is re-read every PRICE_VERSION_TTL seconds as well.
+    """
+    global _db_version, _db_version_checked_at
+    now = time.monotonic()
+    ttl = getattr(settings, "PRICE_VERSION_TTL", 60)
+    if _db_version_checked_at is None or now - _db_version_checked_at > ttl:
+        _db_version = PriceLog.objects.aggregate(latest=Max("log_id"))["latest"]
+        _db_version_checked_at = now
+    return (_local_version, _db_version)
+
+
+def invalidate_quotes():
+    global _local_version, _db_version_checked_at
+    with _memo_lock:
+        _local_version += 1
+        _db_version_checked_at = None
+        _memo.clear()
+
+
+@receiver(post_save, sender=PriceLog)
+def _price_logged(sender, **kwargs):
+    invalidate_quotes()
+
+
+def _quote_days(category, days, version):
+    # Prices are part of the key too, so a category re-read with new prices
+    # never picks up a quote computed from the old ones.
+    blocks = price_blocks()
+    key = (
+        version,
+        blocks,
+        category.pk,
+        category.price_daily,
+        category.price_weekly,
+        category.price_monthly,
+        category.deposit_amount,
+        days,
+    )
+    result = _memo.get(key)
+    if result is None:
+        result = price_days(category, days, blocks)
+        with _memo_lock:
+            if len(_memo) >= _memo_max_size():
+                _memo.clear()
+            _memo[key] = result
+    return result
+
+
+def get_quote(category, start, end):
+    """Memoized `quote`."""
+    return _quote_days(category, rental_days(start, end), price_version())
+
+
+def quote_many(categories, start, end):
+    """Quote one date range for many categories; returns {category_id: Quote}."""
+    version = price_version()
+    days = rental_days(start, end)
+    return {category.pk: _quote_days(category, days, version) for category in categories}
+
+
+def quote_ranges(category, ranges):
+    """Quote many (start, end) ranges for one category, in order."""
+    version = price_version()
+    return [_quote_days(category, rental_days(start, end), version) for start, end in ranges]
@@ -0,0 +1,336 @@
+"""
+Procedure backends: the write operations behind the booking flow and admin.
+
+In production every write is a MySQL stored procedure (SaveCustomerForBooking,
+CreateRental, AdminReturnBike, AdminAddBike, ...) plus the triggers on the
+rentals table. `MySQLProcedures` calls them; `OrmProcedures` reproduces the
+same operations and trigger rules with atomic ORM statements, so the logic can
+be profiled and the whole app can run on SQLite.
+
+The backend is chosen with the PROCEDURE_BACKEND setting ("mysql" or "orm",
+or a dotted path to a class); use `get_procedures()` to get it.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .availability import rental_period
+from .booking import BookingResult, StepTimer, commit_booking
+from .models import Bike, BikeCategory, Customer, Rental
+from .pricing import quote
+
+logger = logging.getLogger(__name__)
+
+
+class ProcedureError(Exception):
+    """A procedure (or one of its trigger rules) rejected the operation."""
+
+
+class BookingConflict(ProcedureError):
+    """The bike already has an Active rental overlapping the requested period."""
+
+
+def overlapping_rentals(bike_id, start, end):
+    """Active rentals of the bike overlapping [start, end) (rentals_bike_period_idx)."""
+    return Rental.objects.filter(
+        bike_id=bike_id,
+        payment_status="Active",
+        start_date__lt=end,
+        end_date__gt=start,
+    )
+
+
+def reserve_bike(bike_id, start, end):
+    """Lock the bike row and reject the booking if it overlaps an Active rental.
+
+    Must run inside the booking transaction, before anything is written:
+    concurrent checkouts for the same bike queue on the row lock here, so the
+    first one wins and the others fail this check without upserting their
+    customer or reaching CreateRental's trigger. Returns the locked Bike.
+    """
+    bike = Bike.objects.select_for_update().filter(pk=bike_id).first()
+    if bike is None:
+        raise ProcedureError(f"Bike {bike_id} does not exist")
+    if overlapping_rentals(bike_id, start, end).exists():
+        raise BookingConflict("Bike is already booked for the selected dates")
+    return bike
+
+
+def run_batch(item_ids, operation):
+    """Apply `operation(item_id)` to every ID in one transaction.
+
+    Each item runs in its own savepoint, so a failing item is rolled back on
+    its own and the rest still commit. Returns [(item_id, error or None)].
+    """
+    results = []
+    with transaction.atomic():
+        for item_id in item_ids:
+            try:
+                with transaction.atomic():
+                    operation(item_id)
+            except (ProcedureError, DatabaseError) as e:
+                results.append((item_id, str(e)))
+            else:
+                results.append((item_id, None))
+    return results
+
+
+class MySQLProcedures:
+    """Calls the stored procedures; triggers run inside MySQL."""
+
+    name = "mysql"
+
+    def commit_booking(self, customer_data, rental_data, bike_id):
+        period = rental_period(rental_data)
+        if period is None:
+            raise ProcedureError("Invalid rental dates")
+        with transaction.atomic():
+            reserve_bike(bike_id, *period)
+            return commit_booking(customer_data, rental_data, bike_id)
+
+    def _call(self, procedure, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"CALL {procedure}({', '.join(['%s'] * len(params))})", params)
+
+    def return_bike(self, rental_id):
+        self._call("AdminReturnBike", [rental_id])
+
+    def return_bikes(self, rental_ids):
+        return run_batch(rental_ids, self.return_bike)
+
+    def add_bike(self, model_name, license_plate, category_name, description, engine_size, image_url):
+        self._call("AdminAddBike", [model_name, license_plate, category_name, description, engine_size, image_url])
+
+    def add_bike_from_existing(self, model_name, license_plate):
+        self._call("AdminAddBikeFromExisting", [model_name, license_plate])
+
+    def update_bike_info(self, bike_id, model_name, license_plate, category_name, description, engine_size, image_url):
+        self._call("AdminUpdateBikeInfo", [
+            bike_id, model_name, license_plate, category_name, description, engine_size, image_url
+        ])
+
+    def update_bike_status(self, bike_id, status):
+        self._call("AdminUpdateBikeStatus", [bike_id, status])
+
+    def update_bike_statuses(self, bike_ids, status):
+        return run_batch(bike_ids, lambda bike_id: self.update_bike_status(bike_id, status))
+
+    def delete_bike(self, bike_id):
+        self._call("AdminDeleteBike", [bike_id])
+
+
+class OrmProcedures:
+    """The same operations and trigger rules, written with the ORM."""
+
+    name = "orm"
+
+    # --- Booking (SaveCustomerForBooking + CreateRental and its triggers) ---
+
+    def save_customer(self, citizen_id, first_name, last_name, phone, email, line_id):
+        """Insert or update the customer by citizen ID; return the customer ID."""
+        customer, _ = Customer.objects.update_or_create(
+            citizen_id=citizen_id,
+            defaults={
+                "first_name": first_name,
+                "last_name": last_name,
+                "phone": phone,
+                "email": email,
+                "line_id": line_id,
+            },
+        )
+        return customer.pk
+
+    def create_rental(self, customer_id, bike_id, start, end):
+        """Create an Active rental; rejects overlaps and marks the bike Rented."""
+        if end <= start:
+            raise ProcedureError("Return date must be after pickup date")
+        return self._insert_rental(customer_id, reserve_bike(bike_id, start, end), start, end)
+
+    def _insert_rental(self, customer_id, bike, start, end):
+        # The bike is already locked and checked by reserve_bike()
+        rental = Rental.objects.create(
+            customer_id=customer_id,
+            bike_id=bike.pk,
+            start_date=start,
+            end_date=end,
+            total_price=quote(BikeCategory.objects.get(pk=bike.category_id), start, end).total,
+            payment_status="Active",
+        )
+        Bike.objects.filter(pk=bike.pk).update(status="Rented")
+        return rental, "Rented"
+
+    def commit_booking(self, customer_data, rental_data, bike_id):
+        timer = StepTimer()
+        period = rental_period(rental_data)
+        if period is None:
+            raise ProcedureError("Invalid rental dates")
+        timer.lap("prepare")
+
+        with transaction.atomic():
+            # Conflicts are rejected before the customer is written
+            bike = reserve_bike(bike_id, *period)
+            customer_id = self.save_customer(
+                customer_data["citizen_id"],
+                customer_data["first_name"],
+                customer_data["last_name"],
+                customer_data["phone"],
+                rental_data["email"],
+                customer_data["line_id"],
+            )
+            rental, bike_status = self._insert_rental(customer_id, bike, *period)
+            timer.lap("execute")
+        timer.lap("commit")
+
+        timings = timer.finish()
+        logger.debug("Booking committed for bike %s: %s", bike_id, timings)
+        return BookingResult(customer_id, rental.pk, rental.total_price, bike_status, timings)
+
+    # --- Admin procedures ---
+
+    def return_bike(self, rental_id):
+        # AdminReturnBike closes the rental; trg_bike_returned frees the bike
+        with transaction.atomic():
+            rental = Rental.objects.select_for_update().filter(pk=rental_id).first()
+            if rental is None:
+                raise ProcedureError(f"Rental {rental_id} does not exist")
+            if rental.payment_status != "Active":
+                raise ProcedureError(f"Rental {rental_id} is not active")
+            Rental.objects.filter(pk=rental_id).update(
+                actual_return_date=timezone.now(), payment_status="Done"
+            )
+            Bike.objects.filter(pk=rental.bike_id).update(status="Available")
+
+    def return_bikes(self, rental_ids):
+        """Return many rentals with a fixed number of statements."""
+        with transaction.atomic():
+            found = dict(
+                Rental.objects.select_for_update()
+                .filter(pk__in=rental_ids)
+                .values_list("rental_id", "payment_status")
+            )
+            results = []
+            for rental_id in rental_ids:
+                if rental_id not in found:
+                    results.append((rental_id, f"Rental {rental_id} does not exist"))
+                elif found[rental_id] != "Active":
+                    results.append((rental_id, f"Rental {rental_id} is not active"))
+                else:
+                    results.append((rental_id, None))
+            returned = [rental_id for rental_id, error in results if error is None]
+            if returned:
+                Rental.objects.filter(pk__in=returned).update(
+                    actual_return_date=timezone.now(), payment_status="Done"
+                )
+                Bike.objects.filter(rental__pk__in=returned).update(status="Available")
+        return results
+
+    def _category(self, category_name):
+        category = BikeCategory.objects.filter(name=category_name).first()
+        if category is None:
+            raise ProcedureError(f"Category '{category_name}' does not exist")
+        return category
+
+    def _check_plate(self, license_plate, bike_id=None):
+        if not license_plate:
+            raise ProcedureError("License plate is required")
+        taken = Bike.objects.filter(license_plate=license_plate).exclude(pk=bike_id)
+        if taken.exists():
+            raise ProcedureError(f"License plate '{license_plate}' already exists")
+
+    def add_bike(self, model_name, license_plate, category_name, description, engine_size, image_url):
+        with transaction.atomic():
+            self._check_plate(license_plate)
+            return Bike.objects.create(
+                model_name=model_name,
+                license_plate=license_plate,
+                category=self._category(category_name),
+                description=description,
+                engine_size=engine_size,
+                image_url=image_url,
+                status="Available",
+            )
+
+    def add_bike_from_existing(self, model_name, license_plate):
+        with transaction.atomic():
+            source = Bike.objects.filter(model_name=model_name).order_by("bike_id").first()
+            if source is None:
+                raise ProcedureError(f"Model '{model_name}' does not exist")
+            self._check_plate(license_plate)
+            return Bike.objects.create(
+                model_name=source.model_name,
+                license_plate=license_plate,
+                category_id=source.category_id,
+                description=source.description,
+                engine_size=source.engine_size,
+                image_url=source.image_url,
+                status="Available",
+            )
+
+    def update_bike_info(self, bike_id, model_name, license_plate, category_name, description, engine_size, image_url):
+        with transaction.atomic():
+            self._check_plate(license_plate, bike_id)
+            updated = Bike.objects.filter(pk=bike_id).update(
+                model_name=model_name,
+                license_plate=license_plate,
+                category=self._category(category_name),
+                description=description,
+                engine_size=engine_size,
+                image_url=image_url,
+            )
+            if not updated:
+                raise ProcedureError(f"Bike {bike_id} does not exist")
+
+    def update_bike_status(self, bike_id, status):
+        if status not in dict(Bike.STATUS_CHOICES):
+            raise ProcedureError(f"Invalid status '{status}'")
+        if not Bike.objects.filter(pk=bike_id).update(status=status):
+            raise ProcedureError(f"Bike {bike_id} does not exist")
+
+    def update_bike_statuses(self, bike_ids, status):
+        if status not in dict(Bike.STATUS_CHOICES):
+            return [(bike_id, f"Invalid status '{status}'") for bike_id in bike_ids]
+        with transaction.atomic():
+            found = set(
+                Bike.objects.select_for_update().filter(pk__in=bike_ids).values_list("bike_id", flat=True)
+            )
+            Bike.objects.filter(pk__in=found).update(status=status)
+        return [
+            (bike_id, None if bike_id in found else f"Bike {bike_id} does not exist")
+            for bike_id in bike_ids
+        ]
+
+    def delete_bike(self, bike_id):
+        with transaction.atomic():
+            bike = Bike.objects.select_for_update().filter(pk=bike_id).first()
+            if bike is None:
+                raise ProcedureError(f"Bike {bike_id} does not exist")
+            if bike.status == "Rented":
+                raise ProcedureError("Cannot delete bike: Bike is currently rented")
+            # rentals.bike_id is ON DELETE RESTRICT in the MySQL schema
+            if Rental.objects.filter(bike_id=bike_id).exists():
+                raise ProcedureError("Cannot delete bike: This bike has rental history")
+            bike.delete()
+
+
+PROCEDURE_BACKENDS = {
+    "mysql": MySQLProcedures,
+    "orm": OrmProcedures,
+}
+
+_backend = None
+_backend_name = None
+
+
+def get_procedures():
+    """Return the configured procedure backend (PROCEDURE_BACKEND setting)."""
+    global _backend, _backend_name
+    name = getattr(settings, "PROCEDURE_BACKEND", "mysql")
+    if _backend is None or name != _backend_name:
+        backend_class = PROCEDURE_BACKENDS.get(name) or import_string(name)
+        _backend = backend_class()
+        _backend_name = name
+    return _backend
@@ -0,0 +1,97 @@
+"""
+Render benchmark for the public pages: home, dates, the category grid and
+the bike cards of one category.
+
+Each page is requested repeatedly through the test client (one customer
+with dates in their draft) under three configurations:
+
+- uncached: the filesystem / app directories loaders on their own, which
+  read and parse every template on every render, and no fragment caching;
+- cached_loader: templates parsed once per process, no fragment caching;
+- fragments: the cached loader plus the {% cache %} fragments (the
+  settings as shipped).
+
+Reported per page: the mean wall time of the request and of its template
+render (the "tpl" entry of the Server-Timing header).
+"""
+
+import copy
+import re
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.test import Client
+from django.test.utils import override_settings
+
+from .catalog import get_available_bikes, get_categories
+
+TPL_RE = re.compile(r"tpl;dur=([\d.]+)")
+
+
+def _templates(cached):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    for engine in templates:
+        loaders = engine["OPTIONS"].get("loaders")
+        if not cached and loaders and loaders[0][0] == "django.template.loaders.cached.Loader":
+            engine["OPTIONS"]["loaders"] = loaders[0][1]
+    return templates
+
+
+CONFIGS = {
+    "uncached": lambda: {"TEMPLATES": _templates(cached=False), "CATALOG_FRAGMENT_TIMEOUT": 0},
+    "cached_loader": lambda: {"TEMPLATES": _templates(cached=True), "CATALOG_FRAGMENT_TIMEOUT": 0},
+    "fragments": lambda: {"TEMPLATES": _templates(cached=True)},
+}
+
+
+def _busiest_category():
+    return max(get_categories(), key=lambda category: len(get_available_bikes(category)), default=None)
+
+
+def _customer(category):
+    client = Client(HTTP_HOST="localhost")
+    pickup = date.today() + timedelta(days=60)
+    client.post("/dates/", {
+        "email": "render@example.com",
+        "pickup_date": pickup.isoformat(),
+        "pickup_time": "10:00",
+        "return_date": (pickup + timedelta(days=3)).isoformat(),
+        "return_time": "10:00",
+    })
+    return client
+
+
+def _pages(client, category):
+    yield "home", lambda: client.get("/")
+    yield "dates", lambda: client.get("/dates/")
+    yield "categories", lambda: client.get("/bikes/")
+    if category is not None:
+        yield "bikes", lambda: client.get("/bikes/")
+
+
+def _measure(fetch, iterations):
+    fetch()  # Warm up (loads the templates, fills the fragments)
+    total_ms = tpl_ms = 0.0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = fetch()
+        total_ms += (time.perf_counter() - started) * 1000
+        match = TPL_RE.search(response.get("Server-Timing", ""))
+        tpl_ms += float(match.group(1)) if match else 0.0
+    return {"ms": round(total_ms / iterations, 3), "tpl_ms": round(tpl_ms / iterations, 3)}
+
+
+def render_benchmark(iterations=200):
+    """{config: {page: {ms, tpl_ms}}}"""
+    category = _busiest_category()
+    results = {}
+    for config, config_settings in CONFIGS.items():
+        with override_settings(**config_settings()):
+            client = _customer(category)
+            results[config] = {}
+            for page, fetch in _pages(client, category):
+                if page == "bikes":
+                    client.post("/bikes/", {"category": category.name})
+                results[config][page] = _measure(fetch, iterations)
+    return results
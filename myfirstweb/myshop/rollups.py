@@ -0,0 +1,304 @@
+"""
+Daily rollups behind the admin reports.
+
+daily_rollups holds one row per (day, bike) with the bookings picked up that
+day, their total_price and the hours the bike was out on rental;
+monthly_rollups holds the same figures summed per calendar month. A report
+reads whole months from the monthly rows and only the partial months at
+either end from the daily rows, so a year costs about 12 x fleet-size rows
+and never touches the rentals table.
+
+The table is refreshed incrementally. Every write path that changes a
+rental's contribution marks the days it touches in rollup_dirty_days (a
+booking marks its rental period, a return the days between the scheduled and
+the actual return). `refresh()` also picks up rentals inserted behind the
+app's back by following a rental_id watermark, then recomputes only the
+dirty days (and re-sums their months). Cancelled rentals count for nothing; a rental is "out" from its
+start until its actual return, or its scheduled end while not yet returned.
+
+Rows written outside the app that change existing rentals (e.g. a manual
+cancellation in MySQL) need `mark_days()` or a `refresh(full=True)`.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .admin_queries import day_start
+from .models import Bike, BikeCategory, DailyRollup, JobState, MonthlyRollup, Rental, RollupDirtyDay
+
+JOB_NAME = "daily_rollups"
+CHUNK_DAYS = 31  # Dirty days recomputed per transaction
+BATCH_SIZE = 5000
+
+RENTAL_FIELDS = ("rental_id", "bike_id", "start_date", "end_date", "actual_return_date", "total_price")
+
+
+def _local_day(value):
+    return timezone.localtime(value).date()
+
+
+def _out_until(end_date, actual_return_date):
+    return actual_return_date or end_date
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _days(first, last):
+    day = first
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+# --- Marking dirty days ---
+
+def mark_days(days):
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(day=day) for day in set(days)], ignore_conflicts=True
+    )
+
+
+def period_booked(start, end):
+    """A rental was booked for [start, end)."""
+    mark_days(_days(_local_day(start), _local_day(end)))
+
+
+def rentals_returned(rental_ids):
+    """Rentals were returned: their hours change between the scheduled and actual return."""
+    days = set()
+    for end_date, returned in Rental.objects.filter(pk__in=list(rental_ids)).values_list(
+        "end_date", "actual_return_date"
+    ):
+        returned = returned or end_date
+        days.update(_days(_local_day(min(end_date, returned)), _local_day(max(end_date, returned))))
+    mark_days(days)
+
+
+def _mark_new_rentals(state):
+    """Mark the days of rentals inserted since the last refresh; returns how many."""
+    seen = 0
+    position = state.position or 0
+    while True:
+        rows = list(
+            Rental.objects.filter(rental_id__gt=position)
+            .order_by("rental_id")
+            .values_list("rental_id", "start_date", "end_date", "actual_return_date")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        days = set()
+        for _, start, end, returned in rows:
+            days.update(_days(_local_day(start), _local_day(max(end, returned or end))))
+        mark_days(days)
+        position = rows[-1][0]
+        seen += len(rows)
+    if seen:
+        JobState.objects.filter(name=JOB_NAME).update(position=position)
+    return seen
+
+
+# --- Computing rollup rows ---
+
+def _accumulate(totals, rentals, wanted=None):
+    """Add each rental's bookings / revenue / seconds out to totals[(day, bike_id)]."""
+    # Resolve the zone once: this runs per rental-day over the whole table on a rebuild
+    tz = timezone.get_current_timezone()
+    one_day = timedelta(days=1)
+    for _, bike_id, start, end, returned, total_price in rentals:
+        start_day = start.astimezone(tz).date()
+        if wanted is None or start_day in wanted:
+            row = totals[(start_day, bike_id)]
+            row[0] += 1
+            row[1] += total_price
+        out_until = _out_until(end, returned)
+        for day in _days(start_day, out_until.astimezone(tz).date()):
+            if wanted is not None and day not in wanted:
+                continue
+            midnight = datetime.combine(day, time.min, tzinfo=tz)
+            overlap = (min(out_until, midnight + one_day) - max(start, midnight)).total_seconds()
+            if overlap > 0:
+                totals[(day, bike_id)][2] += overlap
+
+
+def _rollup_rows(totals, bike_categories):
+    return [
+        DailyRollup(
+            day=day,
+            bike_id=bike_id,
+            category_id=bike_categories.get(bike_id),
+            bookings=bookings,
+            revenue=revenue,
+            rented_hours=Decimal(seconds / 3600).quantize(Decimal("0.01")),
+        )
+        for (day, bike_id), (bookings, revenue, seconds) in totals.items()
+        if bike_id in bike_categories
+    ]
+
+
+def _new_totals():
+    return defaultdict(lambda: [0, Decimal(0), 0.0])
+
+
+def _counted():
+    return Rental.objects.filter(payment_status__in=["Active", "Done"])
+
+
+def _recompute(days, bike_categories):
+    """Rewrite the rollup rows of `days` (one transaction)."""
+    wanted = set(days)
+    lo, hi = day_start(min(wanted)), day_start(max(wanted) + timedelta(days=1))
+    with transaction.atomic():
+        # Claim the days before reading: a booking that marks one of them
+        # again from here on leaves it dirty for the next run
+        RollupDirtyDay.objects.filter(day__in=wanted).delete()
+        # Rentals still out after `lo` by schedule, or returned late after it
+        # (rentals_status_end_idx / rentals_status_returned_idx)
+        rentals = list(_counted().filter(end_date__gt=lo, start_date__lt=hi).values_list(*RENTAL_FIELDS))
+        rentals += Rental.objects.filter(
+            payment_status="Done", actual_return_date__gt=lo, end_date__lte=lo, start_date__lt=hi
+        ).values_list(*RENTAL_FIELDS)
+
+        totals = _new_totals()
+        _accumulate(totals, rentals, wanted)
+        rows = _rollup_rows(totals, bike_categories)
+        DailyRollup.objects.filter(day__in=wanted).delete()
+        DailyRollup.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        _resum_months({_month(day) for day in wanted})
+    return len(rows)
+
+
+SUMS = {"bookings": Sum("bookings"), "revenue": Sum("revenue"), "rented_hours": Sum("rented_hours")}
+
+
+def _monthly_rows(values):
+    return [
+        MonthlyRollup(
+            month=row["month"],
+            bike_id=row["bike"],
+            category_id=row["category"],
+            bookings=row["bookings"],
+            revenue=row["revenue"],
+            rented_hours=row["rented_hours"],
+        )
+        for row in values
+    ]
+
+
+def _resum_months(months):
+    """Re-sum the monthly rows of `months` from the daily rows."""
+    rows = []
+    for month in months:
+        rows += _monthly_rows(
+            dict(values, month=month)
+            for values in DailyRollup.objects.filter(day__gte=month, day__lt=_next_month(month))
+            .values("bike", "category").annotate(**SUMS).order_by()
+        )
+    MonthlyRollup.objects.filter(month__in=list(months)).delete()
+    MonthlyRollup.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def rebuild():
+    """Recompute the whole table in one pass over rentals; returns the row count."""
+    bike_categories = dict(Bike.objects.values_list("bike_id", "category_id"))
+    totals = _new_totals()
+    _accumulate(totals, _counted().values_list(*RENTAL_FIELDS).iterator(chunk_size=BATCH_SIZE))
+    rows = _rollup_rows(totals, bike_categories)
+    with transaction.atomic():
+        RollupDirtyDay.objects.all().delete()
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        MonthlyRollup.objects.all().delete()
+        MonthlyRollup.objects.bulk_create(_monthly_rows(
+            DailyRollup.objects.annotate(month=TruncMonth("day"))
+            .values("month", "bike", "category").annotate(**SUMS).order_by()
+        ), batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def refresh(now=None, full=False):
+    """Bring the rollups up to date; returns what was done.
+
+    The first run (or `full`) rebuilds the table; later runs only recompute
+    the dirty days.
+    """
+    state, _ = JobState.objects.get_or_create(name=JOB_NAME)
+    if full or state.position is None:
+        position = Rental.objects.order_by("-rental_id").values_list("rental_id", flat=True).first() or 0
+        rows = rebuild()
+        JobState.objects.filter(name=JOB_NAME).update(position=position)
+        return {"rebuilt": True, "rows": rows}
+
+    new_rentals = _mark_new_rentals(state)
+    dirty = sorted(RollupDirtyDay.objects.values_list("day", flat=True))
+    bike_categories = dict(Bike.objects.values_list("bike_id", "category_id"))
+    rows = 0
+    chunk = []
+    for day in dirty:
+        if chunk and (day - chunk[0]).days >= CHUNK_DAYS:
+            rows += _recompute(chunk, bike_categories)
+            chunk = []
+        chunk.append(day)
+    if chunk:
+        rows += _recompute(chunk, bike_categories)
+    return {"new_rentals": new_rentals, "days": len(dirty), "rows": rows}
+
+
+# --- Reports ---
+
+REPORT_GROUPS = ("category", "bike")
+
+
+def _report_sources(first_day, last_day):
+    """(daily_filter, monthly_filter): whole months from monthly_rollups, the rest from daily_rollups."""
+    first_month = first_day if first_day.day == 1 else _next_month(first_day)
+    end_month = _month(last_day + timedelta(days=1))  # First month not wholly in range
+    if first_month >= end_month:
+        return Q(day__gte=first_day, day__lte=last_day), None
+    return (
+        Q(day__gte=first_day, day__lt=first_month) | Q(day__gte=end_month, day__lte=last_day),
+        Q(month__gte=first_month, month__lt=end_month),
+    )
+
+
+def report(first_day, last_day, group="category"):
+    """Bookings, revenue, rented hours and utilization per category or bike.
+
+    Utilization is rented hours over the hours available in the range: per
+    bike, or per category times its current number of bikes.
+    """
+    daily, monthly = _report_sources(first_day, last_day)
+    parts = [DailyRollup.objects.filter(daily)]
+    if monthly is not None:
+        parts.append(MonthlyRollup.objects.filter(monthly))
+    totals = {}
+    for queryset in parts:
+        for row in queryset.values(group).annotate(**SUMS).order_by():
+            total = totals.setdefault(row[group], {group: row[group], "bookings": 0, "revenue": 0, "rented_hours": 0})
+            for field in SUMS:
+                total[field] += row[field] or 0
+    rows = [totals[key] for key in sorted(totals)]
+
+    hours_in_range = ((last_day - first_day).days + 1) * 24
+    if group == "category":
+        names = dict(BikeCategory.objects.values_list("category_id", "name"))
+        fleet = dict(Bike.objects.values("category").annotate(n=Count("bike_id")).values_list("category", "n"))
+    else:
+        names = dict(Bike.objects.filter(pk__in=list(totals)).values_list("bike_id", "license_plate"))
+        fleet = {bike_id: 1 for bike_id in names}
+    for row in rows:
+        row["name"] = names.get(row[group], row[group])
+        capacity = hours_in_range * fleet.get(row[group], 0)
+        row["utilization"] = round(float(row["rented_hours"]) * 100 / capacity, 1) if capacity else 0
+    return rows
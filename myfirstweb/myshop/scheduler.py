@@ -0,0 +1,110 @@
+"""
+A minimal job scheduler for periodic maintenance (overdue sweep, ...).
+
+Jobs are listed in the SCHEDULED_JOBS setting as
+{name: (dotted path to a callable, interval in seconds)}; the callable takes
+`now` and returns a dict summarising what it did. `python manage.py
+run_scheduler` runs the jobs that are due, once (for cron) or in a loop.
+
+Each run takes a lease on the job's job_states row with a conditional
+UPDATE, so several scheduler processes (or a cron run overlapping a loop) can
+be started without a job ever running twice at once. The row also records
+when the job last ran, how long it took and what it returned.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import JobState
+
+logger = logging.getLogger(__name__)
+
+# A run that has not finished after this long is assumed dead and its lease lapses
+LEASE = timedelta(minutes=15)
+
+
+def scheduled_jobs():
+    return getattr(settings, "SCHEDULED_JOBS", {})
+
+
+def _state(name):
+    try:
+        return JobState.objects.get_or_create(name=name)[0]
+    except IntegrityError:
+        return JobState.objects.get(name=name)
+
+
+def is_due(name, now=None):
+    _, interval = scheduled_jobs()[name]
+    state = _state(name)
+    now = now or timezone.now()
+    return state.last_run_at is None or state.last_run_at + timedelta(seconds=interval) <= now
+
+
+def _acquire(name, now):
+    _state(name)
+    return JobState.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now), name=name
+    ).update(locked_until=now + LEASE) == 1
+
+
+def _summary(result):
+    if isinstance(result, dict):
+        result = " ".join(f"{key}={value}" for key, value in result.items())
+    return str(result or "")[:255]
+
+
+def run_job(name, now=None):
+    """Run one job under its lease; returns its result, or None if it is already running."""
+    path, _ = scheduled_jobs()[name]
+    now = now or timezone.now()
+    if not _acquire(name, now):
+        logger.info("Job %s is already running, skipped", name)
+        return None
+
+    started = time.perf_counter()
+    result = None
+    try:
+        result = import_string(path)(now=now)
+        return result
+    except Exception as e:
+        logger.exception("Job %s failed", name)
+        result = f"error: {e}"
+        raise
+    finally:
+        JobState.objects.filter(name=name).update(
+            locked_until=None,
+            last_run_at=now,
+            last_duration_ms=int((time.perf_counter() - started) * 1000),
+            last_result=_summary(result),
+        )
+
+
+def run_pending(names=None, force=False):
+    """Run every due job (or all of `names` when `force`); returns {name: result}."""
+    results = {}
+    for name in names or scheduled_jobs():
+        if force or is_due(name):
+            try:
+                results[name] = run_job(name)
+            except Exception as e:
+                results[name] = f"error: {e}"
+    return results
+
+
+def run_forever(tick=30, names=None, log=None):
+    """Check for due jobs every `tick` seconds until interrupted."""
+    log = log or (lambda message: None)
+    while True:
+        close_old_connections()
+        for name, result in run_pending(names).items():
+            log(f"{name}: {_summary(result) if result is not None else 'skipped (running elsewhere)'}")
+        close_old_connections()
+        time.sleep(tick)
@@ -0,0 +1,130 @@
+"""
+Compact signed-cookie sessions.
+
+Same storage model as django.contrib.sessions.backends.signed_cookies (the
+whole session lives in a signed, zlib-compressed cookie), with two changes:
+
+- `CompactSerializer` writes the session as a versioned JSON array and packs
+  the booking funnel's keys: "rental_data" becomes "r" and its five fields a
+  positional list, and so on. That roughly halves the cookie.
+- `SessionStore` only re-signs the cookie when the session data actually
+  changed, or when the signature is older than SESSION_COOKIE_REFRESH seconds.
+  Setting a key to the value it already had does not count as a change.
+  With SESSION_SAVE_EVERY_REQUEST off, an unchanged session costs no signing
+  and no Set-Cookie header. The SESSION_COOKIE_AGE sliding expiry still holds,
+  to within SESSION_COOKIE_REFRESH seconds.
+
+A cookie in an unknown format (a different FORMAT_VERSION, or one written by
+the stock engine) fails to load and starts a fresh session, just like one
+with a bad signature.
+"""
+
+import json
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import signed_cookies
+from django.core import signing
+
+FORMAT_VERSION = 1
+
+# Session key -> (short key, field order for a dict value packed as a list)
+SCHEMA = {
+    "rental_data": ("r", ("email", "pickup_date", "pickup_time", "return_date", "return_time")),
+    "customer_data": ("c", ("first_name", "last_name", "phone", "citizen_id", "line_id")),
+    "selected_category": ("k", None),
+    "selected_bike_id": ("b", None),
+    "checkout_key": ("i", None),
+    "admin_id": ("a", None),
+    "admin_username": ("u", None),
+    "admin_role": ("o", None),
+}
+_KEYS = {short: (key, fields) for key, (short, fields) in SCHEMA.items()}
+
+# Same salt as the stock engine: the cookies differ only in their payload
+SALT = "django.contrib.sessions.backends.signed_cookies"
+
+
+def _snapshot(value):
+    # Copy of JSON-type session data (cheaper than copy.deepcopy)
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_snapshot(item) for item in value]
+    return value
+
+
+class CompactSerializer:
+    """[version, {short key: value}, {other key: value}] as compact JSON."""
+
+    def dumps(self, obj):
+        packed, other = {}, {}
+        for key, value in obj.items():
+            if key not in SCHEMA:
+                other[key] = value
+                continue
+            short, fields = SCHEMA[key]
+            if fields is None:
+                packed[short] = value
+            elif isinstance(value, dict) and value.keys() == set(fields):
+                packed[short] = [value[field] for field in fields]
+            else:
+                # Not the usual shape: store it unpacked under its full name
+                other[key] = value
+        data = [FORMAT_VERSION, packed, other] if other else [FORMAT_VERSION, packed]
+        return json.dumps(data, separators=(",", ":")).encode("latin-1")
+
+    def loads(self, data):
+        data = json.loads(data.decode("latin-1"))
+        if not isinstance(data, list) or not data or data[0] != FORMAT_VERSION:
+            raise ValueError("Unknown session cookie format")
+        session = {}
+        for short, value in data[1].items():
+            key, fields = _KEYS[short]
+            session[key] = dict(zip(fields, value)) if fields is not None else value
+        if len(data) > 2:
+            session.update(data[2])
+        return session
+
+
+class SessionStore(signed_cookies.SessionStore):
+    def __init__(self, session_key=None):
+        self._modified = False
+        self._loaded = None  # Copy of the data the cookie carried, to detect real changes
+        self._refresh_due = False
+        super().__init__(session_key)
+
+    @property
+    def modified(self):
+        if self._refresh_due:
+            return True
+        if not self._modified:
+            return False
+        cache = getattr(self, "_session_cache", None)
+        return self._loaded is None or cache is None or cache != self._loaded
+
+    @modified.setter
+    def modified(self, value):
+        self._modified = value
+
+    def load(self):
+        try:
+            data = signing.loads(
+                self.session_key,
+                serializer=self.serializer,
+                max_age=self.get_session_cookie_age(),
+                salt=SALT,
+            )
+        except Exception:
+            self._loaded = None
+            self.create()
+            return {}
+        # The cookie is payload:timestamp:signature and has just been verified
+        signed_at = signing.b62_decode(self.session_key.rsplit(":", 2)[-2])
+        self._refresh_due = time.time() - signed_at > getattr(settings, "SESSION_COOKIE_REFRESH", 60)
+        self._loaded = _snapshot(data)
+        return data
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        self._loaded = None
@@ -0,0 +1,137 @@
+"""
+Session cookie benchmark: the stock signed-cookie engine against the compact one.
+
+Two measurements per engine:
+
+- codec: cookie size, and time to sign (build the cookie) and verify (load
+  it), for the session as it stands after each booking step;
+- funnel: simulated customers walking the booking funnel (no checkout)
+  through the test client, counting the Set-Cookie headers and session
+  cookie bytes sent in each direction.
+
+The funnel is also run with the server-side draft store (myshop.drafts),
+where the client only carries a constant-size token.
+"""
+
+import random
+import time
+
+from django.conf import settings
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from .benchmark import funnel_requests
+
+ENGINES = {
+    "stock": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.signed_cookies",
+        "SESSION_SERIALIZER": "django.contrib.sessions.serializers.JSONSerializer",
+        "SESSION_SAVE_EVERY_REQUEST": True,
+    },
+    "compact": {
+        "SESSION_ENGINE": "myshop.session_backend",
+        "SESSION_SERIALIZER": "myshop.session_backend.CompactSerializer",
+        "SESSION_SAVE_EVERY_REQUEST": False,
+    },
+}
+
+# The funnel benchmark also runs with the booking draft on the server
+FUNNEL_ENGINES = dict(ENGINES, draft=dict(ENGINES["compact"], BOOKING_DRAFT_STORE="locmem"))
+
+RENTAL_DATA = {
+    "email": "somchai.saetang@example.com",
+    "pickup_date": "2030-01-14",
+    "pickup_time": "10:00",
+    "return_date": "2030-01-21",
+    "return_time": "18:00",
+}
+CUSTOMER_DATA = {
+    "first_name": "Somchai",
+    "last_name": "Saetang",
+    "phone": "0812345678",
+    "citizen_id": "1103700012345",
+    "line_id": "somchai.s",
+}
+
+# The session after each step of the funnel
+STATES = {
+    "dates": {"rental_data": RENTAL_DATA},
+    "category": {"rental_data": RENTAL_DATA, "selected_category": "Standard"},
+    "bike": {"rental_data": RENTAL_DATA, "selected_bike_id": "42"},
+    "customer": {"rental_data": RENTAL_DATA, "selected_bike_id": "42", "customer_data": CUSTOMER_DATA},
+}
+
+
+def _timed(func, iterations):
+    for _ in range(min(iterations, 50)):  # Warm up
+        func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return result, (time.perf_counter() - started) * 1e6 / iterations
+
+
+def codec_benchmark(iterations=2000):
+    """{state: {engine: {bytes, sign_us, verify_us}}}"""
+    results = {}
+    for state, data in STATES.items():
+        results[state] = {}
+        for engine, engine_settings in ENGINES.items():
+            with override_settings(**engine_settings):
+                store_class = import_string(engine_settings["SESSION_ENGINE"] + ".SessionStore")
+                store = store_class()
+                store.update(data)
+                cookie, sign_us = _timed(store._get_session_key, iterations)
+                loaded, verify_us = _timed(lambda: store_class(cookie).load(), iterations)
+                assert loaded == data, f"{engine} did not round-trip the {state} session"
+            results[state][engine] = {
+                "bytes": len(cookie),
+                "sign_us": round(sign_us, 1),
+                "verify_us": round(verify_us, 1),
+            }
+    return results
+
+
+def _cookie_names():
+    return (settings.SESSION_COOKIE_NAME, settings.BOOKING_DRAFT_COOKIE_NAME)
+
+
+def _run_funnel(client, rng, totals):
+    requests = funnel_requests(rng, checkout=False)
+    body = None
+    try:
+        while True:
+            _, method, path, data, _ = requests.send(body)
+            for name in _cookie_names():
+                sent = client.cookies.get(name)
+                totals["bytes_sent"] += len(sent.value) if sent else 0
+            response = client.post(path, data) if method == "POST" else client.get(path)
+            for name in _cookie_names():
+                received = response.cookies.get(name)
+                if received is not None:
+                    totals["set_cookies"] += 1
+                    totals["bytes_received"] += len(received.value)
+            totals["requests"] += 1
+            body = response.content
+    except StopIteration:
+        pass
+
+
+def funnel_benchmark(sessions=20, seed=1):
+    """{engine: {requests, set_cookies, bytes_sent, bytes_received, ms}}"""
+    results = {}
+    for engine, engine_settings in FUNNEL_ENGINES.items():
+        with override_settings(**engine_settings):
+            # One unmeasured session first, so neither engine pays for cold caches
+            _run_funnel(Client(HTTP_HOST="localhost"), random.Random(seed), dict.fromkeys(
+                ["requests", "set_cookies", "bytes_sent", "bytes_received"], 0
+            ))
+            rng = random.Random(seed)
+            totals = {"requests": 0, "set_cookies": 0, "bytes_sent": 0, "bytes_received": 0}
+            started = time.perf_counter()
+            for _ in range(sessions):
+                _run_funnel(Client(HTTP_HOST="localhost"), rng, totals)
+            totals["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        results[engine] = totals
+    return results
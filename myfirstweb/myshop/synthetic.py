@@ -0,0 +1,271 @@
+"""
+Deterministic synthetic data for realistic-scale testing.
+
+Generates categories, bikes, customers, non-overlapping rentals with a
+seasonal demand curve, and PriceLog history. Rows are written with batched
+executemany INSERTs (one transaction per batch), which is what lets a
+multi-million rental dataset build in minutes, and which also lets us set
+created_at / change_date values that the ORM would overwrite (auto_now_add).
+
+Synthetic rows are tagged so they can be removed again: bike plates start
+with "<tag>-" and customer emails end with SYNTHETIC_EMAIL_DOMAIN.
+
+The history ends at DEFAULT_END unless another end is given, so a seed gives
+the same rows whatever day it is run on.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from .models import Bike, BikeCategory, Customer, PriceLog, Rental
+from .pricing import price_days
+
+SYNTHETIC_EMAIL_DOMAIN = "synthetic.invalid"
+DEFAULT_END = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+CATEGORY_NAMES = ["Economy", "Standard", "Premium", "Touring", "Scooter", "Adventure", "Sport", "Electric"]
+MODEL_NAMES = {
+    "Economy": ["Honda Wave 110i", "Yamaha Finn", "Suzuki Smash"],
+    "Standard": ["Honda Click 125i", "Yamaha Fino", "Honda Scoopy i"],
+    "Premium": ["Honda PCX 160", "Yamaha NMAX 155", "Vespa Sprint"],
+    "Touring": ["Honda ADV 160", "Yamaha XMAX 300", "Honda Forza 350"],
+}
+FIRST_NAMES = ["Somchai", "Suda", "Anan", "Kanya", "John", "Emma", "Lukas", "Mia", "Hiro", "Yuki", "Liam", "Chloe"]
+LAST_NAMES = ["Saetang", "Wongsa", "Srisuk", "Smith", "Müller", "Tanaka", "Dubois", "Kim", "Jensen", "Rossi"]
+
+# Relative demand per month (Jan..Dec): high season Nov-Feb, low season May-Sep
+SEASONALITY = [1.4, 1.4, 1.1, 1.0, 0.7, 0.6, 0.7, 0.7, 0.6, 0.9, 1.3, 1.5]
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _insert_sql(model, columns):
+    column_sql = ", ".join(connection.ops.quote_name(column) for column in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    return f"INSERT INTO {_table(model)} ({column_sql}) VALUES ({placeholders})"
+
+
+def _dt(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def _money(value):
+    return connection.ops.adapt_decimalfield_value(Decimal(value).quantize(Decimal("0.01")), 10, 2)
+
+
+def _executemany(sql, rows):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+def _next_opening_hour(value):
+    """Round up to a whole hour within shop hours (08:00-18:00), never earlier."""
+    rounded = value.replace(minute=0, second=0, microsecond=0)
+    if rounded < value:
+        rounded += timedelta(hours=1)
+    if rounded.hour < 8:
+        return rounded.replace(hour=8)
+    if rounded.hour > 18:
+        return (rounded + timedelta(days=1)).replace(hour=8)
+    return rounded
+
+
+class DatasetGenerator:
+    def __init__(self, seed=1, tag="SYN", start=None, end=None, batch_size=5000, log=None):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.tag = tag
+        self.end = end or DEFAULT_END
+        self.start = start or self.end - timedelta(days=3 * 365)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    # --- Cleanup ---
+
+    def clear(self):
+        """Delete rows created by previous runs with the same tag."""
+        bikes = Bike.objects.filter(license_plate__startswith=f"{self.tag}-")
+        customers = Customer.objects.filter(email__endswith=f"@{SYNTHETIC_EMAIL_DOMAIN}")
+        Rental.objects.filter(bike__in=bikes).delete()
+        Rental.objects.filter(customer__in=customers).delete()
+        bikes.delete()
+        customers.delete()
+        categories = BikeCategory.objects.filter(name__startswith=f"{self.tag} ")
+        PriceLog.objects.filter(category__in=categories).delete()
+        categories.delete()
+
+    # --- Catalog ---
+
+    def categories(self, count):
+        created = []
+        for i in range(count):
+            base = CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i + 1}"
+            daily = Decimal(150 + i * 100 + self.rng.randint(0, 4) * 10)
+            created.append(BikeCategory.objects.create(
+                name=f"{self.tag} {base}",
+                price_daily=daily,
+                price_weekly=(daily * 6).quantize(Decimal("1")),
+                price_monthly=(daily * 20).quantize(Decimal("1")),
+                deposit_amount=Decimal(1000 + i * 500),
+            ))
+        return created
+
+    def price_logs(self, categories, per_category):
+        sql = _insert_sql(PriceLog, ["category_id", "old_price", "new_price", "change_date"])
+        span = (self.end - self.start).total_seconds()
+        rows = []
+        for category in categories:
+            # Walk backwards from today's price so the history ends where we are
+            changes = sorted(self.rng.random() * span for _ in range(per_category))
+            price = category.price_daily
+            history = []
+            for offset in reversed(changes):
+                old = max(Decimal(50), price - Decimal(self.rng.choice([-20, -10, 10, 20, 30])))
+                history.append((old, price, self.start + timedelta(seconds=offset)))
+                price = old
+            for old, new, when in reversed(history):
+                rows.append((category.pk, _money(old), _money(new), _dt(when)))
+        for i in range(0, len(rows), self.batch_size):
+            _executemany(sql, rows[i:i + self.batch_size])
+        return len(rows)
+
+    def bikes(self, categories, count):
+        sql = _insert_sql(Bike, ["license_plate", "model_name", "status", "category_id", "description", "engine_size", "image_url"])
+        rows = []
+        for i in range(count):
+            category = categories[i % len(categories)]
+            base = category.name[len(self.tag) + 1:]
+            model = self.rng.choice(MODEL_NAMES.get(base, MODEL_NAMES["Standard"]))
+            engine = "".join(ch for ch in model.split()[-1] if ch.isdigit()) or "125"
+            rows.append((f"{self.tag}-{i + 1:06d}", model, "Available", category.pk, f"Synthetic {model}", engine, None))
+        for i in range(0, len(rows), self.batch_size):
+            _executemany(sql, rows[i:i + self.batch_size])
+        return list(
+            Bike.objects.filter(license_plate__startswith=f"{self.tag}-")
+            .order_by("license_plate")
+            .select_related("category")
+        )
+
+    def customers(self, count):
+        sql = _insert_sql(Customer, ["citizen_id", "first_name", "last_name", "phone", "email", "line_id", "created_at"])
+        span = (self.end - self.start).total_seconds()
+        batch = []
+        for i in range(count):
+            first = self.rng.choice(FIRST_NAMES)
+            last = self.rng.choice(LAST_NAMES)
+            batch.append((
+                f"9{self.seed % 100:02d}{i:010d}",
+                first,
+                last,
+                f"08{self.rng.randint(0, 10**8 - 1):08d}",
+                f"{first.lower()}.{i}@{SYNTHETIC_EMAIL_DOMAIN}",
+                f"{first.lower()}{i}",
+                _dt(self.start + timedelta(seconds=self.rng.random() * span)),
+            ))
+            if len(batch) >= self.batch_size:
+                _executemany(sql, batch)
+                batch = []
+        if batch:
+            _executemany(sql, batch)
+        return list(
+            Customer.objects.filter(email__endswith=f"@{SYNTHETIC_EMAIL_DOMAIN}")
+            .order_by("citizen_id")
+            .values_list("customer_id", flat=True)
+        )
+
+    # --- Rentals ---
+
+    def _bike_rentals(self, bike, count, customer_ids, now):
+        """Non-overlapping rentals for one bike, laid out along the timeline."""
+        category = bike.category
+        span_days = (self.end - self.start).total_seconds() / 86400 + 60
+        slot_days = span_days / max(count, 1)
+        cursor = self.start + timedelta(hours=self.rng.uniform(0, 48))
+        for _ in range(count):
+            demand = SEASONALITY[cursor.month - 1]
+            gap_days = self.rng.expovariate(1 / max(slot_days * 0.45 / demand, 0.05))
+            start = _next_opening_hour(cursor + timedelta(days=gap_days))
+            days = max(1, min(int(self.rng.expovariate(1 / max(slot_days * 0.5, 1))) + 1, 45))
+            end = start + timedelta(days=days)
+            cursor = end + timedelta(hours=self.rng.randint(2, 24))
+
+            total = price_days(category, days).total
+            created = min(start - timedelta(days=self.rng.uniform(0, 30)), now)
+
+            if end <= now:
+                if self.rng.random() < 0.03:
+                    status, returned = "Cancelled", None
+                else:
+                    status = "Done"
+                    returned = end + timedelta(minutes=self.rng.randint(-180, 240))
+            else:
+                status, returned = "Active", None
+            yield (
+                self.rng.choice(customer_ids),
+                bike.pk,
+                _dt(start),
+                _dt(end),
+                _dt(returned) if returned else None,
+                _money(total),
+                status,
+                _dt(created),
+            ), (status == "Active" and start <= now < end)
+
+    def rentals(self, bikes, customer_ids, count):
+        sql = _insert_sql(Rental, [
+            "customer_id", "bike_id", "start_date", "end_date", "actual_return_date",
+            "total_price", "payment_status", "created_at",
+        ])
+        now = self.end
+        per_bike, extra = divmod(count, len(bikes))
+        rented_bike_ids = []
+        batch = []
+        written = 0
+        for index, bike in enumerate(bikes):
+            bike_count = per_bike + (1 if index < extra else 0)
+            for row, is_out in self._bike_rentals(bike, bike_count, customer_ids, now):
+                batch.append(row)
+                if is_out:
+                    rented_bike_ids.append(bike.pk)
+                if len(batch) >= self.batch_size:
+                    _executemany(sql, batch)
+                    written += len(batch)
+                    batch = []
+                    if written % (self.batch_size * 20) == 0:
+                        self.log(f"  {written} rentals written")
+        if batch:
+            _executemany(sql, batch)
+            written += len(batch)
+
+        # Bikes out on a rental right now are Rented; a few others are in repair
+        for i in range(0, len(rented_bike_ids), 1000):
+            Bike.objects.filter(pk__in=rented_bike_ids[i:i + 1000]).update(status="Rented")
+        rented = set(rented_bike_ids)
+        fix_ids = [bike.pk for bike in bikes if bike.pk not in rented and self.rng.random() < 0.03]
+        for i in range(0, len(fix_ids), 1000):
+            Bike.objects.filter(pk__in=fix_ids[i:i + 1000]).update(status="Fix")
+        return written
+
+    def generate(self, categories=4, bikes=200, customers=5000, rentals=100000, price_logs=6):
+        self.log(f"Creating {categories} categories with {price_logs} price changes each")
+        created_categories = self.categories(categories)
+        self.price_logs(created_categories, price_logs)
+        self.log(f"Creating {bikes} bikes")
+        created_bikes = self.bikes(created_categories, bikes)
+        self.log(f"Creating {customers} customers")
+        customer_ids = self.customers(customers)
+        self.log(f"Creating {rentals} rentals")
+        written = self.rentals(created_bikes, customer_ids, rentals)
+        return {
+            "categories": len(created_categories),
+            "bikes": len(created_bikes),
+            "customers": len(customer_ids),
+            "rentals": written,
+            "price_logs": categories * price_logs,
+        }
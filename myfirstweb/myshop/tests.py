@@ -1,3 +1,1226 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from unittest import SkipTest, mock
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+
+from .admin_queries import filter_bookings, search_customers
+from .admission import Gate
+from .availability import AvailabilityIndex, availability_index
+from .catalog import bump_catalog_version, get_categories
+from .db_pool import ConnectionPool, PoolTimeout
+from .drafts import FileDraftStore, LocMemDraftStore
+from .exports import iter_rows, stream_export
+from .fleet_import import import_bikes, read_csv
+from .instrumentation import UNRESOLVED, RequestStats, StatsRegistry, registry
+from .models import Admin, Bike, BikeCategory, Customer, DailyRollup, JobState, MonthlyRollup, OverdueRental, PriceLog, Rental
+from .overdue import sweep
+from .pagination import keyset_page
+from .procedures import BookingConflict, OrmProcedures, ProcedureError, overlapping_rentals
+from . import dashboard, overdue, rollups
+from .scheduler import run_job
+from .session_backend import CompactSerializer, SessionStore
+from .synthetic import DatasetGenerator
+
+
+class OrmProceduresTests(TestCase):
+    """The ORM backend follows the stored procedures' trigger rules."""
+
+    def setUp(self):
+        self.procedures = OrmProcedures()
+        self.category = BikeCategory.objects.create(
+            name="Standard",
+            price_daily=Decimal("200"),
+            price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"),
+            deposit_amount=Decimal("1000"),
+        )
+        self.bike = Bike.objects.create(
+            license_plate="AB-1234", model_name="Honda Click", category=self.category
+        )
+        self.customer_data = {
+            "citizen_id": "1234567890123",
+            "first_name": "Suda",
+            "last_name": "Wongsa",
+            "phone": "0812345678",
+            "line_id": "suda",
+        }
+
+    def rental_data(self, pickup, days):
+        return {
+            "email": "suda@example.com",
+            "pickup_date": pickup,
+            "pickup_time": "10:00",
+            "return_date": (datetime.strptime(pickup, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d"),
+            "return_time": "10:00",
+        }
+
+    def test_booking_prices_rental_and_marks_bike_rented(self):
+        booking = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 9), self.bike.pk)
+        # 10 days at the daily rate, plus the deposit, as CreateRental charges
+        self.assertEqual(booking.total_price, Decimal("3000"))
+        self.assertEqual(booking.bike_status, "Rented")
+        self.bike.refresh_from_db()
+        self.assertEqual(self.bike.status, "Rented")
+
+    @override_settings(PRICE_BLOCKS=True)
+    def test_booking_charges_price_blocks_when_enabled(self):
+        booking = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 9), self.bike.pk)
+        # 10 days: one week plus three days, plus the deposit
+        self.assertEqual(booking.total_price, Decimal("2800"))
+
+    @override_settings(PROCEDURE_BACKEND="orm")
+    def test_failed_completion_is_logged(self):
+        Admin.objects.create(username="owner", password="secret", role="Owner")
+        self.client.post("/shop-admin/login/", {"username": "owner", "password": "secret"})
+        with self.assertLogs("myshop.admin_views", "ERROR") as logs:
+            response = self.client.post("/shop-admin/bookings/999/complete/")
+        self.assertRedirects(response, "/shop-admin/bookings/", fetch_redirect_response=False)
+        self.assertIn("Error completing booking 999", logs.output[0])
+        self.assertIn("ProcedureError", logs.output[0])
+
+    def test_booking_reuses_customer_by_citizen_id(self):
+        first = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 2), self.bike.pk)
+        second = self.procedures.commit_booking(
+            dict(self.customer_data, phone="0899999999"), self.rental_data("2030-02-01", 2), self.bike.pk
+        )
+        self.assertEqual(first.customer_id, second.customer_id)
+
+    def test_overlapping_booking_is_rejected_before_any_write(self):
+        self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 5), self.bike.pk)
+        other_customer = dict(self.customer_data, citizen_id="9999999999999")
+        with self.assertRaises(BookingConflict):
+            self.procedures.commit_booking(other_customer, self.rental_data("2030-01-03", 5), self.bike.pk)
+        self.assertEqual(Rental.objects.count(), 1)
+        self.assertFalse(Customer.objects.filter(citizen_id="9999999999999").exists())
+
+    def test_return_closes_rental_and_frees_bike(self):
+        booking = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 2), self.bike.pk)
+        self.procedures.return_bike(booking.rental_id)
+        rental = Rental.objects.select_related("bike").get(pk=booking.rental_id)
+        self.assertEqual(rental.payment_status, "Done")
+        self.assertIsNotNone(rental.actual_return_date)
+        self.assertEqual(rental.bike.status, "Available")
+
+    def test_batch_return_reports_each_rental(self):
+        first = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 2), self.bike.pk)
+        other = Bike.objects.create(license_plate="AB-9999", model_name="Honda Click", category=self.category)
+        second = self.procedures.commit_booking(self.customer_data, self.rental_data("2030-01-01", 2), other.pk)
+        self.procedures.return_bike(second.rental_id)
+
+        results = dict(self.procedures.return_bikes([first.rental_id, second.rental_id, 999999]))
+        self.assertIsNone(results[first.rental_id])
+        self.assertIn("not active", results[second.rental_id])
+        self.assertIn("does not exist", results[999999])
+        self.assertEqual(Rental.objects.get(pk=first.rental_id).payment_status, "Done")
+        self.assertEqual(Bike.objects.get(pk=self.bike.pk).status, "Available")
+
+    def test_bike_with_rental_history_cannot_be_deleted(self):
+        Rental.objects.create(
+            customer_id=self.procedures.save_customer("1111111111111", "A", "B", "0800000000", "a@b.c", "a"),
+            bike=self.bike,
+            start_date=datetime(2030, 1, 1, tzinfo=dt_timezone.utc),
+            end_date=datetime(2030, 1, 2, tzinfo=dt_timezone.utc),
+            total_price=Decimal("1200"),
+            payment_status="Done",
+        )
+        with self.assertRaises(ProcedureError):
+            self.procedures.delete_bike(self.bike.pk)
+
+    def test_add_bike_from_existing_copies_model(self):
+        bike = self.procedures.add_bike_from_existing("Honda Click", "AB-5678")
+        self.assertEqual(bike.category_id, self.category.pk)
+        with self.assertRaises(ProcedureError):
+            self.procedures.add_bike_from_existing("Honda Click", "AB-5678")
+
+
+class AvailabilityIndexTests(TestCase):
+    def setUp(self):
+        self.category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bikes = [
+            Bike.objects.create(license_plate=f"AB-{n}", model_name="Honda Click", category=self.category)
+            for n in range(4)
+        ]
+        self.customer = Customer.objects.create(
+            citizen_id="1234567890123", first_name="Suda", last_name="Wongsa",
+            phone="0812345678", email="suda@example.com", line_id="suda",
+        )
+        self.index = AvailabilityIndex(ttl=3600)
+
+    def at(self, day, hour=10):
+        return datetime(2030, 1, day, hour, tzinfo=dt_timezone.utc)
+
+    def rental(self, bike, start, end, status="Active"):
+        return Rental.objects.create(
+            customer=self.customer, bike=bike, start_date=start, end_date=end,
+            total_price=Decimal("1000"), payment_status=status,
+        )
+
+    def test_periods_are_half_open(self):
+        bike = self.bikes[0]
+        self.rental(bike, self.at(5), self.at(8))
+        # Ending exactly where the rental starts, or starting exactly where it ends, is free
+        self.assertTrue(self.index.is_free(bike.pk, self.at(3), self.at(5)))
+        self.assertTrue(self.index.is_free(bike.pk, self.at(8), self.at(10)))
+        self.assertFalse(self.index.is_free(bike.pk, self.at(3), self.at(5, 11)))
+        self.assertFalse(self.index.is_free(bike.pk, self.at(7), self.at(10)))
+        self.assertFalse(self.index.is_free(bike.pk, self.at(6), self.at(7)))
+        self.assertFalse(self.index.is_free(bike.pk, self.at(1), self.at(20)))
+
+    def test_refresh_after_a_return(self):
+        bike = self.bikes[0]
+        rental = self.rental(bike, self.at(5), self.at(8))
+        self.assertFalse(self.index.is_free(bike.pk, self.at(6), self.at(7)))
+
+        Rental.objects.filter(pk=rental.pk).update(payment_status="Done")
+        self.assertFalse(self.index.is_free(bike.pk, self.at(6), self.at(7)))  # Not refreshed yet
+        self.index.refresh_rental(rental.pk)
+        self.assertTrue(self.index.is_free(bike.pk, self.at(6), self.at(7)))
+
+        self.rental(bike, self.at(6), self.at(9))
+        self.index.refresh_bike(bike.pk)
+        self.assertFalse(self.index.is_free(bike.pk, self.at(6), self.at(7)))
+
+    def test_free_bikes_matches_the_overlap_query(self):
+        first, second, third, _ = self.bikes
+        self.rental(first, self.at(5), self.at(8))
+        self.rental(second, self.at(1), self.at(5))
+        self.rental(second, self.at(9), self.at(12))
+        self.rental(third, self.at(4), self.at(10), status="Done")
+        for start, end in [
+            (self.at(5), self.at(9)), (self.at(8), self.at(9)), (self.at(1), self.at(2)),
+            (self.at(4), self.at(6)), (self.at(12), self.at(14)), (self.at(1), self.at(20)),
+        ]:
+            expected = [bike for bike in self.bikes if not overlapping_rentals(bike.pk, start, end).exists()]
+            self.assertEqual(self.index.free_bikes(self.bikes, start, end), expected, (start, end))
+
+
+class RequestStatsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+
+    def login(self):
+        # One lookup in the admins table
+        return self.client.post("/shop-admin/login/", {"username": "nobody", "password": "wrong"})
+
+    def test_server_timing_counts_the_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        reported = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response["Server-Timing"])
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(int(reported.group(1)), len(queries))
+        view = registry.snapshot()["views"]["admin_login"]
+        self.assertEqual((view["requests"], view["avg_queries"]), (1, len(queries)))
+
+    def test_unresolved_urls_share_one_entry(self):
+        for n in range(5):
+            self.client.get(f"/no-such-page-{n}/")
+        views = registry.snapshot()["views"]
+        self.assertEqual(list(views), [UNRESOLVED])
+        self.assertEqual(views[UNRESOLVED]["requests"], 5)
+
+    @override_settings(REQUEST_STATS_WINDOW=10)
+    def test_percentiles_cover_the_rolling_window(self):
+        stats = StatsRegistry()
+        for ms in range(1, 101):
+            stats.add("view", float(ms), RequestStats(5))
+        view = stats.snapshot()["views"]["view"]
+        # Only the last 10 requests (91..100 ms) are left
+        self.assertEqual(view["requests"], 10)
+        self.assertEqual((view["p50_ms"], view["p95_ms"], view["p99_ms"], view["max_ms"]), (95, 100, 100, 100))
+
+    def test_slow_request_is_logged_once(self):
+        with self.assertNoLogs("myshop.slow_requests"):
+            self.login()
+        with override_settings(REQUEST_STATS_SLOW_MS=0):
+            with self.assertLogs("myshop.slow_requests", "WARNING") as logs:
+                self.login()
+        self.assertEqual(len(logs.records), 1)
+        slow = registry.snapshot()["slow_requests"]
+        self.assertEqual([(entry["view"], entry["method"]) for entry in slow], [("admin_login", "POST")])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        t = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        # (created_at, last_name): ties on created_at and two NULL rows
+        rows = [(t, "A"), (t, "B"), (t, "A"), (t + timedelta(days=1), "B"), (None, "A"), (None, "B"), (t - timedelta(days=1), "A")]
+        self.customers = []
+        for n, (created_at, last_name) in enumerate(rows):
+            customer = Customer.objects.create(
+                citizen_id=f"{n:013d}", first_name="C", last_name=last_name,
+                phone="0800000000", email="c@example.com", line_id="c",
+            )
+            Customer.objects.filter(pk=customer.pk).update(created_at=created_at)
+            customer.created_at = created_at
+            self.customers.append(customer)
+
+    def expected(self, customers):
+        # created_at DESC with NULLs last, ties broken by pk DESC
+        dated = sorted((c for c in customers if c.created_at), key=lambda c: (c.created_at, c.pk), reverse=True)
+        undated = sorted((c for c in customers if not c.created_at), key=lambda c: c.pk, reverse=True)
+        return [c.pk for c in dated + undated]
+
+    def walk(self, queryset, page_size):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(queryset, "created_at", cursor, page_size)
+            pages.append([row.pk for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for page_size in (1, 2, 3, 7):
+            pages = self.walk(Customer.objects.all(), page_size)
+            self.assertEqual(sum(pages, []), self.expected(self.customers), page_size)
+            self.assertTrue(all(len(page) == page_size for page in pages[:-1]))
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = keyset_page(Customer.objects.all(), "created_at", None, 7)
+        self.assertEqual((len(rows), cursor), (7, None))
+        rows, cursor = keyset_page(Customer.objects.all(), "created_at", None, 6)
+        self.assertIsNotNone(cursor)
+        rows, cursor = keyset_page(Customer.objects.all(), "created_at", cursor, 6)
+        self.assertEqual((len(rows), cursor), (1, None))
+
+    def test_filters_apply_with_a_cursor(self):
+        queryset = Customer.objects.filter(last_name="A")
+        pages = self.walk(queryset, 2)
+        self.assertEqual(sum(pages, []), self.expected([c for c in self.customers if c.last_name == "A"]))
+
+    def test_malformed_cursor_starts_over(self):
+        rows, _ = keyset_page(Customer.objects.all(), "created_at", "not-a-cursor", 2)
+        self.assertEqual([row.pk for row in rows], self.expected(self.customers)[:2])
+
+
+class ExportTests(TestCase):
+    description = 'Fast, "light"\nand cheap'
+
+    def setUp(self):
+        category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bikes = [
+            Bike.objects.create(
+                license_plate=f"AB-{i:04d}", model_name="Honda Click", category=category,
+                status="Fix" if i % 2 else "Available", description=self.description,
+            )
+            for i in range(4)
+        ]
+
+    def test_chunks_of_exactly_the_row_count(self):
+        # One full chunk, then an empty one to find the end
+        with self.assertNumQueries(2):
+            rows = list(iter_rows(Bike.objects.all(), ["bike_id"], chunk_size=4))
+        self.assertEqual(rows, [(bike.pk,) for bike in self.bikes])
+        with self.assertNumQueries(3):
+            rows = list(iter_rows(Bike.objects.all(), ["bike_id"], chunk_size=2))
+        self.assertEqual(rows, [(bike.pk,) for bike in self.bikes])
+
+    def test_list_filters_are_applied(self):
+        lines = "".join(stream_export("bikes", "csv", {"status": "Fix"}, chunk_size=1))
+        rows = list(csv.DictReader(StringIO(lines)))
+        self.assertEqual([row["bike_id"] for row in rows], [str(bike.pk) for bike in self.bikes if bike.status == "Fix"])
+
+    def test_csv_escapes_commas_quotes_and_newlines(self):
+        rows = list(csv.reader(StringIO("".join(stream_export("bikes", "csv", {})))))
+        self.assertEqual(len(rows), 1 + len(self.bikes))
+        description = rows[0].index("description")
+        self.assertEqual({row[description] for row in rows[1:]}, {self.description})
+
+    def test_jsonl_is_one_line_per_row(self):
+        lines = "".join(stream_export("bikes", "jsonl", {})).splitlines()
+        self.assertEqual(len(lines), len(self.bikes))
+        self.assertEqual({json.loads(line)["description"] for line in lines}, {self.description})
+
+
+class FleetImportTests(TestCase):
+    header = "model_name,license_plate,category,engine_size\n"
+
+    def setUp(self):
+        self.category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        Bike.objects.create(license_plate="AB-0001", model_name="Honda Click", category=self.category)
+
+    def rows(self, *lines):
+        return read_csv(StringIO(self.header + "\n".join(lines) + "\n"))
+
+    def test_rejected_rows(self):
+        result = import_bikes(self.rows(
+            "Honda Click,AB-0001,Standard,125",
+            "Honda Click,AB-0002,standard,125",
+            "Honda Click,ab-0002,Standard,125",
+            "Honda Click,AB-0003,Luxury,125",
+            "Honda Click,AB-0004,Standard,125cc twin cylinder",
+        ))
+        self.assertEqual((result.total, result.created), (5, 1))
+        self.assertEqual([(error.row, error.error) for error in result.errors], [
+            (2, "license_plate already exists"),
+            (4, "duplicate license_plate (also on row 3)"),
+            (5, "unknown category 'Luxury'"),
+            (6, "engine_size is longer than 10 characters"),
+        ])
+        self.assertTrue(Bike.objects.filter(license_plate="AB-0002", category=self.category).exists())
+
+    def test_dry_run_writes_nothing(self):
+        result = import_bikes(self.rows("Honda Click,AB-0002,Standard,125"), dry_run=True)
+        self.assertEqual((result.total, result.created, result.errors), (1, 0, []))
+        self.assertEqual(Bike.objects.count(), 1)
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        # A plate added after validation makes the whole bulk_create fail
+        with mock.patch("myshop.fleet_import._existing_plates", return_value=set()):
+            result = import_bikes(self.rows(
+                "Honda Click,AB-0002,Standard,125",
+                "Honda Click,AB-0001,Standard,125",
+                "Honda Click,AB-0003,Standard,125",
+            ), batch_size=3)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([(error.row, error.license_plate) for error in result.errors], [(3, "AB-0001")])
+        self.assertEqual(
+            sorted(Bike.objects.values_list("license_plate", flat=True)), ["AB-0001", "AB-0002", "AB-0003"]
+        )
+
+    def test_command_writes_error_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "fleet.csv")
+            error_path = os.path.join(directory, "errors.csv")
+            with open(csv_path, "w") as f:
+                f.write(self.header + 'Honda Click,AB-0002,Standard,125\nHonda Click,"AB-0001",Standard,125\n'
+                        'Honda Click,AB-0003,"Luxury, new",125\n')
+            call_command("import_fleet", csv_path, "--error-file", error_path, stdout=StringIO(), stderr=StringIO())
+            with open(error_path, newline="") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows, [
+            ["row", "license_plate", "error"],
+            ["3", "AB-0001", "license_plate already exists"],
+            ["4", "AB-0003", "unknown category 'Luxury, new'"],
+        ])
+        self.assertTrue(Bike.objects.filter(license_plate="AB-0002").exists())
+
+
+class SearchCustomersTests(TestCase):
+    def setUp(self):
+        for citizen_id, first_name, last_name, phone, line_id in [
+            ("1234567890123", "Suda", "Wongsa", "0812345678", "suda"),
+            ("9876543210987", "Somchai", "Saetang", "0899999999", "chai"),
+            ("5555555555555", "John", "Smith", "0812000000", "jsmith"),
+        ]:
+            Customer.objects.create(
+                citizen_id=citizen_id, first_name=first_name, last_name=last_name,
+                phone=phone, email=f"{line_id}@example.com", line_id=line_id,
+            )
+
+    def search(self, q):
+        return sorted(search_customers({"q": q}).values_list("first_name", flat=True))
+
+    def test_empty_query_is_not_filtered(self):
+        for params in ({}, {"q": ""}, {"q": "   "}):
+            self.assertEqual(str(search_customers(params).query), str(Customer.objects.all().query))
+
+    def test_digits_search_citizen_id_and_phone(self):
+        self.assertEqual(self.search("0812"), ["John", "Suda"])
+        self.assertEqual(self.search("98765"), ["Somchai"])
+        self.assertEqual(self.search("2345"), [])  # Prefixes only
+
+    def test_one_word_searches_names_and_line_id(self):
+        self.assertEqual(self.search("wong"), ["Suda"])
+        self.assertEqual(self.search("SOM"), ["Somchai"])
+        self.assertEqual(self.search("@jsm"), ["John"])
+        self.assertEqual(self.search("s"), ["John", "Somchai", "Suda"])  # Smith, Somchai, Suda
+
+    def test_two_words_search_first_and_last_name(self):
+        self.assertEqual(self.search("suda won"), ["Suda"])
+        self.assertEqual(self.search("john  sm"), ["John"])
+        self.assertEqual(self.search("suda smith"), [])
+
+
+class SyntheticDatasetTests(TestCase):
+    counts = {"categories": 2, "bikes": 6, "customers": 20, "rentals": 60, "price_logs": 3}
+
+    def snapshot(self):
+        # Primary keys differ between runs; everything else must not
+        return {
+            "categories": list(BikeCategory.objects.order_by("name").values_list(
+                "name", "price_daily", "price_weekly", "price_monthly", "deposit_amount",
+            )),
+            "price_logs": list(PriceLog.objects.order_by("category__name", "change_date").values_list(
+                "category__name", "old_price", "new_price", "change_date",
+            )),
+            "bikes": list(Bike.objects.order_by("license_plate").values_list(
+                "license_plate", "model_name", "status", "category__name", "engine_size",
+            )),
+            "customers": list(Customer.objects.order_by("citizen_id").values_list(
+                "citizen_id", "first_name", "last_name", "phone", "email", "created_at",
+            )),
+            "rentals": list(Rental.objects.order_by("bike__license_plate", "start_date").values_list(
+                "bike__license_plate", "customer__citizen_id", "start_date", "end_date",
+                "actual_return_date", "total_price", "payment_status", "created_at",
+            )),
+        }
+
+    def test_same_seed_gives_the_same_rows(self):
+        DatasetGenerator(seed=7).generate(**self.counts)
+        first = self.snapshot()
+        DatasetGenerator(seed=7).clear()
+        self.assertFalse(Rental.objects.exists())
+        DatasetGenerator(seed=7).generate(**self.counts)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first["rentals"]), 60)
+
+    def test_rentals_of_a_bike_do_not_overlap(self):
+        DatasetGenerator(seed=7).generate(**self.counts)
+        previous = {}
+        for bike_id, start, end in Rental.objects.order_by("bike_id", "start_date").values_list(
+            "bike_id", "start_date", "end_date"
+        ):
+            self.assertLess(start, end)
+            if bike_id in previous:
+                self.assertGreaterEqual(start, previous[bike_id])
+            previous[bike_id] = end
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bike = Bike.objects.create(license_plate="AB-1234", model_name="Honda Click", category=category)
+        self.customer = Customer.objects.create(
+            citizen_id="1234567890123", first_name="Suda", last_name="Wongsa",
+            phone="0812345678", email="suda@example.com", line_id="suda",
+        )
+        self.now = datetime(2030, 1, 10, 12, tzinfo=dt_timezone.utc)
+
+    def rental(self, end, status="Active"):
+        return Rental.objects.create(
+            customer=self.customer, bike=self.bike, start_date=end - timedelta(days=2),
+            end_date=end, total_price=Decimal("1400"), payment_status=status,
+        )
+
+    def test_sweep_flags_prices_and_clears(self):
+        late = self.rental(self.now - timedelta(hours=30))
+        self.rental(self.now - timedelta(hours=5), status="Done")
+        self.rental(self.now + timedelta(days=3))
+
+        self.assertEqual(sweep(now=self.now), {"flagged": 1, "cleared": 0, "repriced": 0})
+        row = OverdueRental.objects.get()
+        self.assertEqual((row.rental_id, row.days_late, row.late_fee), (late.pk, 2, Decimal("400.00")))
+
+        # Nothing changed: nothing is touched. A day later the fee goes up.
+        self.assertEqual(sweep(now=self.now + timedelta(hours=1)), {"flagged": 0, "cleared": 0, "repriced": 0})
+        self.assertEqual(sweep(now=self.now + timedelta(days=1))["repriced"], 1)
+        self.assertEqual(OverdueRental.objects.get().late_fee, Decimal("600.00"))
+
+        Rental.objects.filter(pk=late.pk).update(payment_status="Done")
+        self.assertEqual(sweep(now=self.now + timedelta(days=1, hours=1))["cleared"], 1)
+        self.assertFalse(OverdueRental.objects.exists())
+
+    def test_sweep_only_scans_since_watermark(self):
+        sweep(now=self.now)
+        self.rental(self.now + timedelta(hours=1))
+        self.assertEqual(sweep(now=self.now + timedelta(hours=2))["flagged"], 1)
+        self.assertEqual(JobState.objects.get(name="overdue_sweep").watermark, self.now + timedelta(hours=2))
+
+    def test_scheduler_skips_a_job_that_is_running(self):
+        JobState.objects.create(name="overdue_sweep", locked_until=self.now + timedelta(minutes=5))
+        self.assertIsNone(run_job("overdue_sweep", now=self.now))
+        self.assertEqual(run_job("overdue_sweep", now=self.now + timedelta(minutes=6))["flagged"], 0)
+        state = JobState.objects.get(name="overdue_sweep")
+        self.assertIsNone(state.locked_until)
+        self.assertEqual(state.last_result, "flagged=0 cleared=0 repriced=0")
+
+
+class DashboardCountersTests(TestCase):
+    """The counter table, kept up by the write hooks, matches STATS_SQL."""
+
+    def setUp(self):
+        self.category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bikes = [
+            Bike.objects.create(license_plate=f"AB-{i:04d}", model_name="Honda Click", category=self.category, status=status)
+            for i, status in enumerate(["Available", "Available", "Rented", "Fix"])
+        ]
+        customer = Customer.objects.create(
+            citizen_id="1234567890123", first_name="Suda", last_name="Wongsa",
+            phone="0812345678", email="suda@example.com", line_id="suda",
+        )
+        now = datetime.now(dt_timezone.utc)
+        self.late = Rental.objects.create(
+            customer=customer, bike=self.bikes[2], start_date=now - timedelta(days=5),
+            end_date=now - timedelta(days=2), total_price=Decimal("1800"), payment_status="Active",
+        )
+        for status in ["Done", "Cancelled"]:
+            Rental.objects.create(
+                customer=customer, bike=self.bikes[0], start_date=now - timedelta(days=9),
+                end_date=now - timedelta(days=7), total_price=Decimal("1600"), payment_status=status,
+            )
+        sweep()
+
+    def assertCountersMatch(self):
+        self.assertEqual(dashboard.counter_stats(), dashboard.aggregate_stats())
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_counters_follow_the_write_hooks(self):
+        call_command("rebuild_dashboard_counters", stdout=StringIO())
+        stats = dashboard.dashboard_stats()
+        self.assertEqual(
+            (stats["total_bikes"], stats["rented_bikes"], stats["active_rentals"], stats["overdue_rentals"]),
+            (4, 1, 1, 1),
+        )
+        self.assertEqual(stats["revenue_month"], Decimal("3400"))
+        self.assertCountersMatch()
+
+        booking = OrmProcedures().commit_booking(
+            {"citizen_id": "1234567890123", "first_name": "Suda", "last_name": "Wongsa",
+             "phone": "0812345678", "line_id": "suda"},
+            {"email": "suda@example.com", "pickup_date": "2030-01-01", "pickup_time": "10:00",
+             "return_date": "2030-01-03", "return_time": "10:00"},
+            self.bikes[1].pk,
+        )
+        dashboard.rental_created(booking.total_price, "Available", booking.bike_status)
+        self.assertCountersMatch()
+
+        OrmProcedures().return_bike(self.late.pk)
+        dashboard.rental_returned(True, "Rented")
+        overdue.clear([self.late.pk])
+        self.assertCountersMatch()
+
+        Bike.objects.filter(pk=self.bikes[0].pk).update(status="Fix")
+        dashboard.bike_status_changed("Available", "Fix")
+        Bike.objects.create(license_plate="AB-9999", model_name="Honda Click", category=self.category)
+        dashboard.bike_added()
+        self.assertCountersMatch()
+        self.assertEqual(dashboard.dashboard_stats()["fix_bikes"], 2)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bike = Bike.objects.create(license_plate="AB-1234", model_name="Honda Click", category=self.category)
+        self.customer = Customer.objects.create(
+            citizen_id="1234567890123", first_name="Suda", last_name="Wongsa",
+            phone="0812345678", email="suda@example.com", line_id="suda",
+        )
+
+    def rental(self, start, hours, status="Done", price="1000"):
+        return Rental.objects.create(
+            customer=self.customer, bike=self.bike, start_date=start,
+            end_date=start + timedelta(hours=hours), total_price=Decimal(price), payment_status=status,
+        )
+
+    def test_rental_hours_are_split_across_days(self):
+        self.rental(datetime(2030, 1, 31, 18, tzinfo=dt_timezone.utc), 30)
+        self.rental(datetime(2030, 2, 3, 8, tzinfo=dt_timezone.utc), 5, status="Cancelled")
+        rollups.refresh()
+        self.assertEqual(
+            list(DailyRollup.objects.order_by("day").values_list("day", "bookings", "revenue", "rented_hours")),
+            [(date(2030, 1, 31), 1, Decimal("1000"), Decimal("6")), (date(2030, 2, 1), 0, Decimal("0"), Decimal("24"))],
+        )
+        self.assertEqual(MonthlyRollup.objects.count(), 2)
+
+    def test_refresh_only_recomputes_marked_days(self):
+        rollups.refresh()
+        start = datetime(2030, 3, 10, 10, tzinfo=dt_timezone.utc)
+        self.rental(start, 48)
+        # Picked up through the rental_id watermark
+        self.assertEqual(rollups.refresh(), {"new_rentals": 1, "days": 3, "rows": 3})
+
+        Rental.objects.update(actual_return_date=start + timedelta(hours=72))
+        rollups.rentals_returned(Rental.objects.values_list("pk", flat=True))
+        self.assertEqual(rollups.refresh()["days"], 2)
+        self.assertEqual(rollups.report(date(2030, 3, 1), date(2030, 3, 31))[0]["rented_hours"], Decimal("72"))
+
+    def test_report_combines_monthly_and_daily_rows(self):
+        for month in range(1, 5):
+            self.rental(datetime(2030, month, 14, 10, tzinfo=dt_timezone.utc), 24)
+        rollups.refresh()
+        row, = rollups.report(date(2030, 1, 15), date(2030, 4, 14))
+        # Jan 14-15 and Apr 14-15 are only half inside the range; Feb and Mar wholly
+        self.assertEqual((row["bookings"], row["revenue"], row["rented_hours"]), (3, Decimal("3000"), Decimal("72")))
+        self.assertEqual(row["utilization"], round(72 * 100 / (90 * 24), 1))
+
+
+@override_settings(PROCEDURE_BACKEND="orm")
+class CheckoutTests(TestCase):
+    def setUp(self):
+        category = BikeCategory.objects.create(
+            name="Standard",
+            price_daily=Decimal("200"),
+            price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"),
+            deposit_amount=Decimal("1000"),
+        )
+        self.bike = Bike.objects.create(license_plate="AB-1234", model_name="Honda Click", category=category)
+        availability_index.invalidate()  # Rentals of earlier tests were rolled back
+        self.client.post("/dates/", {
+            "email": "suda@example.com", "pickup_date": "2030-01-01", "pickup_time": "10:00",
+            "return_date": "2030-01-03", "return_time": "10:00",
+        })
+        self.client.post("/bikes/", {"bike_id": str(self.bike.pk)})
+        self.client.post("/customer/", {
+            "first_name": "Suda", "last_name": "Wongsa", "phone": "0812345678",
+            "citizen_id": "1234567890123", "line_id": "suda",
+        })
+
+    def checkout_key(self):
+        page = self.client.get("/checkout/").content.decode()
+        return re.search(r'name="idempotency_key" value="([^"]+)"', page).group(1)
+
+    def test_repeated_submission_gets_the_first_response(self):
+        key = self.checkout_key()
+        first = self.client.post("/checkout/", {"idempotency_key": key})
+        self.assertTrue(first.json()["success"])
+
+        with self.assertNumQueries(0):
+            again = self.client.post("/checkout/", {"idempotency_key": key})
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(Rental.objects.count(), 1)
+
+    def test_only_keys_minted_for_the_draft_are_remembered(self):
+        self.checkout_key()
+        self.client.post("/checkout/", HTTP_IDEMPOTENCY_KEY="made-up")
+        self.assertRedirects(
+            self.client.post("/checkout/", HTTP_IDEMPOTENCY_KEY="made-up"), "/dates/", fetch_redirect_response=False
+        )
+
+    def test_shed_checkout_can_be_retried(self):
+        key = self.checkout_key()
+        with override_settings(ADMISSION_GATES={"booking": {"limit": 0, "queue": 0, "timeout": 0}}):
+            shed = self.client.post("/checkout/", {"idempotency_key": key}, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed["Retry-After"], "2")
+        self.assertTrue(shed.json()["busy"])
+        self.assertEqual(Rental.objects.count(), 0)
+
+        self.assertTrue(self.client.post("/checkout/", {"idempotency_key": key}).json()["success"])
+
+
+def _reload_urlconfs():
+    # The URLconfs pick the sync or async views when they are imported
+    for name in ("myshop.admin_urls", "myshop.urls", settings.ROOT_URLCONF):
+        importlib.reload(importlib.import_module(name))
+    clear_url_caches()
+
+
+@override_settings(ASYNC_VIEWS=True, PROCEDURE_BACKEND="orm")
+class AsyncViewTests(TransactionTestCase):
+    # A TransactionTestCase: the booking commit runs on the booking thread pool,
+    # outside the test's transaction
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _reload_urlconfs()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        _reload_urlconfs()
+
+    def setUp(self):
+        category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        self.bike = Bike.objects.create(license_plate="AB-1234", model_name="Honda Click", category=category)
+        bump_catalog_version()
+        availability_index.invalidate()
+        self.client = AsyncClient()
+
+    # The price version is re-read on every render: a lazy read in the event
+    # loop would raise SynchronousOnlyOperation
+    @override_settings(PRICE_VERSION_TTL=0)
+    async def test_funnel_books_a_bike(self):
+        self.assertTrue(iscoroutinefunction(resolve("/bikes/").func))
+        await self.client.post("/dates/", {
+            "email": "suda@example.com", "pickup_date": "2030-01-01", "pickup_time": "10:00",
+            "return_date": "2030-01-03", "return_time": "10:00",
+        })
+        response = await self.client.get("/bikes/")
+        self.assertContains(response, "3 days")
+        await self.client.post("/bikes/", {"category": "Standard"})
+        self.assertContains(await self.client.get("/bikes/"), "Honda Click")
+        await self.client.post("/bikes/", {"bike_id": str(self.bike.pk)})
+        await self.client.post("/customer/", {
+            "first_name": "Suda", "last_name": "Wongsa", "phone": "0812345678",
+            "citizen_id": "1234567890123", "line_id": "suda",
+        })
+
+        page = (await self.client.get("/checkout/")).content.decode()
+        key = re.search(r'name="idempotency_key" value="([^"]+)"', page).group(1)
+        booking = (await self.client.post("/checkout/", {"idempotency_key": key})).json()
+        self.assertTrue(booking["success"])
+        rental = await Rental.objects.aget(pk=booking["rental_id"])
+        self.assertEqual((rental.bike_id, rental.total_price), (self.bike.pk, Decimal("1600")))
+
+    async def test_admin_lists(self):
+        await Admin.objects.acreate(username="owner", password="secret", role="Owner")
+        customer = await Customer.objects.acreate(
+            citizen_id="1234567890123", first_name="Suda", last_name="Wongsa",
+            phone="0812345678", email="suda@example.com", line_id="suda",
+        )
+        await Rental.objects.acreate(
+            customer=customer, bike=self.bike, start_date=datetime(2030, 1, 1, tzinfo=dt_timezone.utc),
+            end_date=datetime(2030, 1, 3, tzinfo=dt_timezone.utc), total_price=Decimal("1600"),
+        )
+        self.assertRedirects(
+            await self.client.get("/shop-admin/bookings/"), "/shop-admin/login/", fetch_redirect_response=False
+        )
+        await self.client.post("/shop-admin/login/", {"username": "owner", "password": "secret"})
+        self.assertContains(await self.client.get("/shop-admin/bookings/"), "AB-1234")
+        self.assertContains(await self.client.get("/shop-admin/bookings/?status=Active&page_size=1"), "AB-1234")
+        self.assertContains(await self.client.get("/shop-admin/customers/?q=Suda"), "Wongsa")
+        self.assertContains(await self.client.get("/shop-admin/vehicles/"), "Honda Click")
+
+
+class AdmissionGateTests(SimpleTestCase):
+    def test_queue_then_shed(self):
+        gate = Gate("test", limit=1, queue=1, timeout=5)
+        self.assertTrue(gate.acquire())
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+        waiter.start()
+        while not gate.metrics()["waiting"]:
+            time.sleep(0.001)
+        self.assertFalse(gate.acquire())  # Queue full: shed at once
+
+        gate.release()  # Handed to the waiter
+        waiter.join()
+        self.assertEqual(results, [True])
+        gate.release()
+        metrics = gate.metrics()
+        self.assertEqual(
+            (metrics["in_flight"], metrics["admitted"], metrics["queued"], metrics["shed_queue_full"]), (0, 2, 1, 1)
+        )
+
+    def test_waiting_past_the_deadline_is_shed(self):
+        gate = Gate("test", limit=1, queue=5, timeout=0.01)
+        self.assertTrue(gate.acquire())
+        self.assertFalse(asyncio.run(gate.aacquire()))
+        self.assertEqual(gate.metrics()["shed_timeout"], 1)
+        self.assertEqual(gate.metrics()["waiting"], 0)
+
+
+class CatalogCacheTests(TestCase):
+    """Prices change through the database's price trigger, which only logs to PriceLog."""
+
+    def setUp(self):
+        self.category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("200"), price_weekly=Decimal("1200"),
+            price_monthly=Decimal("4000"), deposit_amount=Decimal("1000"),
+        )
+        bump_catalog_version()
+
+    def change_price(self, price):
+        # As the trigger does it: no save signal, no catalog bump
+        BikeCategory.objects.filter(pk=self.category.pk).update(price_daily=price)
+        PriceLog.objects.bulk_create(
+            [PriceLog(category=self.category, old_price=self.category.price_daily, new_price=price)]
+        )
+
+    @override_settings(PRICE_VERSION_TTL=0)
+    def test_price_change_invalidates_cached_categories(self):
+        self.assertEqual(get_categories()[0].price_daily, Decimal("200"))
+        self.change_price(Decimal("250"))
+        self.assertEqual(get_categories()[0].price_daily, Decimal("250"))
+
+    @override_settings(PRICE_VERSION_TTL=0)
+    def test_price_change_invalidates_category_grid(self):
+        def render():
+            return render_to_string(
+                "myshop_template/2-bikes.html",
+                {"category_quotes": [(category, None) for category in get_categories()]},
+                request=RequestFactory().get("/bikes/"),
+            )
+
+        self.assertIn("฿200.00/day", render())
+        self.change_price(Decimal("250"))
+        self.assertIn("฿250.00/day", render())
+
+
+class CatalogFragmentTests(TestCase):
+    def render(self, bikes):
+        return render_to_string(
+            "myshop_template/2-bikes-category.html",
+            {"category": "Standard", "bikes": bikes, "bike_ids": [bike.bike_id for bike in bikes]},
+            request=RequestFactory().get("/bikes/"),
+        )
+
+    def test_bike_cards_are_cached_per_catalog_version(self):
+        bump_catalog_version()
+        category = BikeCategory(category_id=1, name="Standard", price_daily=Decimal("200"))
+        bike = Bike(bike_id=1, model_name="Honda Click", category=category)
+        self.assertIn("Honda Click", self.render([bike]))
+
+        bike.model_name = "Yamaha Fino"
+        self.assertIn("Honda Click", self.render([bike]))
+        bump_catalog_version()
+        self.assertIn("Yamaha Fino", self.render([bike]))
+
+    @override_settings(PRICE_VERSION_TTL=0)
+    def test_price_change_invalidates_bike_cards(self):
+        category = BikeCategory.objects.create(
+            name="Standard", price_daily=Decimal("160"), price_weekly=Decimal("900"),
+            price_monthly=Decimal("3000"), deposit_amount=Decimal("1000"),
+        )
+        bike = Bike.objects.create(license_plate="AB-1234", model_name="Honda Click", category=category)
+        bump_catalog_version()
+        self.assertIn("฿160/day", self.render([bike]))
+
+        # As the price trigger does it: no save signal, no catalog bump
+        BikeCategory.objects.filter(pk=category.pk).update(price_daily=Decimal("999"))
+        PriceLog.objects.bulk_create([PriceLog(category=category, old_price=Decimal("160"), new_price=Decimal("999"))])
+        bike.refresh_from_db()
+        self.assertIn("฿999.00/day", self.render([bike]))
+
+
+class CompactSessionTests(SimpleTestCase):
+    rental_data = {
+        "email": "suda@example.com", "pickup_date": "2030-01-01", "pickup_time": "10:00",
+        "return_date": "2030-01-03", "return_time": "10:00",
+    }
+
+    def test_session_round_trips_in_compact_form(self):
+        store = SessionStore()
+        store.update({"rental_data": self.rental_data, "selected_bike_id": "7", "other": {"x": 1}})
+        cookie = store._get_session_key()
+        self.assertEqual(
+            SessionStore(cookie).load(),
+            {"rental_data": self.rental_data, "selected_bike_id": "7", "other": {"x": 1}},
+        )
+        payload = CompactSerializer().dumps({"rental_data": self.rental_data})
+        self.assertEqual(payload, b'[1,{"r":["suda@example.com","2030-01-01","10:00","2030-01-03","10:00"]}]')
+
+    def test_cookie_in_another_format_starts_a_new_session(self):
+        stock = signing.dumps({"rental_data": self.rental_data}, salt="django.contrib.sessions.backends.signed_cookies")
+        store = SessionStore(stock)
+        self.assertEqual(store.load(), {})
+        self.assertTrue(store.modified)
+
+    def test_cookie_is_resigned_only_on_change_or_refresh(self):
+        self.client.post("/dates/", self.rental_data)
+        self.assertNotIn("sessionid", self.client.get("/dates/").cookies)
+        # Writing the same values again is not a change
+        self.assertNotIn("sessionid", self.client.post("/dates/", self.rental_data).cookies)
+        self.assertIn("sessionid", self.client.post("/dates/", dict(self.rental_data, return_time="12:00")).cookies)
+
+        later = time.time() + 61
+        with mock.patch("time.time", return_value=later):
+            self.assertIn("sessionid", self.client.get("/dates/").cookies)
+
+
+@override_settings(BOOKING_DRAFT_STORE="locmem")
+class BookingDraftTests(SimpleTestCase):
+    rental_data = CompactSessionTests.rental_data
+
+    def test_funnel_state_stays_on_the_server(self):
+        response = self.client.post("/dates/", self.rental_data)
+        self.assertNotIn("sessionid", response.cookies)
+        token = response.cookies["booking_draft"].value
+        self.assertEqual(len(token), 22)
+
+        # A reload finds the draft again; later steps keep the same token
+        self.assertContains(self.client.get("/dates/"), "suda@example.com")
+        response = self.client.post("/dates/", dict(self.rental_data, return_time="12:00"))
+        self.assertNotIn("booking_draft", response.cookies)
+        self.assertEqual(self.client.cookies["booking_draft"].value, token)
+
+        self.client.get("/clear-session/")
+        self.assertEqual(self.client.cookies["booking_draft"].value, "")
+        self.assertRedirects(self.client.get("/customer/"), "/dates/", fetch_redirect_response=False)
+
+    def test_locmem_store_is_bounded_and_expires(self):
+        store = LocMemDraftStore(ttl=600, max_bytes=100)
+        for n in range(10):
+            store.set(f"token{n}", {"n": n, "pad": "x" * 20})
+        self.assertLessEqual(store._bytes, 100)
+        self.assertIsNone(store.get("token0"))
+        self.assertEqual(store.get("token9"), {"n": 9, "pad": "x" * 20})
+
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 601):
+            self.assertIsNone(store.get("token9"))
+
+    def test_file_store_expires_and_culls(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = FileDraftStore(ttl=600, path=path, max_entries=2)
+            now = time.time()
+            for n, age in enumerate([700, 30, 20, 10]):
+                store.set(f"token{n}", {"n": n})
+                os.utime(os.path.join(path, f"token{n}.json"), (now - age, now - age))
+            self.assertIsNone(store.get("token0"))  # Expired
+            store.cull()  # token1 is the least recently used beyond max_entries
+            self.assertEqual(sorted(os.listdir(path)), ["token2.json", "token3.json"])
+            self.assertEqual(store.get("token3"), {"n": 3})
+
+
+def _explain(sql, params=None):
+    """The plan of a statement: text on SQLite, parsed JSON on MySQL."""
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN FORMAT=JSON "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        rows = cursor.fetchall()
+    if connection.vendor == "sqlite":
+        return "\n".join(row[-1] for row in rows)
+    return json.loads(rows[0][0])
+
+
+def _full_scans(plan):
+    """Tables the database would read in full, from an `_explain` plan."""
+    if connection.vendor == "sqlite":
+        # "SCAN <table>" without "USING ... INDEX" is a table scan
+        return re.findall(r"\bSCAN (\w+)(?! USING)\s*$", plan, re.MULTILINE)
+    # MySQL: "access_type": "ALL" is a table scan
+    scans = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("access_type") == "ALL":
+                scans.append(node.get("table_name"))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return scans
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must be answered from an index, never a full table scan."""
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor not in ("sqlite", "mysql"):
+            raise SkipTest(f"no plan parser for {connection.vendor}")
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        # Enough rows that a cost-based planner prefers the indexes
+        categories = [
+            BikeCategory.objects.create(
+                name=f"Category {i}", price_daily=200, price_weekly=1200,
+                price_monthly=4000, deposit_amount=1000,
+            )
+            for i in range(4)
+        ]
+        statuses = ["Available", "Available", "Rented", "Fix"]
+        Bike.objects.bulk_create([
+            Bike(
+                license_plate=f"QP-{i:04d}", model_name="Honda Click",
+                status=statuses[i % 4], category=categories[i % 4],
+            )
+            for i in range(400)
+        ])
+        Customer.objects.bulk_create([
+            Customer(
+                citizen_id=f"{i:013d}", first_name="Suda", last_name=f"W{i}",
+                phone="0812345678", email=f"c{i}@example.com", line_id=f"c{i}",
+            )
+            for i in range(200)
+        ])
+        bikes = list(Bike.objects.all())
+        customers = list(Customer.objects.all())
+        start = datetime(2030, 1, 1, 10, tzinfo=dt_timezone.utc)
+        Rental.objects.bulk_create([
+            Rental(
+                customer=customers[i % len(customers)], bike=bikes[i % len(bikes)],
+                start_date=start + timedelta(days=3 * (i // len(bikes))),
+                end_date=start + timedelta(days=3 * (i // len(bikes)) + 2),
+                total_price=1400, payment_status="Active" if i % 10 == 0 else "Done",
+            )
+            for i in range(2000)
+        ])
+        PriceLog.objects.bulk_create([
+            PriceLog(category=categories[i % 4], old_price=190, new_price=200)
+            for i in range(200)
+        ])
+        cls.category = categories[0]
+        cls.bike = bikes[0]
+
+    def assertUsesIndex(self, queryset):
+        plan = _explain(*queryset.query.sql_with_params())
+        scans = _full_scans(plan)
+        self.assertEqual(scans, [], f"Full scan of {scans} in:\n{plan}")
+
+    def assertPagesUseIndex(self, queryset, order_field):
+        """The statements keyset_page runs, for the first page and the next one."""
+        cursor = None
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                _, cursor = keyset_page(queryset, order_field, cursor=cursor)
+            plan = _explain(queries[-1]["sql"])
+            scans = _full_scans(plan)
+            self.assertEqual(scans, [], f"Full scan of {scans} in:\n{plan}")
+            self.assertIsNotNone(cursor)
+
+    def test_available_bikes_of_category(self):
+        self.assertUsesIndex(Bike.objects.filter(status="Available", category=self.category))
+
+    def test_active_rentals(self):
+        self.assertUsesIndex(Rental.objects.filter(payment_status="Active"))
+
+    def test_overlap_check(self):
+        start = datetime(2030, 1, 2, tzinfo=dt_timezone.utc)
+        self.assertUsesIndex(Rental.objects.filter(
+            bike_id=self.bike.pk, payment_status="Active",
+            start_date__lt=start + timedelta(days=2), end_date__gt=start,
+        ))
+
+    def test_booking_list_page(self):
+        self.assertPagesUseIndex(filter_bookings({}), "created_at")
+
+    def test_booking_list_by_status(self):
+        self.assertPagesUseIndex(filter_bookings({"status": "Active"}), "created_at")
+
+    def test_customer_list_page(self):
+        self.assertPagesUseIndex(search_customers({}), "created_at")
+
+    def test_customer_search(self):
+        if connection.vendor == "sqlite":
+            # SQLite only answers LIKE prefixes from an index on NOCASE columns
+            self.skipTest("prefix LIKE is not indexed on SQLite")
+        for q in ("0812", "1234567", "Suda", "@suda", "Suda W"):
+            with self.subTest(q=q):
+                self.assertUsesIndex(search_customers({"q": q}))
+
+    def test_price_history_of_category(self):
+        self.assertUsesIndex(PriceLog.objects.filter(category=self.category).order_by("-change_date"))
+
+    def test_rollup_refresh_candidates(self):
+        lo = datetime(2030, 1, 5, tzinfo=dt_timezone.utc)
+        self.assertUsesIndex(rollups._counted().filter(end_date__gt=lo, start_date__lt=lo + timedelta(days=1)))
+        self.assertUsesIndex(Rental.objects.filter(
+            payment_status="Done", actual_return_date__gt=lo, end_date__lte=lo, start_date__lt=lo + timedelta(days=1)
+        ))
+
+    def test_overdue_sweep_candidates(self):
+        now = datetime(2030, 1, 5, tzinfo=dt_timezone.utc)
+        self.assertUsesIndex(
+            Rental.objects.filter(payment_status="Active", end_date__gt=now - timedelta(minutes=5), end_date__lte=now)
+            .values_list("rental_id", "end_date", "bike__category__price_daily")
+            .order_by("rental_id")[:500]
+        )
+
+
+class FakeConnection:
+    """Stand-in for a DB-API connection."""
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        opened = []
+
+        def connect():
+            connection = FakeConnection(len(opened) + 1)
+            opened.append(connection)
+            return connection
+
+        def ping(connection):
+            if not connection.healthy:
+                raise OSError("server has gone away")
+
+        options = {"max_size": 2, "timeout": 0.2, "max_lifetime": 60, "check_after": 0, "ping": ping}
+        options.update(kwargs)
+        return ConnectionPool(connect, **options), opened
+
+    def test_released_connection_is_reused(self):
+        pool, opened = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(opened), 1)
+        metrics = pool.metrics()
+        self.assertEqual(metrics["checkouts"], 2)
+        self.assertEqual(metrics["created"], 1)
+        self.assertEqual(metrics["in_use"], 1)
+
+    def test_pool_is_bounded_and_times_out(self):
+        pool, opened = self.make_pool()
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(len(opened), 2)
+        self.assertEqual(pool.metrics()["timeouts"], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool, _ = self.make_pool(max_size=1, timeout=2)
+        held = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [held])
+        timer.start()
+        self.assertIs(pool.acquire(), held)
+        timer.join()
+        metrics = pool.metrics()
+        self.assertEqual(metrics["waits"], 1)
+        self.assertGreater(metrics["wait_ms"], 0)
+
+    def test_unhealthy_connection_is_replaced(self):
+        pool, opened = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        first.healthy = False
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.metrics()["closed_unhealthy"], 1)
+
+    def test_expired_connection_is_closed(self):
+        pool, opened = self.make_pool(max_lifetime=0.01)
+        first = pool.acquire()
+        pool.release(first)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.metrics()["closed_expired"], 1)
+
+    def test_discarded_connection_frees_its_slot(self):
+        pool, opened = self.make_pool(max_size=1)
+        first = pool.acquire()
+        pool.release(first, discard=True)
+        self.assertTrue(first.closed)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertEqual(pool.metrics()["size"], 1)
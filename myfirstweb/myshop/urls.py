@@ -1,5 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
-from .views import Home, Dates, Bikes, CustomerView, Checkout, clear_session
+
+# ASYNC_VIEWS serves the booking funnel from the async views (ASGI deployments)
+if getattr(settings, "ASYNC_VIEWS", False):
+    from .async_views import Home, Dates, Bikes, CustomerView, Checkout, clear_session
+else:
+    from .views import Home, Dates, Bikes, CustomerView, Checkout, clear_session
 
 urlpatterns = [
     path("", Home, name="home"),
@@ -1,8 +1,13 @@
 from django.shortcuts import render, redirect
 from django.http import HttpResponse, JsonResponse
-from .models import Bike, Rental, Customer, BikeCategory
+from .models import Bike, Rental, Customer
 from datetime import datetime
-from django.db import connection
+from .availability import availability_index, rental_period
+from .booking import server_timing_header
+from . import admission, dashboard, idempotency, rollups
+from .catalog import bump_catalog_version, get_available_bikes, get_categories, get_category
+from .pricing import get_quote, quote_many
+from .procedures import BookingConflict, get_procedures
 
 # def Home (request) :
 # return HttpResponse('<h1 > Hello Django : MyShop </h1>')
@@ -13,28 +18,28 @@ def Home(request):
 
 
 def clear_session(request):
-    """Clear the booking session and redirect to dates page"""
-    request.session.flush()
+    """Clear the booking draft and redirect to dates page"""
+    request.draft.flush()
     return redirect("dates")
 
 
 def Dates(request):
     # Check if session has expired (older than 10 minutes)
-    if "rental_data" in request.session:
+    if "rental_data" in request.draft:
         # Session exists, Django will handle expiry via SESSION_COOKIE_AGE
         pass
 
-    initial_data = request.session.get("rental_data", {})
+    initial_data = request.draft.get("rental_data", {})
     if request.method == "POST":
-        # Save form data to session
-        request.session["rental_data"] = {
+        # Save form data to the draft
+        request.draft["rental_data"] = {
             "email": request.POST.get("email"),
             "pickup_date": request.POST.get("pickup_date"),
             "pickup_time": request.POST.get("pickup_time"),
             "return_date": request.POST.get("return_date"),
             "return_time": request.POST.get("return_time"),
         }
-        request.session.modified = True
+        request.draft.modified = True
         return redirect("bikes")
     return render(
         request, "myshop_template/1-dates.html", {"initial_data": initial_data}
@@ -43,7 +48,7 @@ def Dates(request):
 
 def Bikes(request):
     # Check if date info exists
-    if "rental_data" not in request.session:
+    if "rental_data" not in request.draft:
         return redirect("dates")
 
     if request.method == "POST":
@@ -53,70 +58,88 @@ def Bikes(request):
 
         if category:
             # Category selected - store it and show bikes in that category
-            request.session["selected_category"] = category
-            request.session.modified = True
+            request.draft["selected_category"] = category
+            request.draft.modified = True
             # Stay on bikes page to show bikes in selected category
             return redirect("bikes")
         elif bike_id:
             # Specific bike selected
-            request.session["selected_bike_id"] = bike_id
+            request.draft["selected_bike_id"] = bike_id
             # Clear category selection since bike is chosen
-            if "selected_category" in request.session:
-                del request.session["selected_category"]
-            request.session.modified = True
+            if "selected_category" in request.draft:
+                del request.draft["selected_category"]
+            request.draft.modified = True
             return redirect("customer")
 
     # Check if user wants to go back to category selection (via GET with clear_category param)
     if request.GET.get("clear_category"):
-        if "selected_category" in request.session:
-            del request.session["selected_category"]
-            request.session.modified = True
+        if "selected_category" in request.draft:
+            del request.draft["selected_category"]
+            request.draft.modified = True
         return redirect("bikes")
 
     # Check if a category was selected
-    selected_category = request.session.get("selected_category")
+    selected_category = request.draft.get("selected_category")
 
     if selected_category:
-        # Get bikes in the selected category from database
-        try:
-            category = BikeCategory.objects.get(name=selected_category)
-            category_bikes = Bike.objects.filter(status="Available", category=category)
-            return render(
-                request,
-                "myshop_template/2-bikes-category.html",
-                {"category": selected_category, "bikes": category_bikes},
-            )
-        except BikeCategory.DoesNotExist:
+        # Get bikes in the selected category from the catalog cache
+        category = get_category(selected_category)
+        if category is None:
             # Category doesn't exist, redirect back to category selection
-            if "selected_category" in request.session:
-                del request.session["selected_category"]
-            request.session.modified = True
+            if "selected_category" in request.draft:
+                del request.draft["selected_category"]
+            request.draft.modified = True
             return redirect("bikes")
 
+        category_bikes = get_available_bikes(category)
+        # Hide bikes already booked for the customer's pickup/return window
+        period = rental_period(request.draft["rental_data"])
+        if period:
+            category_bikes = availability_index.free_bikes(category_bikes, *period)
+        return render(
+            request,
+            "myshop_template/2-bikes-category.html",
+            {
+                "category": selected_category,
+                "bikes": category_bikes,
+                # Cache key of the bike cards fragment
+                "bike_ids": [bike.bike_id for bike in category_bikes],
+            },
+        )
+
     # No category selected yet - show category selection
-    # Get all categories from database
-    categories = BikeCategory.objects.all().order_by("price_daily")
-    return render(request, "myshop_template/2-bikes.html", {"categories": categories})
+    # Get all categories from the catalog cache
+    categories = get_categories()
+
+    # Price the customer's dates for every category in one batch
+    period = rental_period(request.draft["rental_data"])
+    quotes = quote_many(categories, *period) if period else {}
+    category_quotes = [(category, quotes.get(category.pk)) for category in categories]
+    return render(
+        request,
+        "myshop_template/2-bikes.html",
+        {"categories": categories, "category_quotes": category_quotes},
+    )
 
 
 def CustomerView(request):
     if (
-        "rental_data" not in request.session
-        or "selected_bike_id" not in request.session
+        "rental_data" not in request.draft
+        or "selected_bike_id" not in request.draft
     ):
         return redirect("dates")
 
-    initial_data = request.session.get("customer_data", {})
+    initial_data = request.draft.get("customer_data", {})
 
     if request.method == "POST":
-        request.session["customer_data"] = {
+        request.draft["customer_data"] = {
             "first_name": request.POST.get("first_name"),
             "last_name": request.POST.get("last_name"),
             "phone": request.POST.get("phone"),
             "citizen_id": request.POST.get("citizen_id"),
             "line_id": request.POST.get("line_id"),
         }
-        request.session.modified = True
+        request.draft.modified = True
         return redirect("checkout")
 
     return render(
@@ -124,115 +147,99 @@ def CustomerView(request):
     )
 
 
+def _booking_conflict():
+    return JsonResponse(
+        {
+            "success": False,
+            "conflict": True,
+            "message": "Sorry, this bike has just been booked for your dates. Please choose another bike.",
+        },
+        status=409,
+    )
+
+
 def Checkout(request):
+    key = idempotency.submitted_key(request) if request.method == "POST" else None
+    # A repeated submission gets its first outcome, before any other work
+    replayed = idempotency.replay(key)
+    if replayed is not None:
+        return replayed
+
     if (
-        "rental_data" not in request.session
-        or "selected_bike_id" not in request.session
-        or "customer_data" not in request.session
+        "rental_data" not in request.draft
+        or "selected_bike_id" not in request.draft
+        or "customer_data" not in request.draft
     ):
         return redirect("dates")
 
-    rental_data = request.session["rental_data"]
-    customer_data = request.session["customer_data"]
-    bike_id = request.session["selected_bike_id"]
+    rental_data = request.draft["rental_data"]
+    customer_data = request.draft["customer_data"]
+    bike_id = request.draft["selected_bike_id"]
 
-    bike = Bike.objects.get(pk=bike_id)
+    bike = Bike.objects.select_related("category").get(pk=bike_id)
 
     # Calculate rental duration and prices
-    from datetime import datetime, timedelta
-
     pickup_date = datetime.strptime(rental_data["pickup_date"], "%Y-%m-%d")
     return_date = datetime.strptime(rental_data["return_date"], "%Y-%m-%d")
 
-    # Calculate number of days (at least 1 day)
-    rental_days = max(1, (return_date - pickup_date).days + 1)
-
-    # Calculate rental price
-    rental_price = bike.category.price_daily * rental_days
-
-    # Get deposit amount
-    deposit_amount = bike.category.deposit_amount
-
-    # Calculate total price (rental + deposit)
-    total_price = rental_price + deposit_amount
+    # Cheapest mix of monthly / weekly / daily rates, plus deposit
+    quote = get_quote(bike.category, pickup_date, return_date)
 
     if request.method == "POST":
-        # Save everything to DB using Stored Procedures
+        if key != request.draft.get(idempotency.DRAFT_KEY):
+            key = None  # Not the key minted for this draft: no replay protection
+        elif not idempotency.claim(key):
+            # The same submission is already being handled
+            return idempotency.replay(key) or idempotency.still_pending()
+
+        # Cheap in-memory check first: a bike known to be taken never opens a transaction
+        period = rental_period(rental_data)
+        if period and not availability_index.is_free(bike_id, *period):
+            return idempotency.finish(key, _booking_conflict())
+
+        # Cap the bookings committing at once; shed the rest with a 503 + Retry-After
+        gate = admission.gate("booking")
+        if not gate.acquire():
+            idempotency.release(key)
+            return admission.shed_response(request)
+
+        # Save customer and rental in one transaction / one round trip
         try:
-            with connection.cursor() as cursor:
-                # 1. Save Customer using SP
-                # MySQL Procedure: SaveCustomerForBooking(..., OUT p_customer_id_out)
-                # In Django/MySQL wrapper, we can't easily get OUT params from callproc directly in one go cleanly with some drivers.
-                # We'll use raw SQL to be safe and precise.
-                
-                cursor.execute("""
-                    SET @customer_id = 0;
-                    CALL SaveCustomerForBooking(%s, %s, %s, %s, %s, %s, @customer_id);
-                    SELECT @customer_id;
-                """, [
-                    customer_data["citizen_id"],
-                    customer_data["first_name"],
-                    customer_data["last_name"],
-                    customer_data["phone"],
-                    rental_data["email"],
-                    customer_data["line_id"]
-                ])
-                
-                # The result of the SELECT @customer_id will be in the last result set
-                # fetchall() might return results from CALL first (empty) then SELECT.
-                # But typically with Django's MySQL wrapper, we might need to iterate.
-                # Let's try a simpler approach if the above is complex with Django wrapper:
-                # execute the CALL, then execute SELECT.
-                
-                # Ideally:
-                # cursor.execute("CALL SaveCustomerForBooking(%s, %s, %s, %s, %s, %s, @customer_id)", [...])
-                # cursor.execute("SELECT @customer_id")
-                # row = cursor.fetchone()
-                # customer_id = row[0]
-                
-                # Let's do it step by step to be safe with Django's wrapper behavior
-                cursor.execute("CALL SaveCustomerForBooking(%s, %s, %s, %s, %s, %s, @customer_id)", [
-                    customer_data["citizen_id"],
-                    customer_data["first_name"],
-                    customer_data["last_name"],
-                    customer_data["phone"],
-                    rental_data["email"],
-                    customer_data["line_id"]
-                ])
-                
-                cursor.execute("SELECT @customer_id")
-                row = cursor.fetchone()
-                if not row:
-                    raise Exception("Failed to get customer ID from stored procedure")
-                customer_id = row[0]
-
-                # 2. Create Rental using SP
-                # CreateRental(p_customer_id, p_bike_id, p_start_date, p_end_date)
-                # Triggers will handle validation and price calculation.
-                
-                start_str = f"{rental_data['pickup_date']} {rental_data['pickup_time']}"
-                end_str = f"{rental_data['return_date']} {rental_data['return_time']}"
-                
-                cursor.execute("CALL CreateRental(%s, %s, %s, %s)", [
-                    customer_id,
-                    bike_id,
-                    start_str,
-                    end_str
-                ])
-                
-                # Clear session
-                request.session.flush()
-
-                return JsonResponse(
-                    {"success": True, "message": "Booking Confirmed, Thank you!"}
-                )
-
+            booking = get_procedures().commit_booking(customer_data, rental_data, bike_id)
+        except BookingConflict:
+            # Someone else booked the bike first; nothing was written
+            availability_index.refresh_bike(bike_id)
+            return idempotency.finish(key, _booking_conflict())
         except Exception as e:
             # If Trigger fails (e.g., double booking), it raises an error.
+            idempotency.release(key)
             return JsonResponse(
                 {"success": False, "message": f"Booking Failed: {str(e)}"}
             )
-
+        finally:
+            gate.release()
+
+        availability_index.refresh_bike(bike_id)
+        # The booking changes the bike's status
+        bump_catalog_version()
+        dashboard.rental_created(booking.total_price, bike.status, booking.bike_status)
+        rollups.period_booked(*period)
+
+        # Clear the draft
+        request.draft.flush()
+
+        response = JsonResponse(
+            {
+                "success": True,
+                "message": "Booking Confirmed, Thank you!",
+                "rental_id": booking.rental_id,
+            }
+        )
+        response["Server-Timing"] = server_timing_header(booking.timings)
+        return idempotency.finish(key, response)
+
+    # A fresh key for each render of the page, sent back with the form
+    request.draft[idempotency.DRAFT_KEY] = idempotency.new_key()
     return render(
         request,
         "myshop_template/4-checkout.html",
@@ -240,9 +247,11 @@ def Checkout(request):
             "rental": rental_data,
             "customer": customer_data,
             "bike": bike,
-            "rental_days": rental_days,
-            "rental_price": rental_price,
-            "deposit_amount": deposit_amount,
-            "total_price": total_price,
+            "quote": quote,
+            "rental_days": quote.days,
+            "rental_price": quote.rental_price,
+            "deposit_amount": quote.deposit,
+            "total_price": quote.total,
+            "idempotency_key": request.draft[idempotency.DRAFT_KEY],
         },
     )